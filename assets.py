@@ -0,0 +1,191 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Asset loading for Belote, tuned for a fast start.
+
+FontCache replaces pygame.font.SysFont: looking a font up by name scans the whole system
+font list, so the font file each name resolves to is remembered in a small cache file and
+later launches open the file directly.
+
+Images is a dict of images which loads each image from its file only when it's first
+needed; the remaining images can be loaded on a background thread while the welcome
+screen is shown.
+
+Bundle packs all images into a single file: one texture atlas plus an index of the
+rectangle each image occupies in it. The atlas is stored either as PNG, or as raw RGBA
+pixels which are memory-mapped and need no decoding. Build it with:
+    python assets.py [--raw]
+"""
+
+import os, sys, io, json, struct, mmap, tempfile, threading, pygame
+
+FONT_CACHE = "fonts.cache"
+BUNDLE_FILE = "assets.bundle"
+BUNDLE_IMAGES = ("all.png", "belote_pic.png", "bg_flag.png", "button_large.png", "button_medium.png",
+                 "button_small.png", "button_tiny.png", "card_back1.png", "cards.png", "club.png",
+                 "diamond.png", "eng_flag.png", "heart.png", "no.png", "spade.png")
+BUNDLE_MAGIC = b"BLTA"
+BUNDLE_VERSION = 1
+PNG_ATLAS = 0       # atlas storage formats
+RAW_ATLAS = 1
+ATLAS_WIDTH = 1024
+# header: magic, version, atlas format, atlas width, atlas height, number of images
+HEADER = struct.Struct("<4sHBHHH")
+# index entry, after the length-prefixed file name: x, y, width, height
+ENTRY = struct.Struct("<HHHH")
+
+
+class FontCache():
+    def __init__(self, filename=FONT_CACHE):
+        """ Resolves system font names to font files, remembering them in filename """
+        self.filename = filename
+        try:
+            with open(filename) as cache:
+                self.paths = json.load(cache)   # -> dict {"name,bold": [font file or None, fake bold]}
+        except (IOError, ValueError):
+            self.paths = {}
+
+    def font(self, name, size, bold=False):
+        """ Return a pygame Font, the same SysFont(name, size, bold) would give """
+        key = "%s,%d" % (name, bold)
+        entry = self.paths.get(key)
+        if entry is None or (entry[0] and not os.path.exists(entry[0])):
+            entry = self.resolve(name, bold)   # not known yet, or the font was uninstalled
+            self.paths[key] = entry
+            self.save()
+        font = pygame.font.Font(entry[0], size)
+        if entry[1]:    # there's no bold variant of the font, embolden it
+            font.set_bold(True)
+        return font
+
+    def resolve(self, name, bold):
+        """ Let SysFont find the font file; return [font file, fake bold] """
+        found = []
+        def constructor(path, size, set_bold, set_italic):
+            found.append([path, set_bold])
+        pygame.font.SysFont(name, 1, bold, constructor=constructor)
+        return found[0]
+
+    def save(self):
+        try:
+            with open(self.filename, "w") as cache:
+                json.dump(self.paths, cache)
+        except IOError:
+            pass    # a read-only directory only costs the next launch a font scan
+
+
+class Images(dict):
+    def __init__(self, files, bundle=None):
+        """ A dict of images, loaded the first time they're accessed.
+            files -> dict {key: image file name}
+            bundle -> Bundle; if given, images packed in it are taken from there """
+        dict.__init__(self)
+        self.files = files
+        self.bundle = bundle
+
+    def __missing__(self, key):
+        if self.bundle and self.files[key] in self.bundle.index:
+            image = self.bundle.image(self.files[key])
+        else:
+            image = pygame.image.load(self.files[key])
+        self[key] = image
+        return image
+
+    def preload(self):
+        """ Load all images not accessed yet on a background thread; return the thread """
+        thread = threading.Thread(target=self.load_all)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def load_all(self):
+        for key in self.files:
+            if key not in self:
+                self[key]     # loads it through __missing__
+
+
+class Bundle():
+    def __init__(self, filename=BUNDLE_FILE):
+        """ Opens a packed image bundle; the whole file is read (or mapped) at once """
+        with open(filename, "rb") as bundle:
+            self.data = mmap.mmap(bundle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.need(HEADER.size, filename)
+        magic, version, storage, width, height, count = HEADER.unpack_from(self.data, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise IOError("Not a bundle of this version: " + filename)
+        self.index = {}    # -> dict {file name: (x, y, width, height)}
+        offset = HEADER.size
+        for i in xrange(count):
+            self.need(offset + 1, filename)
+            length = ord(self.data[offset:offset + 1])
+            self.need(offset + 1 + length + ENTRY.size, filename)
+            name = self.data[offset + 1:offset + 1 + length].decode("utf-8")
+            offset += 1 + length
+            self.index[name] = ENTRY.unpack_from(self.data, offset)
+            offset += ENTRY.size
+
+        if storage == RAW_ATLAS:      # use the mapped pixels directly
+            self.need(offset + width * height * 4, filename)
+            self.atlas = pygame.image.frombuffer(buffer(self.data, offset, width * height * 4),
+                                                 (width, height), "RGBA")
+        else:
+            try:
+                self.atlas = pygame.image.load(io.BytesIO(self.data[offset:]), "atlas.png")
+            except pygame.error:
+                raise IOError("Broken bundle atlas: " + filename)
+
+    def need(self, size, filename):
+        """ Raise IOError if the bundle is shorter than size bytes """
+        if len(self.data) < size:
+            raise IOError("Truncated bundle: " + filename)
+
+    def image(self, name):
+        """ Return the image originally loaded from file name, as a part of the atlas """
+        return self.atlas.subsurface(self.index[name])
+
+
+def pack(sizes, width=ATLAS_WIDTH):
+    """ Place rectangles of the given sizes into rows ("shelves") of an atlas,
+        tallest first; return the atlas size and a list of (x, y) positions """
+    width = max([width] + [size[0] for size in sizes])
+    positions = [None] * len(sizes)
+    x = y = shelf = 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        if x + sizes[i][0] > width:    # row is full, start the next one
+            x, y, shelf = 0, y + shelf, 0
+        positions[i] = (x, y)
+        x += sizes[i][0]
+        shelf = max(shelf, sizes[i][1])
+    return (width, y + shelf), positions
+
+def build_bundle(filename=BUNDLE_FILE, names=BUNDLE_IMAGES, storage=PNG_ATLAS):
+    """ Pack the given image files into a bundle file """
+    images = [pygame.image.load(name) for name in names]
+    size, positions = pack([image.get_size() for image in images])
+    atlas = pygame.Surface(size, pygame.SRCALPHA, 32)
+    index = b""
+    for name, image, pos in zip(names, images, positions):
+        atlas.blit(image, pos)
+        encoded = name.encode("utf-8")
+        index += struct.pack("<B", len(encoded)) + encoded + ENTRY.pack(pos[0], pos[1], *image.get_size())
+
+    if storage == RAW_ATLAS:
+        payload = pygame.image.tostring(atlas, "RGBA")
+    else:   # pygame can only save PNGs to a named file
+        handle, temp = tempfile.mkstemp(suffix=".png")
+        os.close(handle)
+        pygame.image.save(atlas, temp)
+        with open(temp, "rb") as png:
+            payload = png.read()
+        os.remove(temp)
+
+    with open(filename, "wb") as bundle:
+        bundle.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, storage, size[0], size[1], len(names)))
+        bundle.write(index)
+        bundle.write(payload)
+
+if __name__ == '__main__':
+    if "--raw" in sys.argv:
+        build_bundle(storage=RAW_ATLAS)
+    else:
+        build_bundle()
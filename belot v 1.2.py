@@ -39,7 +39,7 @@ Strategy class has methods to analyze a hand and its strategic strength, as well
 
 """
 
-import pygame, sys, random, math, location
+import pygame, sys, random, math, location, timeline, assets, record, replay, rules, savegame, ponder, hint, bidvalue
 from pygame.locals import *
 
 # global constants
@@ -47,10 +47,22 @@ WIDTH = 1300
 HEIGHT = 900
 CENTER = [WIDTH // 2, HEIGHT // 2 - 50]
 FPS = 120
+ANIMATION_RATE = 120    # animation speeds are given in pixels per frame at this many frames per second
+IDLE_TIMEOUT = 500      # ms to block waiting for input when nothing is animating
+IDLEEVENT = USEREVENT + 1   # wakes up a blocking wait on pygame versions without a wait timeout
+PLAY_DELAY = 500        # ms pauses between computer moves, bids, and after the result of a game
+BID_DELAY = 700
+RESULT_DELAY = 2000
+RECORD_FILE = "games.rec"   # every deal played is recorded here (see record.py); None to turn it off
+SAVE_FILE = "belote.sav"    # the match in progress is saved here (see savegame.py); None to turn it off
+PONDER = True     # work the AI's moves out ahead on a background thread (see ponder.py)
+HINTS = True      # search for a hint for your card while you think (see hint.py)
+EXPECTED_BIDS = True    # the AI bids by its hand's expected powers after the cards to come (see bidvalue.py)
 
 # card constants
 CARD_SIZE = (72, 96)
 CARD_CENTER = (36, 48)
+HAND_POSITIONS = ((350, 650), (80, 150), (350, 80), (1150, 150))   # screen positions of Player 1 - 4
 # card orders and powers
 SUITS = ('C', 'S', 'H', 'D')
 RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
@@ -82,6 +94,12 @@ BROWN   = (156, 120,  64)
 BLUE    = ( 31,  28, 124)
 BGCOLOR = BLACK
 
+TIMELINE = timeline.Timeline()   # runs all animations; make it headless to skip animation time
+SCHEDULER = timeline.Scheduler()   # paces the game flow; set its turbo to 0 for fast-forward play
+RECORDER = None    # -> record.Writer; records the deals as they're played
+PONDERER = None    # -> ponder.Ponderer; thinks ahead of the AI's moves
+HINTER = None      # -> hint.Hinter; finds the card to suggest when you ask for a hint
+
 # class definitions
 class Card:
     def __init__(self, suit, rank):
@@ -184,6 +202,11 @@ class Hand:
         for card in self.hand:
             yield card
 
+    def __hash__(self):
+        # hash by name, so that dicts of players (like playhand) go over them in the same
+        # order every time, and a seeded game plays the same way every time
+        return hash(self.id)
+
     def add_card(self, card):
         """ Add the given card to the hand """ 
         self.hand.append(card)
@@ -229,7 +252,7 @@ class Hand:
             suit -> string"""
         subset = self.separate_suit(suit)
 
-        if suit in self.belotes:        # check for a belote in this suit; return its card if you have one    
+        if suit in self.belotes and getBelote(self, suit):   # check for a belote in this suit; return its card if you have one
             return self.announceBelote(getBelote(self, suit))
                        
         dec = self.find_card(self.hand, subset[-1])
@@ -262,7 +285,7 @@ class Hand:
                 else:   # give another low card, no need to be a trump
                     return self.clean("adversary")
         else:           # no other trump; take with the lowest trump available, or attempt to belote
-            if self.belotes:   # you have a belote, which is necessarily of the trump suit
+            if self.belotes and getBelote(self, trump):   # you have a belote, which is necessarily of the trump suit
                 return self.announceBelote(getBelote(self, trump))
             else:
                 dec = self.find_card(self.hand, subset[-1])
@@ -478,7 +501,7 @@ class Hand:
             assume that the relevant belote is in self.belotes and is valid """        
         for belot in self.belotes:            
             if belot.suit == belote_card.get_suit():
-                game.announces.append([self, belot])
+                declare(self, belot)
                 self.belotes.remove(belot)  # remove it so that it doesn't announce it again :)
                 if self.id == "Player 1":
                     game.gameMessage = MES.get_game_message("plbelot")
@@ -750,10 +773,11 @@ class Strategy:
                     if card_suit in self.partner_suits:
                         self.partner_suits.remove(card_suit)
                
-    def decide_bet(self, player, current_bid):
+    def decide_bet(self, player, current_bid, analysis=None):
         """ analyze the hand, the current bet and contract history;
-            then return a betting suggestion as a string """
-        power_suit, no_trump_power, all_trump_power = self.analyze_hand(player)
+            then return a betting suggestion as a string
+            analysis -> the result of analyze_hand(player), if it's already known """
+        power_suit, no_trump_power, all_trump_power = analysis or self.analyze_hand(player)
 
         if current_bid[1] == "pass":    # if player is the first to bid, or there are only passes
             if self.behavior == 'desperate':
@@ -848,7 +872,7 @@ class Strategy:
                             elif all_trump_power > 15 and self.behavior != "defensive":
                                 return "All trumps"
                             elif self.behavior == "desperate":
-                                return "No trump"
+                                return "No trumps"
                             else:                            
                                 return "pass"
                             
@@ -957,7 +981,8 @@ class Strategy:
                                 player.suit_power[suit] = "blocking"  # and attempt a bore
                                 action, addon = "bore", suit
                                 break
-                            else:
+                            else:   # only one card left, redesignate it, then continue the loop
+                                player.suit_power[suit] = "weak"
                                 continue
                 elif stance == "long":
                     if suit not in self.interesting_suits:
@@ -1012,9 +1037,11 @@ class Strategy:
         if action is None:
         # no matching suit found for now:
             if stance != 'weak':  # continue the recursion with the next stance
-                return self.CardStrategy(player, STRAT_ORDER[STRAT_ORDER.index(stance) + 1])
-            else:      # you've exhausted the stance list, make a last recursive call with the 'blocking' stance 
+                return self.CardStrategy(player, STRAT_ORDER[STRAT_ORDER.index(stance) + 1], lastIter)
+            elif not lastIter:  # you've exhausted the stance list, make a last recursive call with the 'blocking' stance 
                 return self.CardStrategy(player, "blocking", True)
+            else:      # nothing fits even then, leave it to the caller
+                return None, None
         else:
             return action, addon       
         
@@ -1167,7 +1194,8 @@ class GameState:
         FPSCLOCK.tick(FPS)
 
 class Animation():
-    """ Class handling animations in the game """
+    """ Class handling animations in the game. Movement and growth are driven by
+        tweens on the global TIMELINE, so they take the same time at any frame rate. """
     def __init__(self, image, pos, cardImage=False, moth=False):
         # set image file to use: if it's a card, choose appropriate part of the tiled image
         if cardImage:
@@ -1183,8 +1211,8 @@ class Animation():
         else:
             self.rect = self.image.get_rect()
             self.size = self.image.get_size()             
-        self.vel = [0, 0]
-        self.close_vel = [0, 0]   # a 'slowed' velocity, eye candy
+        self.motion = None     # -> timeline.Tween; drives the position while moving
+        self.growth = None     # -> timeline.Tween; drives the size while growing
         # set flags for movement
         self.in_motion = False
         if moth:
@@ -1192,37 +1220,34 @@ class Animation():
         else:
             self.moth = False
         self.growing = False
-        self.close = False
         
 
     def get_distance(self, a, b):
         return math.sqrt(((b[0] - a[0]) ** 2) + ((b[1] - a[1]) ** 2))
     
     def move(self, start, stop, speed):
-        """ Move the object from point start to point stop at speed """        
+        """ Move the object from point start to point stop at speed;
+            speed is in pixels per frame at ANIMATION_RATE frames per second """        
         self.destRect = Rect(stop[0], stop[1], self.rect[2], self.rect[3])   # this is the target position
-        # calculate the vector for movement
-        distance = [stop[0] - start[0], stop[1] - start[1]]
-        norm = math.sqrt(distance[0] ** 2 + distance[1] ** 2)        
-        direction = [distance[0] / norm, distance[1] / norm]        
-        vector = [direction[0] * math.sqrt(2), direction[1] * math.sqrt(2)]
-        self.vel[0] += vector[0] * speed     # now calculate the two velocities: one normal, and one slowed
-        self.vel[1] += vector[1] * speed
-        self.close_vel[0] = self.vel[0] * .4
-        self.close_vel[1] = self.vel[1] * .4
-               
+        # turn the speed into a duration; the easing slows the card down as it approaches
+        px_per_ms = speed * math.sqrt(2) * ANIMATION_RATE / 1000.0
+        duration = self.get_distance(start, stop) / px_per_ms
+        self.motion = TIMELINE.add(timeline.Tween(start, stop, duration, timeline.ease_out_quad))
+        
         self.in_motion = True
+        self.update()
              
     def grow(self, startSize, finalSize, scale):
-        """ Grow the object from size startSize to size finalSize by scale (x, y) """
-        self.scalar = scale
+        """ Grow the object from size startSize to size finalSize by scale (x, y) per frame
+            at ANIMATION_RATE frames per second """
         self.new_image = pygame.transform.scale(self.image, startSize)
         self.size = self.new_image.get_size()
-        self.pos[0] += finalSize[0] // 2 - startSize[0] // 2
-        self.pos[1] += finalSize[1] // 2 - startSize[1] // 2
-        self.destSize = finalSize    # this is the maximum size we want
+        self.center = [self.pos[0] + finalSize[0] // 2, self.pos[1] + finalSize[1] // 2]
+        frames = float(finalSize[0] - startSize[0]) / max(scale[0], 1)
+        self.growth = TIMELINE.add(timeline.Tween(startSize, finalSize, frames * 1000 / ANIMATION_RATE))
         
         self.growing = True
+        self.update()
                         
     def draw(self, canvas):
         if isinstance(self.image, Rect):
@@ -1234,74 +1259,82 @@ class Animation():
                 canvas.blit(self.image, self.pos)
 
     def update(self):
-        if self.in_motion:     # do the movement update, according to how close the card is to destination
-            if self.close:     # if it's approaching, slow down
-                self.pos[0] += self.close_vel[0]
-                self.pos[1] += self.close_vel[1]
-            else:              # else move at nominal speed 
-                self.pos[0] += self.vel[0]
-                self.pos[1] += self.vel[1]
+        """ Bring position and size in line with the tweens, which the TIMELINE advances """
+        if self.in_motion:
+            self.pos[0], self.pos[1] = self.motion.value()
             self.rect[0] = self.pos[0]
             self.rect[1] = self.pos[1]
-            # check how close the card is to dest, set the flag            
-            if self.get_distance(self.pos, (self.destRect[0], self.destRect[1])) < 80:
-                self.close = True                        
-
-            if self.get_distance(self.pos, (self.destRect[0], self.destRect[1])) < 5:
-                
-                self.pos[0] = self.destRect[0]    # the card arrived, stop it 
-                self.pos[1] = self.destRect[1]
-                self.vel[0] = 0
-                self.vel[1] = 0
+            if self.motion.done:      # the card arrived, stop it
                 self.in_motion = False
-        if self.growing:    # update the size of the card for growing images
-            self.new_image = pygame.transform.scale(self.image, (self.size[0] + self.scalar[0],
-                                                                 self.size[1] + self.scalar[1]))
-            self.size = self.new_image.get_size()
-            self.pos[0] -= self.scalar[0] // 2
-            self.pos[1] -= self.scalar[1] // 2
+        if self.growing:    # update the size of the image, keeping it centered
+            size = [int(value) for value in self.growth.value()]
+            if size != list(self.size):
+                self.new_image = pygame.transform.scale(self.image, size)
+                self.size = self.new_image.get_size()
+            self.pos[0] = self.center[0] - self.size[0] // 2
+            self.pos[1] = self.center[1] - self.size[1] // 2
                 
-            if self.size[0] >= self.destSize[0]:    # we reached max size, stop growing
+            if self.growth.done:    # we reached max size, stop growing
                 self.growing = False
                                           
 def main():
     global FPSCLOCK, SCREEN, CARD_IMAGES, CARD_BACK_IMAGE, SUIT_IMAGES, LANG_IMAGES, FONT1, FONT2, FONT3, FONT4
-    global FONT5, FONT6, BUTTON_IMAGES, BELOTE_PICTURE, MES, animations, stillImages
+    global FONT5, FONT6, BUTTON_IMAGES, BELOTE_PICTURE, MES, animations, stillImages, IMAGES
     global turnOrder, rund, deck, player1, player2, player3, player4, strategy1, strategy2, game, trump, rund 
+    global RECORDER, PONDERER, HINTER, contra, reContra
         
     pygame.init()
     FPSCLOCK = pygame.time.Clock() 
-    # initialize some more constants
-    FONT1 = pygame.font.SysFont("TimesNewRoman", 22)
-    FONT2 = pygame.font.SysFont("ArialRoundedMTBold", 32, True)
-    FONT3 = pygame.font.SysFont("Aharoni", 40, True)
-    FONT4 = pygame.font.SysFont("Kartika", 26, True)
-    FONT5 = pygame.font.SysFont("Castellar", 60, True)
-    FONT6 = pygame.font.SysFont("TimesNewRoman", 16)
+    # initialize some more constants; load only what the welcome screen needs first,
+    # the rest of the images load in the background meanwhile
+    fonts = assets.FontCache()
+    try:      # all images packed in a single file (see assets.py), if it was built
+        bundle = assets.Bundle()
+    except (EnvironmentError, ValueError):
+        bundle = None
+    FONT1 = fonts.font("TimesNewRoman", 22)
+    FONT2 = fonts.font("ArialRoundedMTBold", 32, True)
+    FONT5 = fonts.font("Castellar", 60, True)
     
     pygame.display.set_caption("Belote")
-    LANG_IMAGES = {'eng': pygame.image.load("eng_flag.png"),
-                   'bul': pygame.image.load("bg_flag.png")}
-    welcome()   # show the welcome screen
+    LANG_IMAGES = assets.Images({'eng': "eng_flag.png",
+                                 'bul': "bg_flag.png"}, bundle)
+    IMAGES = assets.Images({"belote": "belote_pic.png",
+                            "cards": "cards.png",
+                            "back": "card_back1.png"}, bundle)
+    SUIT_IMAGES = assets.Images({"C": "club.png",
+                                 "D": "diamond.png",
+                                 "H": "heart.png",
+                                 "S": "spade.png",
+                                 "No trumps": "no.png",
+                                 "All trumps": "all.png"}, bundle)
+    BUTTON_IMAGES = assets.Images({"large": "button_large.png",
+                                   "medium": "button_medium.png",
+                                   "small": "button_small.png",
+                                   "tiny": "button_tiny.png"}, bundle)
+    for images in (IMAGES, SUIT_IMAGES, BUTTON_IMAGES):
+        images.preload()
+    snapshot = None
+    if SAVE_FILE:     # a match was left unfinished, go on with it in the same language
+        snapshot = savegame.load(SAVE_FILE)
+    if snapshot:
+        MES = getattr(location, snapshot.language)()
+    else:
+        welcome()   # show the welcome screen
     SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))    
 
-    BELOTE_PICTURE = pygame.image.load('belote_pic.png')
-    CARD_IMAGES = pygame.image.load("cards.png")
-    CARD_BACK_IMAGE = pygame.image.load("card_back1.png")
-    SUIT_IMAGES = {"C": pygame.image.load("club.png"),
-                   "D": pygame.image.load("diamond.png"),
-                   "H": pygame.image.load("heart.png"),
-                   "S": pygame.image.load("spade.png"),
-                   "No trumps": pygame.image.load("no.png"),
-                   "All trumps": pygame.image.load("all.png")}
-    BUTTON_IMAGES = {"large": pygame.image.load("button_large.png"),
-                     "medium": pygame.image.load("button_medium.png"),
-                     "small": pygame.image.load("button_small.png"),
-                     "tiny": pygame.image.load("button_tiny.png")}
+    FONT3 = fonts.font("Aharoni", 40, True)
+    FONT4 = fonts.font("Kartika", 26, True)
+    FONT6 = fonts.font("TimesNewRoman", 16)
+    BELOTE_PICTURE = IMAGES["belote"]
+    CARD_IMAGES = IMAGES["cards"]
+    CARD_BACK_IMAGE = IMAGES["back"]
     
     # initialize variables
     rund = 1         # -> int, stores the state of the game
     trump = None      # -> suit stores the trump in power according to the announcement
+    contra = False
+    reContra = False
         
     # create players,strategies and the deck
     game = GameState()
@@ -1313,12 +1346,23 @@ def main():
     strategy2 = Strategy("Team 2")
     deck = Deck()
     deck.shuffle()
+    if RECORD_FILE:
+        RECORDER = record.Writer(RECORD_FILE)
+    if PONDER:
+        PONDERER = ponder.Ponderer()
+        PONDERER.start()
+    if HINTS:
+        HINTER = hint.Hinter()
+        HINTER.start()
     animations = []     # holds moving images from the Animation class
     stillImages = []    # holds images from Animation class standing still
     # esablish an initial turn order; pick a random player to be first
     turnOrder = [player1, player2, player3, player4]
-    first = game.switch_first(turnOrder)
-    changeTurnOrder(first)
+    if snapshot:
+        restoreSnapshot(snapshot)
+    else:
+        first = game.switch_first(turnOrder)
+        changeTurnOrder(first)
     
                                
     while True:    # main event loop
@@ -1328,14 +1372,18 @@ def main():
 
         # main game cycle
         if game.state == 1:
-             startBidding(SCREEN, turnOrder)   # do the bidding round
+            checkpoint()
+            startBidding(SCREEN, turnOrder)   # do the bidding round
         elif game.state == 2:
+            checkpoint()
             prepare(game.contract)             # make preparations, get announces
         elif game.state == 3:
             while rund < 9:                    # main play - exchange cards
+                checkpoint()
                 playRound(SCREEN)                
             game.state = 4    
         elif game.state == 4:                  # terminate the play; reveal announces, count winnings
+            checkpoint()
             finish()                           # adjust scores accordingly and continue with next bidding round
                 
         SCREEN.fill(BGCOLOR)        
@@ -1352,30 +1400,23 @@ def prepare(current_contract):
     game.bidMessage = None
     for player in turnOrder:
         deal(deck, player, 3)
+    prepareHands(current_contract, [player1])
+
+def prepareHands(current_contract, humans):
+    """ All players have their 8 cards; find their announces and set the AI's
+        suit powers, saved cards and suits of interest for the play.
+        current_contract -> String
+        humans -> list of Hands played by people, which need no AI """
+    for player in turnOrder:
         player.sort_hand()
         # get declarations if contract is different than No trumps
         # (in No trumps no declarations are valid)
-        if current_contract[1] != "No trumps":  
+        if current_contract[1] != "No trumps" and player.hand:
             player.get_announces()                 
         
-        if player == player1:   # set AI
+        if player in humans:   # set AI
             continue
-        # set the initial power of each suit in your hand
-        for suit in SUITS:                      
-            power = strategy1.get_suit_power(player.separate_suit(suit))
-            if power:
-                player.suit_power[suit] = power[2]
-        # set saved_cards        
-        for card in player.hand:                
-            if game.currentPower[card.get_suit()][card.get_rank()] == 8:
-                player.saved_cards.append(card)  # add if the strongest in a suit
-            if player.suit_power[card.get_suit()] == "blocking":
-                player.saved_cards.append(card)  # save if you're blocking this suit
-            if (card.get_rank() == "Q" or card.get_rank() == "K") and player.belotes:
-                for belot in player.belotes:
-                     # also save a belote so you don't lose it 
-                    if belot.suit == card.get_suit():
-                        player.saved_cards.append(card)
+        prepareAI(player)
     # 'save' the info from the bidding phaze for use during the round                    
     if strategy1.bid_history:
         for bid in strategy1.bid_history:    # if there are suits declared as bids earlier, add them to
@@ -1398,74 +1439,33 @@ def prepare(current_contract):
         
     game.state = 3    
     
+def prepareAI(player):
+    """ Set the initial power of each suit in a computer player's hand, and the cards it saves """
+    for suit in SUITS:                      
+        power = strategy1.get_suit_power(player.separate_suit(suit))
+        if power:
+            player.suit_power[suit] = power[2]
+    # set saved_cards        
+    for card in player.hand:                
+        if game.currentPower[card.get_suit()][card.get_rank()] == 8:
+            player.saved_cards.append(card)  # add if the strongest in a suit
+        if player.suit_power[card.get_suit()] == "blocking":
+            player.saved_cards.append(card)  # save if you're blocking this suit
+        if (card.get_rank() == "Q" or card.get_rank() == "K") and player.belotes:
+            for belot in player.belotes:
+                 # also save a belote so you don't lose it 
+                if belot.suit == card.get_suit():
+                    player.saved_cards.append(card)
+
 def finish():
     """ Adjust announces; count the winnings; set the winner and adjust scores
         accordingly. then gather back the cards, etc. """
-    result1 = strategy1.count(player1, player3)
-    result2 = strategy2.count(player2, player4)
-    message = ""
-
-    if game.last == 'Team 1':     # add last 10
-        result1 += 10
-    elif game.last == 'Team 2':
-        result2 += 10
-
-    if game.contract[1] == 'No trumps':  # double the results in No trump game
-        result1 *= 2
-        result2 *= 2
-        
-    if game.announces:      # add announces, if any
-        compareAnnounces()
-        for anons in game.announces:
-            if anons[1].vid == 'care':
-                if anons[0].team == 'Team 1':
-                    result1 += CARE_VALUE[anons[1].rank]
-                else:
-                    result2 += CARE_VALUE[anons[1].rank]
-            else:
-                if anons[0].team == 'Team 1':
-                    result1 += ANNOUNCE_VALUE[anons[1].vid]
-                else:
-                    result2 += ANNOUNCE_VALUE[anons[1].vid]
-    
-    # calculate the outcome of the current round
-    if result1 > result2:    # Team 1 has more points and wins
-        message = calculateResult('Team 1', result1, result2)
-    elif result2 > result1:  # Team 2 has more points and wins
-        message = calculateResult('Team 2', result2, result1)
-    else:           # the score is even, it 'hangs'
-        if not contra or not reContra:
-            if game.contract[0].team == 'Team 1':
-                game.team2Score += int(round(float(result1) / 10))
-                game.remaining += int(round(float(result2) / 10))
-                message = MES.make_even_result("T1")
-            elif game.contract[0].team == 'Team 2':
-                game.team1Score += int(round(float(result2) / 10))
-                game.remaining += int(round(float(result1) / 10))
-                message = MES.make_even_result("T2")
-        else:
-            if contra:
-                game.remaining += (int(round(float(res1) / 10)) + int(round(float(res2) / 10))) * 2
-            elif reContra:
-                game.remaining += (int(round(float(res1) / 10)) + int(round(float(res2) / 10))) * 4
-            message = MES.make_even_result("Evencontra")    
-    # check if any score passed 151, decide if the game ended
-    if game.team1Score > 151 and game.team2Score > 151:   # both teams 'exited' at the same time
-        if game.team1Score > game.team2Score:             # check who has more points 
-            gameOver(strategy1.team)                      # it's not possible that results were equal, because then one result 
-        elif game.team2Score > game.team1Score:           # would 'hang'
-            gameOver(strategy2.team)
-    elif game.team1Score > 151:              
-        if result2 == 0 and not game.lastRound:           # team 1 won, but you can't exit with 'capot', play a last round
-            game.lastRound = True
-        else:
-            gameOver(strategy1.team)
-    elif game.team2Score > 151 and not game.lastRound:
-        if result1 == 0:                                  # team 2 won, but you can't exit with 'capot', play a last round
-            game.lastRound = True
-        else:
-            gameOver(strategy2.team)
-    else:       # the game continues, display a message        
+    result1, result2 = countResults()
+    message = scoreResults(result1, result2)
+    if RECORDER:
+        RECORDER.end(game.team1Score, game.team2Score)
+    winner = checkGameOver(result1, result2)
+    if winner is None:       # the game continues, display a message        
         changeTeamStrategy(strategy1, game.team1Score, game.team2Score)
         changeTeamStrategy(strategy2, game.team2Score, game.team1Score)
         mes, mesRect = makeText(message, FONT3, RED)
@@ -1484,83 +1484,61 @@ def finish():
         pygame.display.update()
         FPSCLOCK.tick(FPS) 
        
-        pygame.time.wait(2000)
+        pause(RESULT_DELAY)
+    elif winner != "last round":
+        gameOver(winner)
         
     cleanAll()
 
-def calculateResult(win, res1, res2):
-    """ Calculate the final score from the game and add it accordingly to team scores.
-        Assume res1 is always the higher of the two.
-        win -> String
-        re1, res2 -> Int"""
-    winner = 0
-    loser = 0
-    message = ""
-    if win == game.contract[0].team:   # the bidding team made their contract
-        if res1 == 0 or res2 == 0:     # the 'capot' case; bonus 9 points, but no announce bonuses!
-            if BID_ORDER.index(game.contract[1]) < 5:
-                winner += 26
-                if contra:
-                    winner *= 2
-                elif reContra:
-                    winner *= 2
-            else:
-                winner += 35
-                if contra:
-                    winner *= 2
-                elif reContra:
-                    winner *= 2
-            message = MES.make_result("wincapo", win)    
-        else:                   # the normal case; all results are added accordingly           
-            if contra:
-                message = MES.make_result("wincontra", win)
-                winner += (int(round(float(res1) / 10)) + int(round(float(res2) / 10))) * 2
-            elif reContra:
-                message = MES.make_result("winrecontra", win)
-                winner += (int(round(float(res1) / 10)) + int(round(float(res2) / 10))) * 4
-            else:
-                winner += int(round(float(res1) / 10))
-                loser += int(round(float(res2) / 10))
-                message = MES.make_result("win", win)
-    elif win != game.contract[0].team:   # the bidding team is 'inside'
-        if res1 == 0 or res2 == 0:       # the 'capo' case; bonus 10 points, but no announce bonuses!
-            if BID_ORDER.index(game.contract[1]) < 5:
-                winner += 26
-                if contra:
-                    winner *= 2
-                elif reContra:
-                    winner *= 2
-            else:
-                winner += 35
-                if contra:
-                    winner *= 2
-                elif reContra:
-                    winner *= 2
-            message = MES.make_result("losecapo", game.contract[0].team)
-        else:                   # the normal case; all results are added accordingly
-            if contra:
-                message = MES.make_result("losecontra", game.contract[0].team)
-                winner += (int(round(float(res1) / 10)) + int(round(float(res2) / 10))) * 2
-            elif reContra:
-                message = MES.make_result("loserecontra", game.contract[0].team)
-                winner += (int(round(float(res1) / 10)) + int(round(float(res2) / 10))) * 4
-            else:
-                winner += (int(round(float(res1) / 10)) + int(round(float(res2) / 10)))
-                message = MES.make_result("lose", game.contract[0].team)
-                
-    if game.remaining > 0:    # if there was a 'hanging' result, add it to the winner, clear the 'hanging variable'
-        winner += game.remaining
-        game.remaining = 0
-        
-    if win == 'Team 1':
-        game.team1Score += winner
-        game.team2Score += loser
-    elif win == 'Team 2':
-        game.team2Score += winner
-        game.team1Score += loser
-
-    return message    
-        
+def countResults():
+    """ Count the points each team made this game: their winnings, the last 10
+        and the announces which count; return them as a pair of ints """
+    teams = ['Team 1', 'Team 2']
+    points = [strategy1.count(player1, player3), strategy2.count(player2, player4)]
+    last = teams.index(game.last) if game.last in teams else None
+    announces = [(teams.index(anons[0].team), anons[1].vid, anons[1].suit, anons[1].last_card, anons[1].rank)
+                 for anons in game.announces]
+    announced = rules.counted_announces(game.contract[1], announces)
+    result1, result2 = rules.deal_points(game.contract[1], points, last, announced)
+    return result1, result2
+
+def scoreResults(result1, result2):
+    """ Add the outcome of the game to the team scores; return the message telling it """
+    bidder = game.contract[0].team
+    doubling = 2 if reContra else 1 if contra else 0
+    score1, score2, game.remaining = rules.score_deal(game.contract[1], ['Team 1', 'Team 2'].index(bidder),
+                                                      doubling, result1, result2, game.remaining)
+    game.team1Score += score1
+    game.team2Score += score2
+    if result1 == result2:     # the score is even, it 'hangs'
+        return MES.make_even_result("T1" if bidder == 'Team 1' else "T2")
+    outcome = "win" if (result1 > result2) == (bidder == 'Team 1') else "lose"
+    if result1 == 0 or result2 == 0:
+        return MES.make_result(outcome + "capo", bidder)
+    return MES.make_result(outcome + ("", "contra", "recontra")[doubling], bidder)
+
+def checkGameOver(result1, result2):
+    """ Check if any score passed 151 and the game ended; return the team which won,
+        "last round" if the winner has to play one more round, or None if the game goes on """
+    if game.team1Score > 151 and game.team2Score > 151:   # both teams 'exited' at the same time
+        if game.team1Score > game.team2Score:             # check who has more points 
+            return strategy1.team                         # it's not possible that results were equal, because then one result 
+        elif game.team2Score > game.team1Score:           # would 'hang'
+            return strategy2.team
+    elif game.team1Score > 151:              
+        if result2 == 0 and not game.lastRound:           # team 1 won, but you can't exit with 'capot', play a last round
+            game.lastRound = True
+            return "last round"
+        else:
+            return strategy1.team
+    elif game.team2Score > 151 and not game.lastRound:
+        if result1 == 0:                                  # team 2 won, but you can't exit with 'capot', play a last round
+            game.lastRound = True
+            return "last round"
+        else:
+            return strategy2.team
+    return None
+
 def changeTeamStrategy(friend, friendScore, enemyScore):
     """ Analyze the scores and change team strategy respectively;
         friend -> Strategy
@@ -1605,6 +1583,12 @@ def deal(deck, player, num_cards):
     
     for card in xrange(num_cards):    # actually deal the cards :)
         player.add_card(deck.deal_card())
+    if RECORDER:
+        RECORDER.cards(getSeat(player), [(card.suit, card.rank) for card in player.hand[-num_cards:]])
+
+def getSeat(player):
+    """ Return the seat of the player (0 - 3 for Player 1 - 4), as used in records """
+    return [player1, player2, player3, player4].index(player)
 
 def changeTurnOrder(first):
     """ Changes the order in which players will play their hands.
@@ -1617,17 +1601,47 @@ def changeTurnOrder(first):
     
     return turnOrder
 
-def checkForClick():
-    """ Check the queue for mouseclick events; return a single event.
-        This should act only when the game waits for player input, and not 
-        when processing computer turns! """    
-            
-    for event in pygame.event.get():
-        if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
-            terminate()
-        if event.type == MOUSEBUTTONUP:                
-            return event
+def waitForEvents(timeout=IDLE_TIMEOUT):
+    """ Return the events in the queue. While animations run, pace the frames at FPS;
+        otherwise block until an event arrives or timeout ms pass, so that waiting
+        for player input doesn't use the CPU. Returns an empty list on timeout. """
+    if TIMELINE.active():
+        FPSCLOCK.tick(FPS)
+        return pygame.event.get()
+    try:
+        event = pygame.event.wait(timeout)
+    except TypeError:     # older pygame can't time out; wake up with a timer event instead
+        pygame.time.set_timer(IDLEEVENT, timeout)
+        event = pygame.event.wait()
+        pygame.time.set_timer(IDLEEVENT, 0)
+    events = [event] + pygame.event.get()
+    return [event for event in events if event.type != NOEVENT and event.type != IDLEEVENT]
     
+def pause(delay):
+    """ Defer the next step of the game by delay ms (scaled by the SCHEDULER's turbo factor).
+        Unlike pygame.time.wait, events keep being processed meanwhile, so the window
+        can be closed or redrawn; pressing T toggles turbo (fast-forward) play. """
+    ready = []
+    SCHEDULER.call_later(delay, lambda: ready.append(True))
+    events = pygame.event.get()
+    last_tick = pygame.time.get_ticks()
+    while True:
+        for event in events:
+            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+                terminate()
+            elif event.type == KEYUP and event.key == K_t:
+                SCHEDULER.set_turbo(0.0 if SCHEDULER.turbo else 1.0)
+            elif event.type == KEYUP and event.key == K_r and game.state == 4:
+                replayDeal()      # the deal just ended, look back at it
+            elif event.type == VIDEOEXPOSE or event.type == ACTIVEEVENT:
+                pygame.display.update()     # the last frame is still on SCREEN, show it again
+        now = pygame.time.get_ticks()
+        SCHEDULER.advance(now - last_tick)
+        last_tick = now
+        if ready:
+            return
+        events = waitForEvents(int(max(SCHEDULER.next_due(), 1)))
+
 def getCardClicked(x):
     """ Returns an index of the card clicked; only applies to player1 """
     return (x - 350) // (CARD_SIZE[0] - 20)
@@ -1662,62 +1676,11 @@ def getHighest(hand, suit_required):
         according to suit_required currently. Assume the hand is a dict.
         hand -> Dict of player: card
         suit_required -> String """
-    cards = [card for card in hand.values()]
-    
-    def power(card):
-        """ get the current value of the card; value = value if the card is from the suit required;
-           if it's not, value = 0; if it's a trump - value + 10 """
-        value = card.get_power()
-        if card.get_suit() != suit_required and card.get_suit() == trump:
-            value += 10
-        elif card.get_suit() != suit_required:
-            value = 0        
-        return value    
-    
-    result = sorted(cards, key=power)
-    result.reverse()
-
-    for player, card in hand.items():
-        if card == result[0]:
-            return [player, card]    
-
-def compareAnnounces():
-    """ Compare the announces at the end of a game; eliminate lower-order
-        sequences if higher order sequence of the same length is present.
-        Assume that only competing sequences are left ( 3 - 3, 4 - 4, cares, etc) """
-    win_seq = None
-    win_care = None
-    for anons in game.announces: 
-        if anons[1].vid == 'belote':   # skip belotes
-            continue
-        elif anons[1].vid == 'care':   # check cares
-            if win_care is None:
-                win_care = anons
-            else:
-                if CARE_ORDER.index(anons[1].rank) > CARE_ORDER.index(win_care[1].rank):
-                    win_care = anons
-        else:         # check sequences        
-            if win_seq is None:
-                win_seq = anons  # set the winning sequence so far
-            else:
-                if ANNOUNCE_ORDER.index(win_seq[1].last_card) < ANNOUNCE_ORDER.index(anons[1].last_card):
-                    win_seq = anons   # switch the winning sequence if its higher than the current one
-                if ANNOUNCE_ORDER.index(win_seq[1].last_card) == ANNOUNCE_ORDER.index(anons[1].last_card):# if sequences are equal
-                    if BID_ORDER.index(game.contract[1]) < 5 and anons[1].suit == trump:    # if it's a trump game
-                        win_seq = anons                        # and one sequence is from the trump suit, it wins
-                    elif BID_ORDER.index(win_seq[1].suit) < BID_ORDER.index(anons[1].suit):
-                        win_seq = anons       # if not trump game, compare suits
-    # now update game.announces - only announces from the team of the winning sequences count (excluding belotes)
-    for anons in game.announces[:]:
-        if anons[1].vid == 'belote':
-            continue
-        elif anons[1].vid == 'care':
-            if anons[0].team != win_care[0].team:
-                game.announces.remove(anons)
-        else:
-            if anons[0].team != win_seq[0].team:
-                game.announces.remove(anons)
-                
+    # the power of each card in the trick: its power if it's from the suit required,
+    # 10 more if it's a trump of another suit, else 0 (see rules.trick_power)
+    powers = rules.TRICK_POWERS[game.contract[1]][rules.SUITS.index(suit_required)]
+    return list(max(hand.items(), key=lambda (player, card): powers[rules.ORDINALS[card.suit, card.rank]]))
+
 def findOverlapSequence(player, care):
     """ if a player has both a carre and a sequence, check if
         a card of the carre makes part of the sequence; if so,
@@ -1746,12 +1709,12 @@ def getBelote(player, suit=None):
         if suit:
             for card in player.hand:
                 if card.get_suit() == suit and \
-                card.get_rank() == "K" or card.get_rank() == "Q":
+                (card.get_rank() == "K" or card.get_rank() == "Q"):
                     return card
         else:
             for card in player.hand:
                 if card.get_suit() in player.belotes and \
-                card.get_rank() == "K" or card.get_rank() == "Q":
+                (card.get_rank() == "K" or card.get_rank() == "Q"):
                     return card          
 
 def announce(player):
@@ -1762,7 +1725,7 @@ def announce(player):
     if player.announces:
         for anons in player.announces[:]:  
             if not game.announces:        # if there's no announces declared, add automatically
-                game.announces.append([player, anons])
+                declare(player, anons)
             else:        # check existing announces to see if there's no longer sequence
                 if anons.vid == 3:   # add it if there isn't, or if its declarator is from your team; 
                     longer = False   # also remove existing shorter sequences if declared by the other team
@@ -1770,7 +1733,7 @@ def announce(player):
                         if anons_made[0].team != player.team and (anons_made[1].vid == 4 or anons_made[1].vid == 5):
                             longer = True
                     if not longer:
-                        game.announces.append([player, anons])
+                        declare(player, anons)
                         player.announces.remove(anons)
                         game.gameMessage = MES.get_game_message("seq3", player.id)
                 elif anons.vid == 4:
@@ -1781,21 +1744,29 @@ def announce(player):
                         if anons_made[0].team != player.team and anons_made[1].vid == 5:
                             longer = True
                     if not longer:
-                        game.announces.append([player, anons])
+                        declare(player, anons)
                         player.announces.remove(anons)
                         game.gameMessage = MES.get_game_message("seq4", player.id)
                 elif anons.vid >= 5:
                     for anons_made in game.announces[:]:
                         if anons_made[0].team != player.team and (anons_made[1].vid == 3 or anons_made[1].vid == 4):
                             game.announces.remove(anons_made)
-                    game.announces.append([player, anons])
+                    declare(player, anons)
                     player.announces.remove(anons)
                     game.gameMessage = MES.get_game_message("seq5", player.id)
                 elif anons.vid == 'care':
-                    game.announces.append([player, anons])
+                    declare(player, anons)
                     player.announces.remove(anons)
                     game.gameMessage = MES.get_game_message("care", player.id)
                     
+def declare(player, anons):
+    """ Put the given announce of the player in play, and record it.
+        player -> Hand
+        anons -> Anons """
+    game.announces.append([player, anons])
+    if RECORDER:
+        RECORDER.announce(getSeat(player), anons.vid, anons.suit, anons.last_card, anons.rank)
+
 def playerAnnounce(surface):
     """ create a new window with buttons for player announces;
         in response to clicks attempt to announce """
@@ -1809,9 +1780,28 @@ def playerAnnounce(surface):
         Button5, Rect5 = loadButton("5", BLACK, BUTTON_IMAGES["tiny"], 150, 700)
         care, careRect = loadButton(MES.get_button(10), BLACK, BUTTON_IMAGES["small"], 70, 750)
         done = False
+        redraw = True
         
         while not done:
-            for event in pygame.event.get():     # event loop
+            if redraw:     # draw only after something happened
+                surface.fill(BGCOLOR)
+                display()
+                pygame.draw.rect(SCREEN, BLUE, (60, 640, 200, 150))
+                pygame.draw.rect(SCREEN, SILVER, (60, 640, 200, 150), 3)
+                surface.blit(seqText, (70, 650))
+                surface.blit(doneButton, doneButtonRect)
+                surface.blit(Button3, Rect3)
+                surface.blit(Button4, Rect4)
+                surface.blit(Button5, Rect5)
+                surface.blit(care, careRect)
+                if stillImages:
+                    for image in stillImages:
+                        image.draw(SCREEN)
+                game.draw(SCREEN)
+                redraw = False
+                
+            for event in waitForEvents():     # event loop
+                redraw = True
                 if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                     terminate()
                 if event.type == MOUSEBUTTONUP:
@@ -1823,7 +1813,7 @@ def playerAnnounce(surface):
                     elif careRect.collidepoint(x, y):                                               
                         for anons in player1.announces:
                             if anons.vid == 'care':
-                                game.announces.append([player1, anons])
+                                declare(player1, anons)
                                 player1.announces.remove(anons)
                                 game.gameMessage = MES.get_game_message("plcare")
                             else:
@@ -1832,7 +1822,7 @@ def playerAnnounce(surface):
                         for anons in player1.announces:
                             if anons.vid == 3:              # found a 3, attempt to declare it
                                 if not game.announces:      # if no announces, append automatically
-                                    game.announces.append([player1, anons])
+                                    declare(player1, anons)
                                     player1.announces.remove(anons)
                                     game.gameMessage = MES.get_game_message("plseq3")
                                 else:    
@@ -1842,7 +1832,7 @@ def playerAnnounce(surface):
                                            (anons_made[1].vid == 4 or anons_made[1].vid == 5):
                                             longer = True
                                     if not longer:
-                                        game.announces.append([player1, anons])
+                                        declare(player1, anons)
                                         player1.announces.remove(anons)
                                         game.gameMessage = MES.get_game_message("plseq3")
                                     else:
@@ -1853,7 +1843,7 @@ def playerAnnounce(surface):
                         for anons in player1.announces:
                             if anons.vid == 4:
                                 if not game.announces:     
-                                    game.announces.append([player1, anons])
+                                    declare(player1, anons)
                                     player1.announces.remove(anons)
                                     game.gameMessage = MES.get_game_message("plseq4") 
                                 else:
@@ -1864,7 +1854,7 @@ def playerAnnounce(surface):
                                         if anons_made[0].team != 'Team 1' and anons_made[1].vid == 5:
                                             longer = True
                                     if not longer:
-                                        game.announces.append([player1, anons])
+                                        declare(player1, anons)
                                         player1.announces.remove(anons)
                                         game.gameMessage = MES.get_game_message("plseq4")
                                     else:
@@ -1875,36 +1865,18 @@ def playerAnnounce(surface):
                         for anons in player1.announces:
                             if anons.vid >= 5:
                                 if not game.announces:
-                                    game.announces.append([player1, anons])
+                                    declare(player1, anons)
                                     player1.announces.remove(anons)
                                 else:                                        # there's no longer sequence than 5, append it automatically                                  
                                     for anons_made in game.announces[:]:     # and remove shorter sequences by other team players
                                         if anons_made[0].team != 'Team 1' and \
                                            (anons_made[1].vid == 3 or anons_made[1].vid == 4):  
                                             game.announces.remove(anons_made)
-                                    game.announces.append([player1, anons])   
+                                    declare(player1, anons)   
                                     player1.announces.remove(anons)          
                                     game.gameMessage = MES.get_game_message("plseq5")
                             else:
                                 game.playerMessage = MES.get_player_message("noseq5")
-                
-            surface.fill(BGCOLOR)
-            display()
-            pygame.draw.rect(SCREEN, BLUE, (60, 640, 200, 150))
-            pygame.draw.rect(SCREEN, SILVER, (60, 640, 200, 150), 3)
-            surface.blit(seqText, (70, 650))
-            surface.blit(doneButton, doneButtonRect)
-            surface.blit(Button3, Rect3)
-            surface.blit(Button4, Rect4)
-            surface.blit(Button5, Rect5)
-            surface.blit(care, careRect)
-            if stillImages:
-                for image in stillImages:
-                    image.draw(SCREEN)
-            game.draw(SCREEN)
-
-            pygame.display.update()
-            FPSCLOCK.tick(FPS)
    
 def analyze(player, current_playhand, suit_required):
     """ Analyzes the current state of the game, according to the hand being played,
@@ -1979,58 +1951,135 @@ def analyze(player, current_playhand, suit_required):
         
     return action, addon
 
-def makeMove(player, current_playhand, suit_required):
-    """ For a computer player, play a suitable card from its hand"""
-    global playhand, required
-    
+def chooseMove(player, current_playhand, suit_required):
+    """ For a computer player, pick a suitable card and take it out of its hand;
+        return its former position in the hand and the Card """
     action, add_info = analyze(player, current_playhand, suit_required)
     
     if action == "take":
-        pos, card = player.take(suit_required, add_info)
-        playhand[player] = card
+        return player.take(suit_required, add_info)
     elif action == "respond":
-        pos, card = player.respond(suit_required)
-        playhand[player] = card
+        return player.respond(suit_required)
     elif action == "trump":
-        pos, card = player.trump(trump, add_info)
-        playhand[player] = card    
+        return player.trump(trump, add_info)
     elif action == "clean":
         if add_info.team == player.team:
-            pos, card = player.clean("partner")
-            playhand[player] = card
+            return player.clean("partner")
         elif add_info.team != player.team:
-            pos, card = player.clean("adversary")
-            playhand[player] = card
-    elif action == "demand":
-        pos, card = player.attack(add_info, action)
-        playhand[player] = card
-        required = card.get_suit()
-    elif action == "bore":
-        pos, card = player.attack(add_info, action)
-        playhand[player] = card
-        required = card.get_suit()
+            return player.clean("adversary")
+    elif action == "demand" or action == "bore":
+        return player.attack(add_info, action)
     elif action == "partner":
-        pos, card = player.find_partner(add_info)
-        playhand[player] = card
-        required = card.get_suit()
+        return player.find_partner(add_info)
     elif action == "pass":
-        pos, card = player.clean("adversary")
-        playhand[player] = card
-        required = card.get_suit()
-    elif action == 'belote':
-        pos, card = player.announceBelote(add_info)
-        playhand[player] = card
-        required = card.get_suit()
+        return player.clean("adversary")
+    elif action == 'belote' and add_info:
+        return player.announceBelote(add_info)
+    return player.play_card(0)
+
+def checkCard(player, card, current_playhand, suit_required):
+    """ Check if the player may play the given card in the current round: follow suit,
+        trump and go higher as the rules require. Return the key of the message
+        explaining why not, or None if the card is allowed. """
+    if suit_required is None:    # the player leads, any card goes
+        return None
+    winning = getHighest(current_playhand, suit_required)
+    # block giving a card other than the suit required, if you have it
+    if player.has_suit(suit_required) and card.get_suit() != suit_required:
+        return "answer"
+    elif card.get_suit() == suit_required:
+        # if you are responding, check the power of the card
+        respond_set = player.separate_suit(suit_required)
+        if game.contract[1] == "All trumps" or \
+           (BID_ORDER.index(game.contract[1]) < 5 and suit_required == trump):
+            # in All trumps and the trump suit of a suit game, you have to go higher if you can
+            if card.get_power() < winning[1].get_power() and \
+                player.has_higher(respond_set, winning[1]):
+                return "higher"
+    elif not player.has_suit(suit_required):           # if you can't respond
+        if BID_ORDER.index(game.contract[1]) < 5:  # it's a SUIT GAME, YEEEE:
+            if winning[1].get_suit() != trump:     # if winning card isn't a trump
+                if (player.has_suit(trump) and card.get_suit() != trump) and \
+                   winning[0].team != player.team:
+                    return "trump"
+            else:                                   # if it IS a trump:
+                respond_set = player.separate_suit(trump)
+                if winning[0].team != player.team:    # you need to trump if the adversary is winning
+                    if (player.has_suit(trump) and player.has_higher(respond_set, winning[1])) and \
+                        card.get_suit() != trump:
+                        return "trump"
+                    elif card.get_suit() == trump and \
+                         (card.get_power() < winning[1].get_power() and \
+                           player.has_higher(respond_set, winning[1])):
+                        return "hightrump"
+    return None
+
+def playCard(player, card, suit_required):
+    """ Play a card a person chose from their hand, declaring a belote with it if they can;
+        return its former position in the hand and the Card """
+    if card.get_rank() in ("Q", "K") and card.get_suit() in player.belotes and \
+       suit_required == card.get_suit():
+        return player.announceBelote(card)
+    return player.play_card(player.find_card(player.hand, card))
+
+def playMove(player, move):
+    """ Play a ponder.Move worked out ahead for a computer player, making the same changes
+        chooseMove() would have; return the card's former position in the hand and the Card """
+    team = strategy1 if player.team == "Team 1" else strategy2
+    player.suit_power = dict(move.suit_power)
+    team.partner_suits = list(move.partner_suits)
+    team.interesting_suits = list(move.interesting_suits)
+    card = Card(*rules.ordinal_card(move.card))
+    if move.belote:
+        played = player.announceBelote(card)
+    else:
+        played = player.play_card(player.find_card(player.hand, card))
+    player.belotes = [belot for belot in player.belotes if belot.suit in move.belotes]   # a card cleaned may break one
+    return played
+
+def currentTrick(current_playhand):
+    """ Return the cards played so far this round as a list of (seat, card ordinal), in order """
+    return [(getSeat(player), rules.card_ordinal(current_playhand[player].suit, current_playhand[player].rank))
+            for player in turnOrder if player in current_playhand]
+
+def legalCards(player, current_playhand, suit_required):
+    """ Return the cards of the player's hand which may be played in the current round """
+    return [card for card in player.hand if not checkCard(player, card, current_playhand, suit_required)]
+
+def makeMove(player, current_playhand, suit_required):
+    """ For a computer player, play a suitable card from its hand"""
+    global playhand, required
+    
+    move = PONDERER.lookup(currentTrick(current_playhand)) if PONDERER else None
+    if move:     # worked out ahead
+        pos, card = playMove(player, move)
     else:
-        pos, card = player.play_card(0)
+        pos, card = chooseMove(player, current_playhand, suit_required)
+    playhand[player] = card
+    if suit_required is None:    # the player leads, its suit is required
         required = card.get_suit()
-        playhand[player] = card
+    if PONDERER and not move:    # the moves worked out ahead went another way, start over from here
+        PONDERER.think(makeSnapshot(), currentTrick(playhand))
     # make the necessary animations  
     other_card = Animation(card, findCardCoords(player, pos), True)
     other_card.move(other_card.pos, player.cardDest, 12)
     animations.append(other_card)
     return playhand   
     
+def finishTrick():
+    """ Everybody played a card this round; give the cards to the player who took them,
+        who also plays first in the next round. Return that player. """
+    global rund
+    winner = getHighest(playhand, required)[0]
+    strategy1.post_analysis(playhand, [player1, player3])
+    strategy2.post_analysis(playhand, [player2, player4])
+    winner.collect_hand(playhand)
+    changeTurnOrder(winner)
+    if rund == 8:
+        game.last = winner.team
+    rund += 1
+    return winner
+    
 def playRound(surface):
     """ Executes a round of Belot. Each player has to play a card,
         cards are compared and the player who gave the strongest card
@@ -2041,6 +2090,7 @@ def playRound(surface):
     required = None  # -> string; stores the suit that's been asked in this round
     endTurn = [False, False, False, False]   # keep track of who played already
     anonsButton, anonsButtonRect = loadButton(MES.get_button(9), BLACK, BUTTON_IMAGES["large"], 230, 690)
+    hintButton, hintButtonRect = loadButton(MES.get_button(12), BLACK, BUTTON_IMAGES["large"], 230, 730)
     # map player screen coordinates for drawing purposes
     player1.cardDest = [CENTER[0] - CARD_CENTER[0], CENTER[1] + CARD_CENTER[1] * 2.5]
     player2.cardDest = [CENTER[0] - CARD_SIZE[0] * 2.5, CENTER[1] - CARD_CENTER[1]]
@@ -2056,6 +2106,8 @@ def playRound(surface):
     card_clicked = False
     # this is to prevent unwanted click events 
     pygame.event.clear()
+    if PONDERER:     # work out the AI's moves of this round while the others play
+        PONDERER.think(makeSnapshot(), [])
     
     while not done:
         for player in turnOrder:
@@ -2065,20 +2117,40 @@ def playRound(surface):
             game.gameMessage = None
             game.playerMessage = None            
             if player == player1:                                
+                redraw = True     # draw only on input or while animating
+                hinted = None     # -> ordinal of the card the Hint button suggests
+                if HINTER:        # look for a hint while the player thinks
+                    HINTER.think(makeSnapshot(), currentTrick(playhand))
                 while not endTurn[turnOrder.index(player1)]:
                     # player interactive loop            
-                    card_clicked = False                                        
-                    for event in pygame.event.get(MOUSEMOTION):                        
-                        x, y = event.pos
-                        if player1.rect.collidepoint(x, y):
-                            cardPos = getCardClicked(x)
-                            highlightPos = 350 + cardPos * (CARD_SIZE[0] - 20)
-                            highlight = True
+                    card_clicked = False
+                    click = None
+                    if redraw:
+                        events = pygame.event.get()
+                    else:
+                        events = waitForEvents()
+                    for event in events:
+                        if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+                            terminate()
+                        elif event.type == MOUSEMOTION:
+                            x, y = event.pos
+                            if player1.rect.collidepoint(x, y):
+                                if not highlight or cardPos != getCardClicked(x):
+                                    redraw = True     # the highlight moved to another card
+                                cardPos = getCardClicked(x)
+                                highlightPos = 350 + cardPos * (CARD_SIZE[0] - 20)
+                                highlight = True
+                            else:
+                                if highlight:
+                                    redraw = True
+                                highlight = False
+                        elif event.type == MOUSEBUTTONUP:
+                            click = event
                         else:
-                            highlight = False
+                            redraw = True
                     
-                    click = checkForClick()
                     if click:
+                        redraw = True
                         mousex, mousey = click.pos
                         if player1.rect.collidepoint(mousex, mousey):  # clicked on a card
                             card_clicked = True                               
@@ -2086,6 +2158,12 @@ def playRound(surface):
                         elif anonsButtonRect.collidepoint(mousex, mousey) and \
                                  (rund == 1 and game.contract[1] != "No trumps"):
                             playerAnnounce(SCREEN)
+                            if PONDERER:    # the announces changed what the AI knows
+                                PONDERER.think(makeSnapshot(), currentTrick(playhand))
+                            if HINTER:
+                                HINTER.think(makeSnapshot(), currentTrick(playhand))
+                        elif HINTER and hintButtonRect.collidepoint(mousex, mousey):
+                            hinted = HINTER.hint()    # the best card found so far
                                                                 
                     if card_clicked:
                         # process the card click                        
@@ -2094,58 +2172,26 @@ def playRound(surface):
                         if True not in endTurn:   # if player is the first to play this round
                             required = player_card.get_suit()  # set required to his card's suit
                         else:           # player isn't first; set some blocks                                    
-                            winning = getHighest(playhand, required)
-                            # block giving a card other than the suit required, if you have it
-                            if player1.has_suit(required) and player_card.get_suit() != required:
-                                game.playerMessage = MES.get_player_message("answer")                                
+                            error = checkCard(player1, player_card, playhand, required)
+                            if error:
+                                game.playerMessage = MES.get_player_message(error)
                                 continue
-                            elif player_card.get_suit() == required:
-                                # if you are responding, check the power of the card
-                                respond_set = player1.separate_suit(required)
-                                if game.contract[1] == "All trumps" or \
-                                   (BID_ORDER.index(game.contract[1]) < 5 and required == trump):
-                                    # in All trumps and the trump suit of a suit game, you have to go higher if you can
-                                    if player_card.get_power() < winning[1].get_power() and \
-                                        player1.has_higher(respond_set, winning[1]):
-                                        game.playerMessage = MES.get_player_message("higher")                                        
-                                        continue
-                            elif not player1.has_suit(required):           # if you can't respond
-                                if BID_ORDER.index(game.contract[1]) < 5:  # it's a SUIT GAME, YEEEE:                                                                                
-                                    if winning[1].get_suit != trump:       # if winning card isn't a trump
-                                        if (player1.has_suit(trump) and player_card.get_suit() != trump) and \
-                                           winning[0].team != player1.team:
-                                            game.playerMessage = MES.get_player_message("trump")                                           
-                                            continue
-                                    else:                                   # if it IS a trump:
-                                        respond_set = player1.separate_suit(trump)
-                                        if winning[0].team != player1.team:    # you need to trump if the adversary is winning
-                                            if (player1.has_suit(trump) and player1.has_higher(respond_set, winning[1])) and \
-                                                player_card.get_suit() != trump:
-                                                game.playerMessage = MES.get_player_message("trump")                                                
-                                                continue 
-                                            elif player_card.get_suit() == trump and \
-                                                 (player_card.get_power() < winning[1].get_power() and \
-                                                   player1.has_higher(respond_set, winning[1])):
-                                                game.playerMessage = MES.get_player_message("hightrump")                                                
-                                                continue
-                        # do the actual card processing 
-                        if player_card.get_rank() == "Q" or player_card.get_rank() == "K":  # check for belote
-                            if player_card.get_suit() in player1.belotes and required == player_card.get_suit():                                
-                                player_pos, play_card = player1.announceBelote(player_card)
-                                playhand[player1] = player_card#                               
-                            else:
-                                playhand[player1] = player_card
-                                player_pos, play_card = player1.play_card(getCardClicked(mousex))
-                        else:
-                            playhand[player1] = player_card
-                            player_pos, play_card = player1.play_card(getCardClicked(mousex))
+                        # do the actual card processing; this also checks for a belote
+                        playhand[player1] = player_card
+                        player_pos, play_card = playCard(player1, player_card, required)
                     
                         my_card = Animation(player_card, findCardCoords(player1, player_pos), True)
                         my_card.move(my_card.pos, player1.cardDest, 12)
                         animations.append(my_card)
                         endTurn[turnOrder.index(player1)] = True
+                        hinted = None
+                        if HINTER:
+                            HINTER.stop()
                                             
                     # drawing; this screen will be visible for the better part of the game
+                    if not redraw and not TIMELINE.active():
+                        continue
+                    redraw = False
                     SCREEN.fill(BGCOLOR)                   
                     display()
                     if rund == 1 and game.contract[1] != "No trumps":
@@ -2157,14 +2203,19 @@ def playRound(surface):
                         else:
                             pygame.draw.rect(SCREEN, YELLOW, (highlightPos, 650,
                                                  CARD_SIZE[0] - 20, CARD_SIZE[1]), 3)
+                    if HINTER:
+                        SCREEN.blit(hintButton, hintButtonRect)
+                    if hinted is not None:
+                        hintPos = [rules.card_ordinal(card.suit, card.rank) for card in player1.hand].index(hinted)
+                        hintWidth = CARD_SIZE[0] if hintPos == len(player1.hand) - 1 else CARD_SIZE[0] - 20
+                        pygame.draw.rect(SCREEN, GREEN, (350 + hintPos * (CARD_SIZE[0] - 20), 650,
+                                                         hintWidth, CARD_SIZE[1]), 3)
                     
                     drawAnimation(animations, stillImages)
                     if stillImages:
                         for image in stillImages:
                             image.draw(SCREEN)
                     game.draw(SCREEN)
-                    pygame.display.update()
-                    FPSCLOCK.tick(FPS)
                    
             else:
                 # play computer turns
@@ -2177,6 +2228,8 @@ def playRound(surface):
                     required = playhand[player].get_suit()
                 endTurn[turnOrder.index(player)] = True
                  
+            if RECORDER:
+                RECORDER.play(getSeat(player), playhand[player].suit, playhand[player].rank)
             # drawing has to be identical to the inner drawing loop
             SCREEN.fill(BGCOLOR)
             display()
@@ -2187,15 +2240,13 @@ def playRound(surface):
             game.draw(SCREEN)        
             pygame.display.update()
             FPSCLOCK.tick(FPS)
-            pygame.time.wait(500)
+            pause(PLAY_DELAY)
 #            first_iter = False
                                
         if False not in endTurn:
             # everybody made their move - determine winner, change turn order
             # for next round and terminate the round
-            winner = getHighest(playhand, required)[0]
-            strategy1.post_analysis(playhand, [player1, player3])
-            strategy2.post_analysis(playhand, [player2, player4])
+            winner = finishTrick()
             stillImages = []
             for player, card in playhand.items():
                 won_card = Animation(card, player.cardDest, True, True)
@@ -2208,56 +2259,28 @@ def playRound(surface):
             game.draw(SCREEN)
             pygame.display.update()
             FPSCLOCK.tick(FPS)
-            
-            winner.collect_hand(playhand)
-            changeTurnOrder(winner)
-            if rund == 8:
-                game.last = winner.team
-                                   
-            rund += 1
             done = True
         
 def makeBid(current_player, current_contract):
     """ Process the bidding phase for a computer player:
         analyze its hand and make a suitable bid """
-    global endBid, contra, reContra, stillImages    
+    global stillImages    
     
     if current_player.team == "Team 1":
         team = strategy1
     elif current_player.team == "Team 2":
         team = strategy2
     
-    bid = team.decide_bet(current_player, current_contract)
+    bid = team.decide_bet(current_player, current_contract, expectedAnalysis(current_player))
+    registerBid(current_player, bid)
    
     if bid == "pass":    # register a pass, move on
-        endBid[turnOrder.index(current_player)] = True
         game.bidMessage = MES.get_bid_message("comppass", current_player.id)        
-        
     elif bid == "contra":   # register a contra, restart bidding
-        contra = True
-        endBid = [False, False, False, False]
-        endBid[turnOrder.index(current_player)] = True
         game.bidMessage = MES.get_bid_message("compcontra", current_player.id)
     elif bid == "re-contra":
-        if current_contract[1] == "All trumps":   # if it's All trumps, terminate bidding
-            reContra = True
-            contra = False
-            endBid = [True, True, True, True]
-            game.bidMessage = MES.get_bid_message("comprecontra", current_player.id)
-        else:
-            reContra = True
-            contra = False
-            endBid = [False, False, False, False]
-            endBid[turnOrder.index(current_player)] = True
-            game.bidMessage = MES.get_bid_message("comprecontra", current_player.id)
+        game.bidMessage = MES.get_bid_message("comprecontra", current_player.id)
     else:      # change the contract, restart bidding
-        game.contract = [current_player, bid]
-        strategy1.bid_history.append(game.contract)
-        strategy2.bid_history.append(game.contract)
-        endBid = [False, False, False, False]
-        endBid[turnOrder.index(current_player)] = True
-        contra = False
-        reContra = False
         game.bidMessage = MES.get_bid_message("compraise", current_player.id)
         if BID_ORDER.index(game.contract[1]) < 5:
             grow2 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 50,
@@ -2269,6 +2292,62 @@ def makeBid(current_player, current_contract):
             grow2.grow([20, 20], [200, 200], [4, 4])
         stillImages = []    
         animations.append(grow2)     
+
+def expectedAnalysis(player):
+    """ Return the analysis of a computer player's bidding hand after the cards to come
+        (bidvalue.expected_analysis()) if EXPECTED_BIDS is on; None otherwise, or without
+        NumPy, and decide_bet() goes by the 5 cards alone """
+    if not EXPECTED_BIDS:
+        return None
+    return bidvalue.expected_analysis([rules.card_ordinal(card.get_suit(), card.get_rank())
+                                       for card in player.hand])
+
+def bidError(bid):
+    """ Check if a bid is allowed after the bids made so far;
+        return the key of the message explaining why not, or None if it is.
+        bid -> String from BID_ORDER, or 'contra' / 're-contra' """
+    if bid == "contra":
+        if game.contract[1] == "pass":
+            return "plnocontra"
+    elif bid == "re-contra":
+        if game.contract[1] == "pass" or not contra:
+            return "plnorecontra"
+    elif bid != "pass" and game.contract[1] != "pass":
+        if BID_ORDER.index(bid) < BID_ORDER.index(game.contract[1]):
+            return "pllowbid"
+        elif bid == game.contract[1]:
+            return "plsamebid"
+    return None
+
+def registerBid(player, bid):
+    """ Put a bid in force: a pass ends the player's bidding, anything else makes
+        the others bid again. Assume the bid is allowed (see bidError).
+        bid -> String from BID_ORDER, or 'contra' / 're-contra' """
+    global endBid, contra, reContra
+    if RECORDER:
+        RECORDER.bid(getSeat(player), bid)
+    if bid == "pass":    # register a pass, move on
+        endBid[turnOrder.index(player)] = True
+    elif bid == "contra":   # register a contra, restart bidding
+        contra = True
+        endBid = [False, False, False, False]
+        endBid[turnOrder.index(player)] = True
+    elif bid == "re-contra":
+        reContra = True
+        contra = False
+        if game.contract[1] == "All trumps":   # if it's All trumps, terminate bidding
+            endBid = [True, True, True, True]
+        else:
+            endBid = [False, False, False, False]
+            endBid[turnOrder.index(player)] = True
+    else:      # change the contract, restart bidding
+        game.contract = [player, bid]
+        strategy1.bid_history.append(game.contract)
+        strategy2.bid_history.append(game.contract)
+        endBid = [False, False, False, False]
+        endBid[turnOrder.index(player)] = True
+        contra = False         # raising cancels previous contra and re-contra
+        reContra = False
    
 def startBidding(surface, order):
     """ Run the bidding phase of the game. Deal the cards as necessary,
@@ -2301,6 +2380,8 @@ def startBidding(surface, order):
     first_iter = True
     stillImages = []            # initialize a list of images to draw for animation purposes
         
+    if RECORDER:
+        RECORDER.deal(getSeat(game.first))
     # deal cards according to turn order
     for player in turnOrder:
         deal(deck, player, 3)
@@ -2313,9 +2394,15 @@ def startBidding(surface, order):
         for player in turnOrder:      # or until everyone has passed
             
             if player == player1:     # if it's the player's turn, wait for his move
+                redraw = True     # draw only on input or while animating
                 while not endBid[turnOrder.index(player1)]:
                     
-                    for event in pygame.event.get():     # event loop
+                    if redraw:
+                        events = pygame.event.get()
+                    else:
+                        events = waitForEvents()
+                    for event in events:     # event loop
+                        redraw = True
                         if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                             terminate()
                         if event.type == MOUSEMOTION:    # detect the highlight
@@ -2331,71 +2418,36 @@ def startBidding(surface, order):
                         if event.type == MOUSEBUTTONUP:                            
                             for button in range(len(buttons)):
                                 if buttons[button][1].collidepoint(event.pos[0], event.pos[1]):
-                                    if button == 7:   # if a contra was declared:
-                                        if game.contract[1] == "pass":
-                                            game.bidMessage = MES.get_bid_message("plnocontra")
-                                        else:                                            
-                                            contra = True
-                                            endBid =  [False, False, False, False] 
-                                            endBid[turnOrder.index(player1)] = True    # end the loop
-                                            game.bidMessage = MES.get_bid_message("plcontra")
-                                    elif button == 8:  # if a re-contra was declared
-                                        if game.contract[1] == "pass" or not contra:
-                                            game.bidMessage = MES.get_bid_message("plnorecontra")
-                                        else:                                        
-                                            reContra = True
-                                            contra = False
-                                            endBid =  [False, False, False, False] 
-                                            endBid[turnOrder.index(player1)] = True    # end the loop
-                                            game.bidMessage = MES.get_bid_message("plrecontra")
-                                    elif BID_ORDER[button] == "pass":                                        
-                                        endBid[turnOrder.index(player1)] = True    # end the loop
-                                        game.bidMessage = MES.get_bid_message("plpas")                                   
+                                    bid = (BID_ORDER + ("contra", "re-contra"))[button]
+                                    error = bidError(bid)
+                                    if error:
+                                        game.bidMessage = MES.get_bid_message(error)
+                                        continue
+                                    registerBid(player1, bid)    # this ends the loop
+                                    if bid == "contra":
+                                        game.bidMessage = MES.get_bid_message("plcontra")
+                                    elif bid == "re-contra":
+                                        game.bidMessage = MES.get_bid_message("plrecontra")
+                                    elif bid == "pass":
+                                        game.bidMessage = MES.get_bid_message("plpas")
                                     else:
-                                        if game.contract[1] == "pass":
-                                            # no one has bidded yet, assign bid automatically
-                                            game.contract = [player1, BID_ORDER[button]]
-                                            strategy1.bid_history.append(game.contract)
-                                            strategy2.bid_history.append(game.contract)
-                                            endBid =  [False, False, False, False] 
-                                            endBid[turnOrder.index(player1)] = True    # end the loop
-                                            game.bidMessage = MES.get_bid_message("plraise")
-                                            if BID_ORDER.index(game.contract[1]) < 5:
-                                                grow1 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 50,
-                                                                                                  CENTER[1] - 50])
-                                                grow1.grow([10, 10], [100, 100], [2, 2])
-                                            else:
-                                                grow1 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 100,
-                                                                                                  CENTER[1] - 100])
-                                                grow1.grow([20, 20], [200, 200], [4, 4])
-                                            animations.append(grow1)                                                                                                                               
+                                        game.bidMessage = MES.get_bid_message("plraise")
+                                        # create Animations
+                                        if BID_ORDER.index(game.contract[1]) < 5:
+                                            grow1 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 50,
+                                                                                              CENTER[1] - 50])
+                                            grow1.grow([10, 10], [100, 100], [2, 2])
                                         else:
-                                            if button < BID_ORDER.index(game.contract[1]):
-                                                game.bidMessage = MES.get_bid_message("pllowbid")
-                                            elif button == BID_ORDER.index(game.contract[1]):
-                                                game.bidMessage = MES.get_bid_message("plsamebid")
-                                            else:
-                                                game.contract = [player1, BID_ORDER[button]]
-                                                strategy1.bid_history.append(game.contract)
-                                                strategy2.bid_history.append(game.contract)
-                                                contra = False           # raising cancels previous contra and re-contra
-                                                reContra = False
-                                                endBid = [False, False, False, False] 
-                                                endBid[turnOrder.index(player1)] = True    # end the loop
-                                                game.bidMessage = MES.get_bid_message("plraise")
-                                                # create Animations
-                                                if BID_ORDER.index(game.contract[1]) < 5:
-                                                    grow1 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 50,
-                                                                                                      CENTER[1] - 50])
-                                                    grow1.grow([10, 10], [100, 100], [2, 2])
-                                                else:
-                                                    grow1 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 100,
-                                                                                                      CENTER[1] - 100])
-                                                    grow1.grow([20, 20], [200, 200], [4, 4])
-                                                   
-                                                stillImages = []    
-                                                animations.append(grow1)
+                                            grow1 = Animation(SUIT_IMAGES[game.contract[1]], [CENTER[0] - 100,
+                                                                                              CENTER[1] - 100])
+                                            grow1.grow([20, 20], [200, 200], [4, 4])
+                                           
+                                        stillImages = []    
+                                        animations.append(grow1)
                                                                                                 
+                    if not redraw and not TIMELINE.active():
+                        continue
+                    redraw = False
                     SCREEN.fill(BGCOLOR)
                     display()                                         
                     for button, buttonRect in buttons:
@@ -2409,18 +2461,16 @@ def startBidding(surface, order):
                         for image in stillImages:
                             image.draw(SCREEN) 
                     game.draw(SCREEN)
-                    pygame.display.update()
-                    FPSCLOCK.tick(FPS)
                     first_iter = False
             else:                          # process computer moves
                 if False not in endBid:    # everyone has finished bidding, terminate the bidding phase                    
-                    pygame.time.wait(700)
+                    pause(BID_DELAY)
                     terminateBidding(game.contract)
                     done = True 
                     break
                 else:
                     if not first_iter:
-                        pygame.time.wait(700)
+                        pause(BID_DELAY)
                     makeBid(player, game.contract)   # do the bid
 
                 SCREEN.fill(BGCOLOR)                
@@ -2449,6 +2499,8 @@ def terminateBidding(winning_contract):
 
         deck.cut()    # cut the deck
         game.bidMessage = None       
+        if RECORDER:     # nothing was played, close the deal
+            RECORDER.end(game.team1Score, game.team2Score)
         first = game.switch_first(turnOrder)   # determine the next first and change 
         changeTurnOrder(first)                 # turn order accordingly
         game.state = 1
@@ -2495,6 +2547,105 @@ def cleanAll():
     trump = None
     rund = 1    
     game.state = 1
+
+def checkpoint():
+    """ Save the match at a state boundary, so that a restarted game resumes from here """
+    if SAVE_FILE:
+        try:
+            savegame.save(SAVE_FILE, makeSnapshot())
+        except EnvironmentError:
+            pass    # a read-only directory only costs resuming the match
+
+def makeSnapshot():
+    """ Return a savegame.Snapshot of the whole match """
+    players = [player1, player2, player3, player4]
+    def cards(hand):
+        return [(card.suit, card.rank) for card in hand]
+    def announces(anonsList):
+        return [(anons.vid, anons.suit, anons.last_card, anons.rank) for anons in anonsList]
+
+    snapshot = savegame.Snapshot()
+    snapshot.language = MES.__class__.__name__
+    snapshot.state = game.state
+    snapshot.rund = rund
+    snapshot.first = getSeat(game.first)
+    snapshot.leader = getSeat(turnOrder[0])
+    if game.contract[0]:
+        snapshot.contract = [getSeat(game.contract[0]), game.contract[1]]
+    snapshot.contra = contra
+    snapshot.reContra = reContra
+    snapshot.last = game.last
+    snapshot.scores = [game.team1Score, game.team2Score]
+    snapshot.games = [game.team1Games, game.team2Games]
+    snapshot.remaining = game.remaining
+    snapshot.lastRound = game.lastRound
+    snapshot.deck = cards(deck.deck)
+    for seat, player in enumerate(players):
+        snapshot.hands[seat] = cards(player.hand)
+        snapshot.winnings[seat] = cards(player.winnings)
+        snapshot.saved_cards[seat] = cards(player.saved_cards)
+        snapshot.announces[seat] = announces(player.announces)
+        snapshot.belotes[seat] = announces(player.belotes)
+        snapshot.suit_power[seat] = player.suit_power
+    snapshot.declared = [[getSeat(player), announces([anons])[0]] for player, anons in game.announces]
+    for team, strategy in enumerate((strategy1, strategy2)):
+        snapshot.behavior[team] = strategy.behavior
+        snapshot.interesting_suits[team] = strategy.interesting_suits
+        snapshot.partner_suits[team] = strategy.partner_suits
+        snapshot.passed[team] = strategy.passed
+        snapshot.bid_history[team] = [[getSeat(player), bid] for player, bid in strategy.bid_history]
+    if RECORDER:
+        snapshot.record = RECORDER.pending
+    return snapshot
+
+def restoreSnapshot(snapshot):
+    """ Put the match saved in the given savegame.Snapshot back in play """
+    global rund, trump, contra, reContra, turnOrder
+    players = [player1, player2, player3, player4]
+    def cards(hand):
+        return [Card(suit, rank) for suit, rank in hand]
+    def announces(anonsList):
+        return [Anons(*anons) for anons in anonsList]
+
+    game.state = snapshot.state
+    rund = snapshot.rund
+    game.first = players[snapshot.first]
+    turnOrder = list(players)
+    changeTurnOrder(players[snapshot.leader])
+    if snapshot.contract:
+        game.contract = [players[snapshot.contract[0]], snapshot.contract[1]]
+        game.switch_currentPower(game.contract)
+        if BID_ORDER.index(game.contract[1]) < 5:
+            trump = game.contract[1]
+        elif game.contract[1] == "No trumps":
+            trump = "none"
+        else:
+            trump = "all"
+    contra = snapshot.contra
+    reContra = snapshot.reContra
+    game.last = snapshot.last
+    game.team1Score, game.team2Score = snapshot.scores
+    game.team1Games, game.team2Games = snapshot.games
+    game.remaining = snapshot.remaining
+    game.lastRound = snapshot.lastRound
+    deck.deck = cards(snapshot.deck)
+    for seat, player in enumerate(players):
+        player.hand = cards(snapshot.hands[seat])
+        player.winnings = cards(snapshot.winnings[seat])
+        player.saved_cards = cards(snapshot.saved_cards[seat])
+        player.announces = announces(snapshot.announces[seat])
+        player.belotes = announces(snapshot.belotes[seat])
+        player.suit_power = snapshot.suit_power[seat]
+        player.update()
+    game.announces = [[players[seat], Anons(*anons)] for seat, anons in snapshot.declared]
+    for team, strategy in enumerate((strategy1, strategy2)):
+        strategy.behavior = snapshot.behavior[team]
+        strategy.interesting_suits = snapshot.interesting_suits[team]
+        strategy.partner_suits = snapshot.partner_suits[team]
+        strategy.passed = snapshot.passed[team]
+        strategy.bid_history = [[players[seat], bid] for seat, bid in snapshot.bid_history[team]]
+    if RECORDER:
+        RECORDER.resume(snapshot.record)
     
 def welcome():
     """ Display the welcome screen in the beginning of the game.
@@ -2512,8 +2663,22 @@ def welcome():
     bul_but, bul_but_rect = loadButton("", WHITE, LANG_IMAGES['bul'], center[0], center[1] + 100)
 
     done = False
+    redraw = True
     while not done:
-        for event in pygame.event.get():
+        if redraw:     # the screen is static, draw it only after something happened
+            welcomeScreen.fill(WHITE)        
+            pygame.draw.rect(welcomeScreen, GREEN, (0, 0, 700, 500), 5)       
+            welcomeScreen.blit(line1, (center[0] - line1Rect.centerx, 100))
+            welcomeScreen.blit(belot, (center[0] - belotRect.centerx, 130))
+            welcomeScreen.blit(line2, (center[0] - line2Rect.centerx, 240))
+            welcomeScreen.blit(line3, (center[0] - line3Rect.centerx, 300)) 
+            welcomeScreen.blit(eng_but, eng_but_rect)
+            welcomeScreen.blit(bul_but, bul_but_rect)
+            pygame.display.update()
+            redraw = False
+
+        for event in waitForEvents():
+            redraw = True
             if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                 terminate()
             if event.type == MOUSEBUTTONUP:
@@ -2523,18 +2688,6 @@ def welcome():
                 elif bul_but_rect.collidepoint(event.pos):                    
                     MES = location.Bulgarian()
                     done = True
-        
-        welcomeScreen.fill(WHITE)        
-        pygame.draw.rect(welcomeScreen, GREEN, (0, 0, 700, 500), 5)       
-        welcomeScreen.blit(line1, (center[0] - line1Rect.centerx, 100))
-        welcomeScreen.blit(belot, (center[0] - belotRect.centerx, 130))
-        welcomeScreen.blit(line2, (center[0] - line2Rect.centerx, 240))
-        welcomeScreen.blit(line3, (center[0] - line3Rect.centerx, 300)) 
-        welcomeScreen.blit(eng_but, eng_but_rect)
-        welcomeScreen.blit(bul_but, bul_but_rect)
-        
-
-        pygame.display.update()     
     
 def gameOver(team):
     """ Display the end of game dialog window, according to which team won.
@@ -2553,11 +2706,30 @@ def gameOver(team):
     resultMes, resultMesRect = makeText(result, FONT4, WHITE)
     playAgain, playAgainRect = makeText(MES._end_messages["continue"], FONT3, WHITE)    
     done = False
+    redraw = True
     
     while not done:
-        for event in pygame.event.get():     # event loop
+        if redraw:     # the dialog is static, draw it only after something happened
+            SCREEN.fill(BGCOLOR)
+            display()
+            pygame.draw.rect(SCREEN, SILVER, (CENTER[0] - 305, CENTER[1] - 205,
+                                            610, 410))
+            pygame.draw.rect(SCREEN, BLUE, (CENTER[0] - 300, CENTER[1] - 200,
+                                            600, 400))
+            SCREEN.blit(gameOver, (CENTER[0]-gameOverRect.centerx, 250))
+            SCREEN.blit(resultMes, (CENTER[0]-resultMesRect.centerx, 350))
+            SCREEN.blit(playAgain, (CENTER[0]-playAgainRect.centerx, 430))
+            SCREEN.blit(yesButton, yesButtonRect)
+            SCREEN.blit(quitButton, quitButtonRect)
+            pygame.display.update()
+            redraw = False
+            
+        for event in waitForEvents():     # event loop
+            redraw = True
             if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                 terminate()
+            if event.type == KEYUP and event.key == K_r:
+                replayDeal()      # look back at the last deal
             if event.type == MOUSEBUTTONUP:
                 if yesButtonRect.collidepoint(event.pos):   # reset variables, start a new game
                     cleanAll()
@@ -2568,22 +2740,67 @@ def gameOver(team):
                     
                     done = True
                 elif quitButtonRect.collidepoint(event.pos):
+                    if SAVE_FILE:     # the match is over, there's nothing to resume
+                        savegame.remove(SAVE_FILE)
                     terminate()
-                    
-        SCREEN.fill(BGCOLOR)
-        display()
-        pygame.draw.rect(SCREEN, SILVER, (CENTER[0] - 305, CENTER[1] - 205,
-                                        610, 410))
-        pygame.draw.rect(SCREEN, BLUE, (CENTER[0] - 300, CENTER[1] - 200,
-                                        600, 400))
-        SCREEN.blit(gameOver, (CENTER[0]-gameOverRect.centerx, 250))
-        SCREEN.blit(resultMes, (CENTER[0]-resultMesRect.centerx, 350))
-        SCREEN.blit(playAgain, (CENTER[0]-playAgainRect.centerx, 430))
-        SCREEN.blit(yesButton, yesButtonRect)
-        SCREEN.blit(quitButton, quitButtonRect)
-        
-        pygame.display.update()
-        FPSCLOCK.tick(FPS)
+
+def replayDeal():
+    """ Show the last recorded deal with all cards open. Scrub through it card by card
+        with the Left and Right arrows, or trick by trick with Up and Down;
+        R or Escape goes back to the game. """
+    if not RECORD_FILE:
+        return
+    deals = replay.Replay(RECORD_FILE)
+    if not len(deals):
+        return
+    current = deals.deal(-1)
+    step = current.tricks * 4     # -> int; number of cards played, start from the end of the deal
+    seats = [player1, player2, player3, player4]
+    keysText, keysTextRect = makeText(MES.make_interface("ReplayKeys"), FONT1, WHITE)
+    done = False
+    redraw = True
+
+    while not done:
+        if redraw:
+            position = current.seek(step // 4, step % 4)
+            SCREEN.fill(BGCOLOR)
+            pygame.draw.rect(SCREEN, BROWN, (CENTER[0] - 605, CENTER[1] - 380, 1210, 785))
+            pygame.draw.rect(SCREEN, GREEN, (CENTER[0] - 600, CENTER[1] - 375, 1200, 775))
+            for seat in xrange(4):       # draw the hands open, the same way Hand.draw lays them out
+                pos = HAND_POSITIONS[seat]
+                for i, ordinal in enumerate(position.hands[seat]):
+                    if seats[seat].team == "Team 1":
+                        card_pos = [pos[0] + i * (CARD_SIZE[0] - 20), pos[1]]
+                    else:
+                        card_pos = [pos[0], pos[1] + i * (CARD_SIZE[1] - 40)]
+                    Card(*rules.ordinal_card(ordinal)).draw(SCREEN, card_pos)
+            for seat, ordinal in position.table:
+                Card(*rules.ordinal_card(ordinal)).draw(SCREEN, seats[seat].cardDest)
+            info = MES.make_interface("Replay") + str(min(position.trick + 1, 8)) + " / 8"
+            if position.contract:
+                info += "   " + MES.get_button(BID_ORDER.index(position.contract[1]))
+            infoText, infoTextRect = makeText(info, FONT2, ORANGE)
+            SCREEN.blit(infoText, (CENTER[0] - infoTextRect.centerx, 35))
+            SCREEN.blit(keysText, (CENTER[0] - keysTextRect.centerx, 760))
+            pygame.display.update()
+            redraw = False
+
+        for event in waitForEvents():
+            if event.type == QUIT:
+                terminate()
+            if event.type == KEYUP:
+                if event.key == K_ESCAPE or event.key == K_r:
+                    done = True
+                elif event.key == K_LEFT:
+                    step -= 1
+                elif event.key == K_RIGHT:
+                    step += 1
+                elif event.key == K_UP:       # start of the next trick
+                    step = (step // 4 + 1) * 4
+                elif event.key == K_DOWN:     # start of this trick, or of the previous one
+                    step = (step - 1) // 4 * 4
+                step = max(0, min(step, current.tricks * 4))
+            redraw = True
 
 def makeText(text, font, color):
     """ Create a pygame text object in the given font and color.
@@ -2630,7 +2847,19 @@ def drawAnimation(animation_list, images_list, button_list=None):
         images_list -> list of still images, to be drawn as animations end
         button_list -> list of images, to be drawn during bidding phase"""    
     
+    if TIMELINE.headless:     # skip animation time entirely, nothing to draw
+        TIMELINE.finish()
+        for anim in animation_list[:]:
+            anim.update()
+            animation_list.remove(anim)
+            if not anim.moth:
+                images_list.append(anim)
+        return
+    last_tick = pygame.time.get_ticks()
     while animation_list:
+        now = pygame.time.get_ticks()
+        TIMELINE.advance(now - last_tick)     # advance by the time the last frame took
+        last_tick = now
         SCREEN.fill(BGCOLOR)
         display()
         if button_list:
@@ -2685,6 +2914,9 @@ def drawAnons(player):
     return ', '.join(final)    
     
 def terminate():
+    if PONDERER and PONDERER.hits + PONDERER.misses:
+        print "AI moves worked out ahead: %d of %d (%.0f%%)" % (
+            PONDERER.hits, PONDERER.hits + PONDERER.misses, 100 * PONDERER.hit_rate())
     pygame.quit()
     sys.exit()
 
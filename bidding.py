@@ -0,0 +1,257 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+The bidding of many deals at once, by the AI of all four seats, with NumPy.
+
+Each deal starts from a shuffled deck (card ordinals, see deals.py), cut and dealt 3 and 2
+cards to each player from the first player on. All the deals then bid together, one bid
+per step: the bid of the player on turn in every deal still bidding is
+Strategy.decide_bet() written on arrays, and registerBid() and terminateBidding() follow
+it, as in startBidding() and engine.Table -- including contras, re-contras and the teams'
+behaviors. The hands are analyzed once: with bidvalue.expected_batch() if the game's
+EXPECTED_BIDS is on, else with features.analyze_batch(). When everybody
+passed, the game collects the cards, cuts them and deals again from the next player; so
+does simulate(), up to the given number of redeals.
+
+Note the AI never re-contras: decide_bet() checks for an 'agressive' team, which no team
+ever is. A re-contra is still registered as the game would, should the rule change.
+    python bidding.py [--deals N] [--redeals N] [--behaviors TEAM1 TEAM2] [--seed N] [--check N]
+prints the contracts and the deals everybody passed, and checks simulate() bids the
+first --check deals as the game's own code does.
+"""
+
+import time, argparse
+import numpy
+import engine, rules, deals, features, bidvalue
+
+BIDS = engine.BIDS      # a bid is its index here: pass, the suits, No trumps, All trumps, contra, re-contra
+PASS, NO_TRUMPS, ALL_TRUMPS, CONTRA, RE_CONTRA = 0, 5, 6, 7, 8
+BEHAVIORS = ('normal', 'defensive', 'aggressive', 'desperate')
+NORMAL, DEFENSIVE, AGGRESSIVE, DESPERATE = range(4)
+# the suits of rules.SUITS as bids
+SUIT_BIDS = numpy.array([BIDS.index(suit) for suit in rules.SUITS])
+
+
+def bidding_hands(decks):
+    """ Return the 5 cards each player bids with, from shuffled decks: numpy array (N, 4, 5)
+        of card ordinals, by place in turn order """
+    return deals.deal(decks).reshape(-1, 4, 8)[:, :, :5]
+
+def collect(decks, hands):
+    """ Return the decks of the deals after everybody passed: the cards left in the deck,
+        then the hands in turn order, each sorted as sort_hand() does during the bidding """
+    suits, ranks = hands // 8, hands % 8
+    letters = numpy.array([sorted(rules.SUITS).index(suit) for suit in rules.SUITS])
+    powers = numpy.array([rules.NO_TRUMP_POWER[rank] for rank in rules.RANKS])
+    order = numpy.argsort(-(letters[suits] * 10 + powers[ranks]), axis=2)
+    sorted_hands = numpy.take_along_axis(hands, order, axis=2).reshape(len(hands), 20)
+    # the deck was cut, then its last 20 cards dealt; the first 12 of the cut deck are left
+    return numpy.concatenate([decks[:, 16:28], sorted_hands], axis=1).astype(numpy.uint8)
+
+def decide_bets(power, no_trump, all_trump, current, ours, contra, re_contra, behavior, first, history):
+    """ Return Strategy.decide_bet() of many players as bids
+        power -> bid of the player's dominant suit, 0 for none
+        no_trump, all_trump -> the player's overall powers
+        current -> the bid of the contract so far
+        ours -> True if the contract is the player's team's
+        contra, re_contra -> the contra and reContra flags
+        behavior -> the player's team's behavior, an index in BEHAVIORS
+        first -> True if the player's team holds the first player (game.first)
+        history -> True if the player's team raised the contract before (bid_history) """
+    has = power > 0
+    desperate = behavior == DESPERATE
+    defensive = behavior == DEFENSIVE
+    aggressive = behavior == AGGRESSIVE
+    # nobody bid yet
+    opening = numpy.select(
+        [desperate,
+         has,
+         defensive & (no_trump > 18) & (no_trump > all_trump) & first,
+         defensive & (all_trump > 18) & first,
+         ~defensive & (no_trump > 18) & (no_trump > all_trump),
+         ~defensive & (all_trump > 18)],
+        [PASS, power, NO_TRUMPS, ALL_TRUMPS, NO_TRUMPS, ALL_TRUMPS], PASS)
+    # the contract is the partner's (or the player's own)
+    partner = numpy.select(
+        [contra | re_contra,        # a re-contra would need an 'agressive' team
+         has & (current < NO_TRUMPS) & (power > current),
+         has & (current < NO_TRUMPS),
+         has & (current == NO_TRUMPS) & (all_trump > 25) & first,
+         has,
+         (current < ALL_TRUMPS) & (all_trump > 20) & first],
+        [PASS, power, ALL_TRUMPS, ALL_TRUMPS, PASS, ALL_TRUMPS], PASS)
+    # the contract is the adversary's
+    suit = has & (current < NO_TRUMPS)
+    adversary = numpy.select(
+        [contra | re_contra,
+         ~has & (no_trump < 13) & (all_trump < 13),
+         suit & (power == current) & (aggressive | desperate),
+         suit & (power == current),
+         suit & history & (power > current),
+         suit & history & (all_trump > 17) & first,
+         suit & (power > current),
+         suit & ~defensive & ~desperate & first,
+         suit & desperate,
+         suit,
+         ~has & (current < NO_TRUMPS) & (no_trump > 15) & ~defensive,
+         ~has & (current < NO_TRUMPS) & (all_trump > 15) & ~defensive,
+         ~has & (current < NO_TRUMPS) & desperate,
+         ~has & (current < NO_TRUMPS),
+         (current == NO_TRUMPS) & (no_trump > 20) & first & aggressive,
+         (current == NO_TRUMPS) & (all_trump > 18) & ~defensive,
+         (current == NO_TRUMPS) & desperate,
+         (current == NO_TRUMPS) & history & ~defensive,
+         current == NO_TRUMPS,
+         (all_trump > 20) & first & aggressive,
+         desperate,
+         (all_trump > 25) & ~defensive],
+        [PASS, PASS, CONTRA, PASS, power, ALL_TRUMPS, power, ALL_TRUMPS, CONTRA, PASS,
+         NO_TRUMPS, ALL_TRUMPS, NO_TRUMPS, PASS,
+         CONTRA, ALL_TRUMPS, ALL_TRUMPS, ALL_TRUMPS, PASS,
+         CONTRA, CONTRA, CONTRA], PASS)
+    return numpy.where(current == PASS, opening, numpy.where(ours, partner, adversary))
+
+def bid_deals(hands, behaviors, expected=False):
+    """ Bid many deals to the end, as startBidding() with the AI in every seat
+        hands -> numpy array (N, 4, 5) of the bidding cards by place in turn order
+        behaviors -> numpy array (N, 2) of the behaviors (indexes in BEHAVIORS) of the team
+                     of the first player and the other
+        expected -> True to bid by the hands' expected analysis, as EXPECTED_BIDS
+        Return numpy arrays (N,): contract bids, places of the bidders (-1 if everybody
+        passed), and 0, 1 or 2 for no contra, a contra or a re-contra """
+    count = len(hands)
+    if expected:
+        dominant, no_trump, all_trump = bidvalue.expected_batch(hands.reshape(-1, 5))
+    else:
+        masks = (numpy.int64(1) << hands.astype(numpy.int64)).sum(axis=2)
+        dominant, no_trump, all_trump, suits = features.analyze_batch(masks.ravel())
+    power = numpy.where(dominant >= 0, SUIT_BIDS[numpy.maximum(dominant, 0)], 0).reshape(count, 4)
+    no_trump = no_trump.reshape(count, 4)
+    all_trump = all_trump.reshape(count, 4)
+    current = numpy.zeros(count, numpy.int64)
+    bidder = numpy.full(count, -1)
+    contra = numpy.zeros(count, bool)
+    re_contra = numpy.zeros(count, bool)
+    ended = numpy.zeros((count, 4), bool)      # -> endBid, by place in turn order
+    history = numpy.zeros((count, 2), bool)    # -> True if the team raised, by place % 2
+    bidding = numpy.arange(count)
+    step = 0
+    while len(bidding):
+        place = step % 4
+        team = place % 2
+        rows = bidding
+        bids = decide_bets(power[rows, place], no_trump[rows, place], all_trump[rows, place],
+                           current[rows], (bidder[rows] % 2 == team) & (bidder[rows] >= 0),
+                           contra[rows], re_contra[rows], behaviors[rows, team], team == 0, history[rows, team])
+        # registerBid()
+        raised = (bids > PASS) & (bids < CONTRA)
+        restart = bids != PASS
+        all_trumps_re_contra = (bids == RE_CONTRA) & (current[rows] == ALL_TRUMPS)
+        current[rows[raised]] = bids[raised]
+        bidder[rows[raised]] = place
+        history[rows[raised], team] = True
+        contra[rows[raised]] = False
+        re_contra[rows[raised]] = False
+        contra[rows[bids == CONTRA]] = True
+        contra[rows[bids == RE_CONTRA]] = False
+        re_contra[rows[bids == RE_CONTRA]] = True
+        ended[rows[restart]] = False
+        ended[rows, place] = True
+        ended[rows[all_trumps_re_contra]] = True
+        step += 1
+        # the next player finds everybody has finished bidding
+        bidding = bidding[~ended[bidding].all(axis=1)]
+    doubled = numpy.where(re_contra, 2, numpy.where(contra, 1, 0))
+    return current, bidder, doubled
+
+def simulate(decks, firsts, behaviors, redeals=0, expected=False):
+    """ Bid many deals as the game does with the AI in every seat, dealing again after
+        everybody passed up to redeals times
+        decks -> numpy array (N, 32) of shuffled decks of card ordinals (deals.shuffled_decks)
+        firsts -> numpy array (N,) of the first seats (0-3)
+        behaviors -> numpy array (N, 2) of the behaviors (indexes in BEHAVIORS) of Team 1 and 2
+        expected -> True to bid by the hands' expected analysis, as EXPECTED_BIDS
+        Return numpy arrays (N,): contract bids (BIDS indexes, 0 if everybody passed
+        every time), bidder seats (-1 for none), 0, 1 or 2 for no contra, a contra or a
+        re-contra, and the number of times the cards were dealt again """
+    count = len(decks)
+    contract = numpy.zeros(count, numpy.int8)
+    bidder = numpy.full(count, -1, numpy.int8)
+    doubled = numpy.zeros(count, numpy.int8)
+    dealt = numpy.zeros(count, numpy.int8)
+    rows = numpy.arange(count)
+    decks = numpy.asarray(decks)
+    firsts = numpy.asarray(firsts) % 4
+    behaviors = numpy.asarray(behaviors)
+    for deal in xrange(redeals + 1):
+        hands = bidding_hands(decks)
+        # the team of the first player, then the other
+        teams = numpy.stack([behaviors[rows, firsts % 2], behaviors[rows, 1 - firsts % 2]], axis=1)
+        current, place, double = bid_deals(hands, teams, expected)
+        contract[rows] = current
+        bidder[rows] = numpy.where(place >= 0, (firsts + place) % 4, -1)
+        doubled[rows] = double
+        dealt[rows] = deal
+        passed = current == PASS
+        # terminateBidding(): collect, cut and deal again from the next player
+        rows = rows[passed]
+        decks = collect(decks[passed], hands[passed])
+        firsts = (firsts[passed] + 1) % 4
+    return contract, bidder, doubled, dealt
+
+def bid_like_game(deck, first, behaviors, redeals=0):
+    """ Bid a deal with the game's own code, as simulate() does; return the
+        (contract bid, bidder seat, contra, redeals) simulate() gives for it """
+    table = engine.Table(())
+    players = table.players()
+    table.space["deck"].deck = [engine.ordinal_to_card(number) for number in deck]
+    table.space["deck"].cut()
+    table.space["game"].first = players[first]
+    table.space["strategy1"].behavior = BEHAVIORS[behaviors[0]]
+    table.space["strategy2"].behavior = BEHAVIORS[behaviors[1]]
+    with table.bound() as belot:
+        belot.turnOrder = list(players)
+        belot.changeTurnOrder(belot.game.first)
+        for deal in xrange(redeals + 1):
+            table.start_deal(belot, [])
+            while False in belot.endBid:
+                player = belot.turnOrder[table.position % 4]
+                table.ai_bid(belot, table.seat(player), player, [])
+            bidder, contract = belot.game.contract
+            doubled = 2 if belot.reContra else 1 if belot.contra else 0
+            result = (BIDS.index(contract), table.seat(bidder) if bidder else -1, doubled, deal)
+            belot.terminateBidding(belot.game.contract)
+            if belot.game.state != 1:
+                break
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate the AI's bidding of many deals")
+    parser.add_argument("--deals", type=int, default=1000000)
+    parser.add_argument("--redeals", type=int, default=0, help="deal again up to N times after all passed")
+    parser.add_argument("--behaviors", nargs=2, default=["normal", "normal"], choices=BEHAVIORS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", type=int, default=1000, help="deals to check against the game's code")
+    options = parser.parse_args()
+    expected = engine.load_game().EXPECTED_BIDS
+    features.load_tables()
+    decks = deals.shuffled_decks(0, options.deals, options.seed)
+    firsts = numpy.random.RandomState(options.seed).randint(4, size=options.deals)
+    behaviors = numpy.tile([BEHAVIORS.index(name) for name in options.behaviors], (options.deals, 1))
+    start = time.time()
+    contract, bidder, doubled, dealt = simulate(decks, firsts, behaviors, options.redeals, expected)
+    elapsed = time.time() - start
+    print "%d deals bid in %.2f s (%.0f deals/s), by the %s" % (
+        options.deals, elapsed, options.deals / elapsed, "expected hands" if expected else "5 cards")
+    for bid in xrange(ALL_TRUMPS + 1):
+        share = (contract == bid).mean()
+        print "%-10s %6.2f%%   of them with contra %5.2f%%" % (
+            "all passed" if bid == PASS else BIDS[bid], 100 * share,
+            100 * (doubled[contract == bid] > 0).mean() if share else 0)
+    print "dealt again: %.2f%% of the deals" % (100 * (dealt > 0).mean())
+    checked = min(options.check, options.deals)
+    different = sum(1 for number in xrange(checked)
+                    if bid_like_game(decks[number], firsts[number], behaviors[number], options.redeals) !=
+                    (contract[number], bidder[number], doubled[number], dealt[number]))
+    print "bid as the game's code: %d of %d deals" % (checked - different, checked)
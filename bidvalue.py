@@ -0,0 +1,255 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Exact expected values of a bidding hand, over every way the cards to come may fall.
+
+A player bids on 5 cards, and prepare() deals 3 more of the 27 unseen after the bidding:
+one of C(27, 3) = 2925 completions, all equally likely. evaluate() goes over all of them
+at once with NumPy and returns, for every contract of CONTRACTS, the expected points of
+the full hand: its card points (doubled in No trumps, as deal_points() counts them) and
+the announces it would declare in the contract -- sequences and carres, except in No
+trumps, and the belote of the trump suit, or of any suit in All trumps. It also returns
+the AI's own view of the same hands: the powers Strategy.analyze_hand() bids by, averaged
+over the completions. Both are cached by the hand's canonical form (see canonical.py), so
+a hand is only worked out once, along with the hands alike but for their suits.
+
+expected_analysis() puts that view in the form of analyze_hand(), for decide_bet(); with
+EXPECTED_BIDS on, the game's AI bids by it, in makeBid() as in engine.Table, and so does
+bidding.py, by expected_batch(). decide_bet()'s thresholds are set
+for 5 cards, so the powers are brought back to that scale: the totals by the ratio of the
+mean powers of all 5-card and all 8-card hands, and a suit's all trump power by undoing
+what the cards to come add to it on average, E = power + 3/27 * (36 - power).
+    python bidvalue.py [--hands N] [--check N]
+times it, checks the points against the game's own announces, completion by completion,
+and checks the game still loads and bids without NumPy.
+"""
+
+import sys, time, random, argparse, itertools, subprocess
+import engine, rules, odds, features, canonical
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CONTRACTS = rules.BID_ORDER[1:]
+DRAW = float(odds.COMING) / odds.UNSEEN     # chance an unseen card comes to the player
+SUIT_POWER = sum(rules.ALL_TRUMP_POWER.values())
+CARRE_MASK = sum(1 << rank for rank in odds.CARRE_RANKS)
+
+COMPLETIONS = None      # -> numpy array (C(27, 3), 3): the places among the unseen cards of each completion
+POINTS = None           # -> numpy array (contract, suit, holding): card points of every suit holding
+SEQUENCES = None        # -> numpy array (holding, carre ranks): points of the sequences not overlapping a carre
+CARRES = None           # -> numpy array (carre ranks): points of the carres
+BELOTES = None          # -> numpy array (holding): points of a belote, if the holding has one
+SCALES = None           # -> (no trump, all trump): mean powers of 5-card hands / of 8-card hands
+
+CACHE = {}      # -> {canonical hand: evaluate() result of the canonical hand}
+FILL_CHUNK = 32     # hands evaluate_many() works out together
+
+
+def sequences(holding):
+    """ Return the sequences (3 cards or more) of a suit holding, as (first rank index, length) """
+    found = []
+    start = None
+    for rank in xrange(9):
+        if rank < 8 and holding >> rank & 1:
+            if start is None:
+                start = rank
+        elif start is not None:
+            if rank - start >= 3:
+                found.append((start, rank - start))
+            start = None
+    return found
+
+def load_tables():
+    global COMPLETIONS, POINTS, SEQUENCES, CARRES, BELOTES, SCALES
+    if COMPLETIONS is None:
+        COMPLETIONS = numpy.array(list(itertools.combinations(xrange(odds.UNSEEN), odds.COMING)))
+        cards = (numpy.arange(256)[:, None] >> numpy.arange(8)) & 1     # -> (holding, rank index)
+        POINTS = numpy.array([[cards.dot([rules.card_value(contract, rules.card_ordinal(suit, rank))
+                                          for rank in rules.RANKS])
+                               for suit in rules.SUITS] for contract in CONTRACTS])
+        # a sequence with a card of a carre doesn't count (findOverlapSequence())
+        SEQUENCES = numpy.zeros((256, 256), int)
+        for holding in xrange(256):
+            found = sequences(holding)
+            for carres in xrange(256):
+                if found and not carres & ~CARRE_MASK:
+                    SEQUENCES[holding, carres] = sum(rules.ANNOUNCE_VALUE[length] for start, length in found
+                                                     if not carres >> start & ((1 << length) - 1))
+        CARRES = cards.dot([rules.CARE_VALUE.get(rank, 0) for rank in rules.RANKS])
+        queen_king = (1 << rules.RANKS.index('Q')) | (1 << rules.RANKS.index('K'))
+        BELOTES = numpy.where(numpy.arange(256) & queen_king == queen_king, rules.ANNOUNCE_VALUE['belote'], 0)
+        # a suit of a random hand of k cards has a holding of n cards in C(24, k - n) of C(32, k) hands
+        features.load_tables()
+        counts = cards.sum(axis=1)
+        def mean_power(powers, size):
+            return 4 * sum(odds.choose(24, size - count) * power for count, power in zip(counts, powers))
+        SCALES = tuple(float(mean_power(powers, odds.HAND)) / mean_power(powers, odds.HAND + odds.COMING) *
+                       odds.choose(32, odds.HAND + odds.COMING) / odds.choose(32, odds.HAND)
+                       for powers in features.HOLDINGS[False][:2])
+
+def completions(hands):
+    """ Return the full hands of every completion of a 5-card hand, as numpy array
+        (C(27, 3), 4) of suit holdings (bit rank index set), by suit in rules.SUITS order;
+        of many hands, as numpy array (N, C(27, 3), 4)
+        hands -> list of card ordinals, or numpy array (N, 5) of them """
+    load_tables()
+    hands = numpy.asarray(hands)
+    single = hands.ndim == 1
+    hands = hands.reshape(-1, odds.HAND).astype(numpy.int64)
+    held = numpy.zeros((len(hands), 32), bool)
+    held[numpy.arange(len(hands))[:, None], hands] = True
+    coming = numpy.nonzero(~held)[1].reshape(len(hands), odds.UNSEEN)[:, COMPLETIONS]
+    masks = (1 << hands).sum(axis=1)[:, None] + (1 << coming).sum(axis=2)
+    holdings = (masks[:, :, None] >> numpy.arange(0, 32, 8)) & 255
+    return holdings[0] if single else holdings
+
+def hand_points(holdings):
+    """ Return the points of full hands in every contract of CONTRACTS: their card points
+        (doubled in No trumps) and the announces they'd declare, as numpy array (N, contract)
+        holdings -> numpy array (N, 4) of suit holdings """
+    load_tables()
+    points = POINTS[:, numpy.arange(4), holdings].sum(axis=2).T
+    carres = numpy.bitwise_and.reduce(holdings, axis=1) & CARRE_MASK
+    announces = SEQUENCES[holdings, carres[:, None]].sum(axis=1) + CARRES[carres]
+    belotes = BELOTES[holdings]
+    for number, contract in enumerate(CONTRACTS):
+        if contract == 'No trumps':
+            points[:, number] *= 2
+        elif contract == 'All trumps':
+            points[:, number] += announces + belotes.sum(axis=1)
+        else:
+            points[:, number] += announces + belotes[:, rules.SUITS.index(contract)]
+    return points
+
+def evaluate_many(hands, chunk=FILL_CHUNK):
+    """ Work the expected values of many 5-card hands out together, chunk hands at a time,
+        into the cache of evaluate()
+        hands -> lists of card ordinals """
+    missing = sorted(set(canonical.canonical_hand(hand)[0] for hand in hands) - set(CACHE))
+    for start in xrange(0, len(missing), chunk):
+        keys = missing[start:start + chunk]
+        holdings = completions(numpy.array(keys))
+        count, rows = holdings.shape[:2]
+        holdings = holdings.reshape(-1, 4)
+        no_trump, all_trump, analysis = features.suit_powers((holdings << numpy.arange(0, 32, 8)).sum(axis=1))
+        points = hand_points(holdings).reshape(count, rows, -1).mean(axis=1)
+        suits = all_trump.reshape(count, rows, 4).mean(axis=1)
+        no_trump = no_trump.sum(axis=1).reshape(count, rows).mean(axis=1)
+        all_trump = all_trump.sum(axis=1).reshape(count, rows).mean(axis=1)
+        for number, key in enumerate(keys):
+            CACHE[key] = (points[number], suits[number], no_trump[number], all_trump[number])
+
+def evaluate(hand):
+    """ Return the expected values of a 5-card hand over all its completions, cached:
+        (numpy array of the points of the full hand in each contract of CONTRACTS,
+        numpy array of the all trump powers of its suits in rules.SUITS order,
+        its no trump power, its all trump power), the powers as analyze_hand() finds them
+        hand -> list of card ordinals """
+    key, order = canonical.canonical_hand(hand)
+    if key not in CACHE:
+        evaluate_many([hand])
+    points, suits, no_trump, all_trump = CACHE[key]
+    if order != canonical.IDENTITY:
+        points = points[[CONTRACTS.index(canonical.permute_contract(contract, order)) for contract in CONTRACTS]]
+        suits = numpy.array(canonical.restore_suits(suits, order))
+    return points, suits, no_trump, all_trump
+
+def expected_analysis(hand):
+    """ Return the expected analyze_hand() of a 5-card hand after the cards to come: the
+        dominant suit (or None), the no trump power and the all trump power, on the scale
+        of 5 cards; None without NumPy
+        hand -> list of card ordinals """
+    if numpy is None:
+        return None
+    points, suits, no_trump, all_trump = evaluate(hand)
+    suits = (suits - DRAW * SUIT_POWER) / (1 - DRAW)
+    dominant = None
+    for suit in features.analysis_order():
+        if dominant is None:
+            if suits[suit] > 17:
+                dominant = suit
+        elif suits[suit] > suits[dominant]:
+            dominant = suit
+    return rules.SUITS[dominant] if dominant is not None else None, no_trump * SCALES[0], all_trump * SCALES[1]
+
+def expected_batch(hands):
+    """ Return expected_analysis() of many 5-card hands as features.analyze_batch() gives
+        analyze_hand(): numpy arrays of the dominant suit indexes (-1 for none), the no trump
+        powers and the all trump powers; each different hand is worked out once
+        hands -> numpy array (N, 5) of card ordinals """
+    hands = numpy.sort(hands, axis=1)
+    if len(hands):
+        hands, inverse = numpy.unique(hands, axis=0, return_inverse=True)
+    else:
+        inverse = numpy.zeros(0, int)
+    evaluate_many(hands.tolist())
+    dominant = numpy.full(len(hands), -1)
+    no_trump = numpy.zeros(len(hands))
+    all_trump = numpy.zeros(len(hands))
+    for row, hand in enumerate(hands):
+        suit, no_trump[row], all_trump[row] = expected_analysis(list(hand))
+        if suit:
+            dominant[row] = rules.SUITS.index(suit)
+    return dominant[inverse], no_trump[inverse], all_trump[inverse]
+
+def game_points(belot, hand, contract):
+    """ Return the points of a full hand in a contract as the game finds them: card points
+        (doubled in No trumps) and its announces from Hand.get_announces()
+        belot -> a copy of the game script of its own (engine.import_game())
+        hand -> list of 8 card ordinals """
+    player = belot.Hand("Player 1", "Team 1")
+    belot.game = belot.GameState()
+    belot.game.contract = [player, contract]
+    belot.game.switch_currentPower(belot.game.contract)
+    belot.trump = rules.get_trump(contract)
+    for number in hand:
+        player.add_card(belot.Card(*rules.ordinal_card(number)))
+    player.sort_hand()
+    points = sum(rules.card_value(contract, number) for number in hand)
+    if contract == 'No trumps':
+        return points * 2
+    player.get_announces()
+    return points + sum(rules.announce_value(anons.vid, anons.rank) for anons in player.announces + player.belotes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the expected hand values and check them against the game")
+    parser.add_argument("--hands", type=int, default=200, help="hands to time")
+    parser.add_argument("--check", type=int, default=3, help="hands to check on every completion")
+    options = parser.parse_args()
+    engine.load_game()
+    features.load_tables()
+    load_tables()
+    shuffle = random.Random(0)
+    hands = [shuffle.sample(xrange(32), odds.HAND) for number in xrange(options.hands)]
+    start = time.time()
+    for hand in hands:
+        expected_analysis(hand)
+    first = (time.time() - start) / len(hands)
+    start = time.time()
+    for hand in hands:
+        expected_analysis(hand)
+    cached = (time.time() - start) / len(hands)
+    print "expected values: %.2f ms a hand, %.3f ms cached" % (first * 1000, cached * 1000)
+    belot = engine.import_game("bidvalue_check")
+    wrong = 0
+    for hand in hands[:options.check]:
+        unseen = [card for card in xrange(32) if card not in hand]
+        holdings = completions(hand)
+        points = hand_points(holdings)
+        for row, coming in enumerate(itertools.combinations(unseen, odds.COMING)):
+            game = [game_points(belot, hand + list(coming), contract) for contract in CONTRACTS]
+            wrong += game != list(points[row])
+    print "checked %d hands on every completion: %d points differ" % (min(options.check, len(hands)), wrong)
+    hand = hands[0]
+    print "hand %s:" % " ".join("%s%s" % rules.ordinal_card(card)[::-1] for card in sorted(hand))
+    for contract, points in zip(CONTRACTS, evaluate(hand)[0]):
+        print "  %-10s %6.1f points" % (contract, points)
+    print "  analysis  ", expected_analysis(hand)
+    # without NumPy the game loads all the same and bids by the 5 cards
+    script = ("import sys; sys.modules['numpy'] = None; import engine, bidvalue; engine.load_game(); "
+              "print repr(bidvalue.expected_analysis(%r))" % hand)
+    output = subprocess.check_output([sys.executable, "-c", script]).splitlines()[-1]
+    print "without NumPy: expected_analysis() gives %s" % output
@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Bot clients for the Belote server (see server.py), for trying it out with many players.
+
+Each bot joins a table of its own, or one shared with other bots when humans is more than
+one, and answers every turn with a random legal bid or card after its think time. A bot
+leaves after the given number of deals; when all have left the totals are printed.
+Run with:
+    python botclient.py [--clients N] [--deals N] [--humans N] [--think MS] [--host HOST] [--port PORT]
+"""
+
+import json, time, random, socket, asyncore, asynchat, argparse
+import timeline
+from server import HOST, PORT, delta_message
+
+
+class Bot(asynchat.async_chat):
+    def __init__(self, host, port, deals, humans, think, scheduler):
+        """ A client which plays random legal moves
+            deals -> int; leave after this many deals
+            humans -> int; number of people (bots) at the table
+            think -> int; ms to wait before each move """
+        asynchat.async_chat.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect((host, port))
+        self.set_terminator(b"\n")
+        self.incoming = []
+        self.deals = deals
+        self.humans = humans
+        self.think = think
+        self.scheduler = scheduler
+        self.seat = None
+        self.seq = 0           # -> sequence number of the last delta
+        self.received = 0      # bytes
+        self.cards = 0         # cards played at the table
+        self.played = 0        # deals finished
+        self.moves = 0
+        self.tricks = 0
+        self.errors = 0
+        self.waits = []        # -> seconds from each move sent to the next event received
+        self.sent = None
+
+    def handle_connect(self):
+        self.send_message({"cmd": "join", "humans": self.humans})
+
+    def collect_incoming_data(self, data):
+        self.incoming.append(data)
+
+    def found_terminator(self):
+        line = b"".join(self.incoming)
+        self.incoming = []
+        self.received += len(line) + 1
+        message = json.loads(line)
+        if isinstance(message, list):    # a delta
+            message = delta_message(message)
+            if message["seq"] <= self.seq:
+                raise ValueError("Delta out of order")
+            self.seq = message["seq"]
+        if self.sent is not None:
+            self.waits.append(time.time() - self.sent)
+            self.sent = None
+        event = message["event"]
+        if event == "sync":
+            self.seat = message["seat"]
+            self.seq = message["seq"]
+            for delta in message["deal"]:
+                self.follow(delta_message(delta))
+        elif event == "error":
+            self.errors += 1
+            if message["message"] == "tablefailed":
+                self.close_when_done()
+        else:
+            self.follow(message)
+        if event == "turn" and message["seat"] == self.seat:
+            move = self.choose(message)
+            self.scheduler.call_later(self.think_time(), lambda: self.move(move))
+        elif event == "play":
+            self.cards += 1
+        elif event == "trick":
+            self.tricks += 1
+        elif event == "end":
+            self.played += 1
+            if self.played >= self.deals:
+                self.close_when_done()
+
+    def follow(self, message):
+        """ Called with every event of the table """
+
+    def choose(self, message):
+        """ Return the command answering a turn of the bot's seat """
+        if message["phase"] == "bid":
+            return {"cmd": "bid", "bid": random.choice(message["legal"])}
+        return {"cmd": "play", "card": random.choice(message["legal"])}
+
+    def think_time(self):
+        return self.think
+
+    def move(self, move):
+        self.moves += 1
+        self.sent = time.time()
+        self.send_message(move)
+
+    def send_message(self, message):
+        self.push(json.dumps(message) + "\n")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play random bots against the Belote server")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--deals", type=int, default=3)
+    parser.add_argument("--humans", type=int, default=1, help="bots per table")
+    parser.add_argument("--think", type=int, default=0, help="ms before each move")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    options = parser.parse_args()
+    scheduler = timeline.Scheduler()
+    bots = [Bot(options.host, options.port, options.deals, options.humans, options.think, scheduler)
+            for i in xrange(options.clients)]
+    start = last = time.time()
+    while asyncore.socket_map:
+        due = scheduler.next_due()
+        asyncore.loop(1.0 if due is None else due / 1000.0, count=1)
+        now = time.time()
+        scheduler.advance((now - last) * 1000)
+        last = now
+    elapsed = time.time() - start
+    waits = [wait for bot in bots for wait in bot.waits]
+    print "%d bots played %d deals and %d moves in %.1f s, %d errors" % (
+        len(bots), sum(bot.played for bot in bots), sum(bot.moves for bot in bots), elapsed,
+        sum(bot.errors for bot in bots))
+    print "reply after a move: median %.1f ms, 99th percentile %.1f ms" % (
+        1000 * percentile(waits, 0.5), 1000 * percentile(waits, 0.99))
+    print "received %.1f bytes per card played" % (
+        float(sum(bot.received for bot in bots)) / max(sum(bot.cards for bot in bots), 1))
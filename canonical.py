@@ -0,0 +1,110 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Canonical forms of hands and positions, under the symmetry of the suits.
+
+Which suit is which doesn't matter to the rules, only whether it's the trump: while
+bidding and in No trumps and All trumps all four suits play alike, and in a suit contract
+the three side suits do. A hand and the same hand with its suits swapped around have the
+same odds, values and best moves, so a table or cache keyed by canonical forms keeps one
+entry for up to 24 of them, and finds it for all of them.
+
+A position is told apart suit by suit: a column for each suit in rules.SUITS order, of
+anything that depends on the suit (the holdings of the seats, the cards of the suit in the
+trick...). canonical_order() sorts the suits by their columns, the trump first, and returns
+the permutation used: order[place] is the suit index put in that place. Cards, bit masks,
+contracts and values by suit are then moved to their places and back with it. A suit
+contract always becomes a contract of rules.SUITS[0].
+"""
+
+import rules
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+IDENTITY = (0, 1, 2, 3)
+
+
+def canonical_order(columns, contract='pass'):
+    """ Return the order of the suits in the canonical form: the trump of a suit contract
+        first, then the other suits by their columns, highest first
+        columns -> list of comparable descriptions of the suits, in rules.SUITS order """
+    trump = rules.SUITS.index(contract) if contract in rules.SUITS else None
+    free = sorted((suit for suit in xrange(4) if suit != trump), key=lambda suit: columns[suit], reverse=True)
+    return tuple(free if trump is None else [trump] + free)
+
+def holdings(cards):
+    """ Return the holdings of the suits of some cards, in rules.SUITS order: bit rank index set
+        cards -> list of card ordinals """
+    suits = [0] * 4
+    for card in cards:
+        suits[card // 8] |= 1 << (card % 8)
+    return suits
+
+def permute_card(card, order):
+    """ Return the card ordinal in the canonical form of the order """
+    return order.index(card // 8) * 8 + card % 8
+
+def restore_card(card, order):
+    """ Return the card ordinal a card of the canonical form stands for """
+    return order[card // 8] * 8 + card % 8
+
+def permute_mask(mask, order):
+    """ Return a bit mask of card ordinals in the canonical form of the order """
+    return sum(((mask >> 8 * suit) & 255) << 8 * place for place, suit in enumerate(order))
+
+def restore_mask(mask, order):
+    """ Return the bit mask of card ordinals a mask of the canonical form stands for """
+    return sum(((mask >> 8 * place) & 255) << 8 * suit for place, suit in enumerate(order))
+
+def permute_contract(contract, order):
+    """ Return the contract in the canonical form of the order: a suit contract moves with its suit """
+    if contract in rules.SUITS:
+        return rules.SUITS[order.index(rules.SUITS.index(contract))]
+    return contract
+
+def restore_contract(contract, order):
+    """ Return the contract a contract of the canonical form stands for """
+    if contract in rules.SUITS:
+        return rules.SUITS[order[rules.SUITS.index(contract)]]
+    return contract
+
+def permute_suits(values, order):
+    """ Return values by suit (rules.SUITS order) in the places of the canonical form """
+    return [values[suit] for suit in order]
+
+def restore_suits(values, order):
+    """ Return values by place in the canonical form in rules.SUITS order """
+    restored = [None] * 4
+    for place, suit in enumerate(order):
+        restored[suit] = values[place]
+    return restored
+
+def canonical_hand(hand, contract='pass'):
+    """ Return the canonical form of a hand: (sorted tuple of card ordinals, order)
+        hand -> list of card ordinals """
+    order = canonical_order(holdings(hand), contract)
+    return tuple(sorted(permute_card(card, order) for card in hand)), order
+
+def canonical_position(hands, contract, trick=()):
+    """ Return the canonical form of a position in the play: (tuple of the hands' bit masks,
+        tuple of the trick's card ordinals, contract, order)
+        hands -> list of the bit masks of card ordinals of the seats, in a fixed seat order
+        trick -> card ordinals played to the trick so far, in turn order """
+    columns = [tuple((mask >> 8 * suit) & 255 for mask in hands) +
+               tuple(index for index, card in enumerate(trick) if card // 8 == suit) for suit in xrange(4)]
+    order = canonical_order(columns, contract)
+    return (tuple(permute_mask(mask, order) for mask in hands), tuple(permute_card(card, order) for card in trick),
+            permute_contract(contract, order), order)
+
+def canonical_holdings(suits):
+    """ Return the canonical forms of many hands while bidding (or in No trumps and All
+        trumps): their holdings sorted, highest first, as numpy array (N, 4)
+        suits -> numpy array (N, 4) of the hands' suit holdings """
+    return -numpy.sort(-numpy.asarray(suits), axis=1)
+
+def holding_keys(suits):
+    """ Return the canonical_holdings() of many hands packed into one number each,
+        the highest holding in the highest byte, as numpy array (N,) """
+    return canonical_holdings(suits).dot(1 << numpy.arange(24, -1, -8))
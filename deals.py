@@ -0,0 +1,138 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Shuffled deals by the million, for simulations, made with NumPy.
+
+The game shuffles a list of Card objects, cuts it and deals it a card at a time with
+deal_card(): 3 and then 2 cards to each player in turn order before the bidding, and 3
+more after it. Here a deal is a row of 32 card ordinals instead (see rules.py): the
+hands of the players in turn order, 8 cards each, in the order they got them -- the
+cards the game would deal from a deck in the row's shuffled order. Whole blocks of
+decks are shuffled at once, from seeds of their own, so deal i is the same whichever
+slice it was made with.
+
+The deals can be made into a block of shared memory (multiprocessing.RawArray), where
+worker processes fill and read slices of it without anything being pickled:
+    python deals.py [--deals N] [--workers N] [--seed N]
+times them against the game's own shuffling and dealing, and checks both deal alike.
+"""
+
+import time, random, argparse, multiprocessing
+import numpy
+import engine
+
+BLOCK = 4096        # deals shuffled from one seed
+
+ORDER = None        # -> numpy array of the places in the shuffled deck of the cards dealt
+
+
+def deal_order():
+    """ Return the places in a shuffled deck (0-31) of the cards as the game deals them,
+        hand after hand in turn order; found by cutting and dealing a deck of places """
+    belot = engine.load_game()
+    deck = belot.Deck()
+    deck.deck = range(32)
+    deck.cut()
+    hands = [[] for seat in xrange(4)]
+    for count in (3, 2, 3):
+        for hand in hands:
+            for card in xrange(count):
+                hand.append(deck.deal_card())
+    return [place for hand in hands for place in hand]
+
+def shuffled_decks(first, stop, seed=0):
+    """ Return the shuffled decks of deals first to stop - 1, as a numpy array (N, 32)
+        of card ordinals """
+    decks = numpy.empty((stop - first, 32), numpy.uint8)
+    for block in xrange(first // BLOCK, (stop - 1) // BLOCK + 1):
+        start = block * BLOCK
+        keys = numpy.random.RandomState([seed, block]).random_sample((BLOCK, 32))
+        low, high = max(first, start), min(stop, start + BLOCK)
+        decks[low - first:high - first] = keys[low - start:high - start].argsort(axis=1)
+    return decks
+
+def deal(decks):
+    """ Return the deals of shuffled decks: numpy array (N, 32) of the card ordinals the
+        players get, hand after hand in turn order """
+    global ORDER
+    if ORDER is None:
+        ORDER = numpy.array(deal_order())
+    return decks[:, ORDER]
+
+def make_deals(first, stop, seed=0, out=None):
+    """ Return deals first to stop - 1 (numpy array (N, 32), uint8), written into out if given """
+    if out is None:
+        out = numpy.empty((stop - first, 32), numpy.uint8)
+    out[:] = deal(shuffled_decks(first, stop, seed))
+    return out
+
+def shared_deals(count):
+    """ Return a block of shared memory for count deals, to hand to worker processes """
+    return multiprocessing.RawArray('B', count * 32)
+
+def deals_view(block):
+    """ Return the deals in a block of shared memory, as a numpy array (N, 32) using it """
+    return numpy.frombuffer(block, numpy.uint8).reshape(-1, 32)
+
+def fill(block, first, stop, seed=0):
+    """ Make deals first to stop - 1 into the block of shared memory """
+    view = deals_view(block)
+    make_deals(first, stop, seed, view[first:stop])
+
+def fill_shared(count, seed=0, workers=None):
+    """ Return a block of shared memory with count deals, made by worker processes,
+        each on a slice of whole seed blocks """
+    block = shared_deals(count)
+    workers = workers or multiprocessing.cpu_count()
+    blocks = (count + BLOCK - 1) // BLOCK
+    bounds = [min(count, (blocks * number // workers) * BLOCK) for number in xrange(workers + 1)]
+    processes = [multiprocessing.Process(target=fill, args=(block, bounds[number], bounds[number + 1], seed))
+                 for number in xrange(workers) if bounds[number] < bounds[number + 1]]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return block
+
+def deal_like_game(deck):
+    """ Deal a shuffled deck (card ordinals) the game's way: cut() and deal_card() on Cards;
+        return the card ordinals of the hands in turn order """
+    belot = engine.load_game()
+    cards = belot.Deck()
+    cards.deck = [engine.ordinal_to_card(number) for number in deck]
+    cards.cut()
+    players = [belot.Hand("Player %d" % (seat + 1), "Team %d" % (seat % 2 + 1)) for seat in xrange(4)]
+    for count in (3, 2, 3):
+        for player in players:
+            for card in xrange(count):
+                player.add_card(cards.deal_card())
+    return [engine.ordinal(card) for player in players for card in player.hand]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the NumPy deal generator against the game's dealing")
+    parser.add_argument("--deals", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+    engine.load_game()
+    count = min(options.deals, 20000)
+    shuffle = random.Random(options.seed)
+    start = time.time()
+    for number in xrange(count):
+        deck = engine.BELOT.Deck()
+        shuffle.shuffle(deck.deck)
+        deck.cut()
+        for hand in xrange(4):
+            for card in xrange(8):
+                deck.deal_card()
+    game_time = time.time() - start
+    start = time.time()
+    block = fill_shared(options.deals, options.seed, options.workers)
+    numpy_time = time.time() - start
+    deals = deals_view(block)
+    decks = shuffled_decks(0, min(options.deals, 1000), options.seed)
+    same = all(list(deals[number]) == deal_like_game(deck) for number, deck in enumerate(decks))
+    print "game's Deck:  %10.0f deals/s" % (count / game_time)
+    print "NumPy:        %10.0f deals/s (%d deals, %d workers)" % (options.deals / numpy_time, options.deals, options.workers)
+    print "dealt alike:", "yes" if same else "NO"
@@ -0,0 +1,163 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Batched AI bids for many tables at once.
+
+A bid of the AI costs far more than a card: with EXPECTED_BIDS on, the bidder's hand is
+worked out over every way the cards to come may fall (see bidvalue.py), a few ms for a
+hand not seen before. A DecisionService collects the bids the batched tables (see
+engine.Table) stop for, up to max_batch of them or for max_wait ms, and works their
+hands out together -- bidvalue.evaluate_many() over all the new hands of the batch, or
+features.analyze_batch() when the AI bids by its 5 cards -- then each table makes its
+bid and plays on. The cards are still chosen one table at a time, straight away, as the
+card strategy is a tree of Python rules with no sensible vector form. A table whose next
+bidder is also the AI comes back in the next round of the same batch, so its bids never
+wait for max_wait again.
+
+Without NumPy the service still batches, and each table analyzes its own hand.
+Run it alone to compare the decisions per second of AI-only tables with and without it,
+each starting with no hand worked out yet:
+    python decisions.py [--tables N] [--deals N] [--max-batch N] [--max-wait MS]
+"""
+
+import time, argparse, traceback
+import engine, rules, features, bidvalue
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAX_BATCH = 64      # bids made together at most
+MAX_WAIT = 2        # ms the first bid of a batch may wait for others
+
+
+def analyze_hands(hands):
+    """ Return the analyses decide_bet() bids by for many 5-card hands, made together, as
+        engine.Table.ai_bid() makes each alone: of the expected hand with EXPECTED_BIDS on,
+        else of the 5 cards; a list of None without NumPy, and decide_bet() makes them
+        hands -> lists of card ordinals """
+    if numpy is None:
+        return [None] * len(hands)
+    if engine.load_game().EXPECTED_BIDS:
+        bidvalue.evaluate_many(hands)
+        return [bidvalue.expected_analysis(hand) for hand in hands]
+    masks = numpy.array([sum(1 << card for card in hand) for hand in hands], numpy.int64)
+    dominant, no_trump, all_trump, suits = features.analyze_batch(masks)
+    return [(rules.SUITS[suit] if suit >= 0 else None, int(no_power), int(all_power))
+            for suit, no_power, all_power in zip(dominant, no_trump, all_trump)]
+
+
+class DecisionService():
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        """ Makes the AI bids of batched tables in batches """
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.waiting = []       # -> list of [key, engine.Table, events so far]
+        self.since = None       # -> time the oldest waiting bid came
+        self.decisions = 0      # bids made
+        self.batches = 0        # rounds of bids made together
+
+    def add(self, key, table, events):
+        """ A batched table stopped for an AI bid; key identifies it in flush()'s result """
+        if not self.waiting:
+            self.since = time.time()
+        self.waiting.append([key, table, events])
+
+    def due(self):
+        """ Return the seconds until the next batch should be made (0 for now),
+            or None if no bid is waiting """
+        if not self.waiting:
+            return None
+        if len(self.waiting) >= self.max_batch:
+            return 0
+        return max(0, self.since + self.max_wait / 1000.0 - time.time())
+
+    def flush(self):
+        """ Make a batch of the waiting bids, and the AI bids following them.
+            Return a list of (key, table, events or the Exception raised) for the
+            tables which stopped for a person or at the end of a deal. """
+        batch = self.waiting[:self.max_batch]
+        del self.waiting[:self.max_batch]
+        self.since = time.time() if self.waiting else None
+        done = []
+        while batch:
+            self.batches += 1
+            analyses = analyze_hands([table.hand(table.pending[0]) for key, table, events in batch])
+            next_round = []
+            for entry, analysis in zip(batch, analyses):
+                key, table, events = entry
+                try:
+                    events.extend(table.resume(analysis))
+                except Exception as error:     # a bug in the AI breaks only this table
+                    traceback.print_exc()
+                    done.append((key, table, error))
+                    continue
+                self.decisions += 1
+                if table.pending:
+                    next_round.append(entry)
+                else:
+                    done.append((key, table, events))
+            batch = next_round
+        return done
+
+
+def decisions(events):
+    """ Return the number of bids and cards in a list of events """
+    return len([event for event in events if event[0] in ('bid', 'play')])
+
+def play_one_at_a_time(tables, deals):
+    """ Play the deals on AI-only tables, every decision on its own; return the events per table """
+    played = [[] for table in tables]
+    for deal in xrange(deals):
+        for table, events in zip(tables, played):
+            events.extend(table.proceed())
+    return played
+
+def play_batched(tables, deals, service):
+    """ Play the deals on batched AI-only tables through the service; return the events per table """
+    played = [[] for table in tables]
+    for deal in xrange(deals):
+        for number, table in enumerate(tables):
+            events = table.proceed()
+            played[number].extend(events)
+            if table.pending:
+                service.add(number, table, [])
+        while service.waiting:
+            for number, table, events in service.flush():
+                if isinstance(events, Exception):
+                    raise events
+                played[number].extend(events)
+    return played
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare batched AI bids with one at a time")
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--deals", type=int, default=5)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait", type=int, default=MAX_WAIT)
+    options = parser.parse_args()
+    belot = engine.load_game()
+    if numpy is not None:
+        features.load_tables()
+        bidvalue.load_tables()
+    bidvalue.CACHE.clear()
+    start = time.time()
+    single = play_one_at_a_time([engine.Table((), seed) for seed in xrange(options.tables)], options.deals)
+    single_time = time.time() - start
+    bidvalue.CACHE.clear()
+    service = DecisionService(options.max_batch, options.max_wait)
+    start = time.time()
+    batched = play_batched([engine.Table((), seed, batched=True) for seed in xrange(options.tables)],
+                           options.deals, service)
+    batched_time = time.time() - start
+    count = sum(decisions(events) for events in single)
+    bids = sum(1 for events in single for event in events if event[0] == 'bid')
+    print "%d tables, %d deals each: %d AI decisions, %d of them bids, by the %s" % (
+        options.tables, options.deals, count, bids,
+        "expected hands" if belot.EXPECTED_BIDS and numpy is not None else "5 cards")
+    print "one at a time: %8.0f decisions/s, %6.0f bids/s" % (count / single_time, bids / single_time)
+    print "batched:       %8.0f decisions/s, %6.0f bids/s, %.1f bids per batch%s" % (
+        sum(decisions(events) for events in batched) / batched_time, bids / batched_time,
+        float(service.decisions) / max(service.batches, 1), "" if numpy else " (without NumPy)")
+    print "same moves:", "yes" if single == batched else "NO"
@@ -0,0 +1,249 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+A tablebase of the last two tricks of a deal with perfect play, in a memory-mapped file.
+
+With two tricks to go each seat holds 2 cards, and the last trick plays itself, so the
+end of a deal comes down to the 16 ways the four seats may choose their card for the
+first of the two tricks. Which cards may be played (rules.card_allowed()) and who takes
+a trick only depend on the suits of the cards, the class of the contract (a suit, No
+trumps or All trumps) and how the cards of each suit rank among the 8 left. So the
+tablebase holds every position in those terms: the cards of each suit ranked from the
+weakest up, the trump of a suit contract first, and dealt 2 to each seat from the
+leader on. For each of the 16 choices it keeps, in a byte, whether the cards may be
+played and which seat takes each trick: 3 classes x 165 shares of the suits x 2520
+deals x 16 bytes, about 20 MB, read straight from the file (mmap).
+
+probe() finds a real position in it and settles it with the points of the real cards:
+what the leader's team takes (card points and 10 for the last trick, as deal_points()
+counts them before No trumps doubles them) when both teams play their best, and the best
+card of the seat to play -- from the middle of the first trick too, a seat counting the
+card it played among its 2. That's a few dozen additions instead of playing the end out.
+
+The tablebase is built with NumPy the first time it's needed, or with:
+    python endgame.py [--check N]
+which also times probe() and checks it against a plain minimax over the rules.
+"""
+
+import os, time, random, argparse, itertools, mmap
+import rules
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ENDGAME_FILE = "endgame.tb"
+CARDS = 2       # cards each seat holds
+SUIT_CONTRACT, NO_TRUMPS, ALL_TRUMPS = range(3)     # classes of contracts
+LEGAL = 16      # set in a choice's byte if the cards may be played; bits 2-3 hold the seat
+                # taking the first trick, bits 0-1 the seat taking the last one
+
+SHARES = None   # -> list of the cards of each suit (tuples of 4 summing to 8); index by SHARE_INDEX
+DEALS = None    # -> list of the seats of the 8 cards (tuples, 2 cards a seat); index by DEAL_INDEX
+SHARE_INDEX = None
+DEAL_INDEX = None
+TABLE = None    # -> mmap of the tablebase file
+ORDERS = {}     # -> {contract: contract_tables()}
+
+
+def load_indexes():
+    global SHARES, DEALS, SHARE_INDEX, DEAL_INDEX
+    if SHARES is None:
+        SHARES = [share for share in itertools.product(xrange(CARDS * 4 + 1), repeat=4) if sum(share) == CARDS * 4]
+        DEALS = sorted(set(itertools.permutations(range(4) * CARDS)))
+        SHARE_INDEX = dict((share, index) for index, share in enumerate(SHARES))
+        DEAL_INDEX = dict((deal, index) for index, deal in enumerate(DEALS))
+
+def contract_class(contract):
+    if contract in rules.SUITS:
+        return SUIT_CONTRACT
+    return NO_TRUMPS if contract == 'No trumps' else ALL_TRUMPS
+
+def suit_places(contract):
+    """ Return the place of each suit (rules.SUITS order) in the tablebase: the trump first """
+    trump = rules.get_trump(contract)
+    order = ([trump] if trump else []) + [suit for suit in rules.SUITS if suit != trump]
+    return [order.index(suit) for suit in rules.SUITS]
+
+def trick_powers(kind, suits, ranks, led):
+    """ Return the powers of cards in a trick (see rules.trick_power()), by suit place and rank """
+    return numpy.where(suits == led, ranks + 1, numpy.where((kind == SUIT_CONTRACT) & (suits == 0), ranks + 11, 0))
+
+def allowed(kind, hand_suits, hand_ranks, suit, rank, trick_suits, trick_ranks):
+    """ rules.card_allowed() of many positions at once, by suit place and rank
+        hand_suits, hand_ranks -> numpy arrays (N, 2) of the cards of the seat
+        suit, rank -> numpy arrays (N,) of the card it plays
+        trick_suits, trick_ranks -> numpy arrays (N, cards played) of the trick so far """
+    rows = numpy.arange(len(suit))
+    led = trick_suits[:, 0]
+    place = trick_powers(kind, trick_suits, trick_ranks, led[:, None]).argmax(axis=1)
+    winning_suit, winning_rank = trick_suits[rows, place], trick_ranks[rows, place]
+    partner = trick_suits.shape[1] - place == 2
+    follows = hand_suits == led[:, None]
+    higher = (follows & (hand_ranks > winning_rank[:, None])).any(axis=1)
+    must_go_higher = (kind == ALL_TRUMPS) | ((kind == SUIT_CONTRACT) & (led == 0))
+    result = (~follows.any(axis=1) | (suit == led)) & ~((suit == led) & must_go_higher & higher & (rank < winning_rank))
+    if kind == SUIT_CONTRACT:
+        free = follows.any(axis=1) | partner
+        trumps = hand_suits == 0
+        over = (trumps & (hand_ranks > winning_rank[:, None])).any(axis=1) & (winning_suit == 0)
+        result &= free | (winning_suit == 0) | ~trumps.any(axis=1) | (suit == 0)
+        result &= free | ~over | ((suit == 0) & (rank > winning_rank))
+    return result
+
+def settle(kind, suits, ranks):
+    """ Return the bytes of the 16 choices of many positions, as numpy array (N, 16)
+        suits, ranks -> numpy arrays (N, seat, 2) of the cards of the seats from the leader
+                        on, by suit place and rank """
+    rows = numpy.arange(len(suits))
+    result = numpy.zeros((len(suits), 16), numpy.uint8)
+    for choice in xrange(16):
+        first = numpy.array([(choice >> seat) & 1 for seat in xrange(4)])
+        played_suits, played_ranks = suits[:, xrange(4), first], ranks[:, xrange(4), first]
+        legal = numpy.ones(len(suits), bool)
+        for seat in xrange(1, 4):
+            legal &= allowed(kind, suits[:, seat], ranks[:, seat], played_suits[:, seat], played_ranks[:, seat],
+                             played_suits[:, :seat], played_ranks[:, :seat])
+        taker = trick_powers(kind, played_suits, played_ranks, played_suits[:, :1]).argmax(axis=1)
+        last_suits, last_ranks = suits[:, xrange(4), 1 - first], ranks[:, xrange(4), 1 - first]
+        last = trick_powers(kind, last_suits, last_ranks, last_suits[rows, taker][:, None]).argmax(axis=1)
+        result[:, choice] = numpy.where(legal, LEGAL, 0) | taker << 2 | last
+    return result
+
+def build(filename=ENDGAME_FILE):
+    """ Work out every position and write the tablebase to filename """
+    load_indexes()
+    deals = numpy.array(DEALS)
+    slots = deals.argsort(axis=1, kind='mergesort').reshape(-1, 4, CARDS)    # -> (deal, seat, card) ascending
+    table = numpy.zeros((3, len(SHARES), len(DEALS), 16), numpy.uint8)
+    suit_of = numpy.array([numpy.repeat(numpy.arange(4), share) for share in SHARES])
+    rank_of = numpy.array([numpy.concatenate([numpy.arange(count) for count in share]) for share in SHARES])
+    suits = suit_of[:, slots].reshape(-1, 4, CARDS)
+    ranks = rank_of[:, slots].reshape(-1, 4, CARDS)
+    for kind in (SUIT_CONTRACT, NO_TRUMPS, ALL_TRUMPS):
+        table[kind] = settle(kind, suits, ranks).reshape(len(SHARES), len(DEALS), 16)
+    table.tofile(filename)
+
+def tables(filename=ENDGAME_FILE):
+    """ Return the tablebase, mapped from its file (built first if it's missing), as an mmap
+        of the bytes of the choices by (class, share, deal) """
+    global TABLE
+    if TABLE is None:
+        load_indexes()
+        size = 3 * len(SHARES) * len(DEALS) * 16
+        if not os.path.exists(filename) or os.path.getsize(filename) != size:
+            build(filename)
+        with open(filename, "rb") as stream:
+            TABLE = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    return TABLE
+
+def contract_tables(contract):
+    """ Return the tables probe() needs for a contract, by card ordinal: the order of the
+        cards in the tablebase (suit place * 16 + power) and their points """
+    if contract not in ORDERS:
+        places = suit_places(contract)
+        ORDERS[contract] = ([places[card // 8] * 16 + rules.card_power(contract, card) for card in xrange(32)],
+                            [rules.card_value(contract, card) for card in xrange(32)])
+    return ORDERS[contract]
+
+def probe(contract, hands, trick=()):
+    """ Return the points the team of the trick's leader takes in the last two tricks with
+        perfect play, and the best card for the seat to play
+        hands -> 4 lists of 2 card ordinals, of the seats from the leader of the first of the
+                 two tricks on; a seat which played to it has that card in its list too
+        trick -> card ordinals played to the first of the two tricks so far """
+    table = tables()
+    order, points = contract_tables(contract)
+    hands = [hand if order[hand[0]] < order[hand[1]] else hand[::-1] for hand in hands]   # choice 0 is the weaker card
+    cards = sorted((order[card], seat) for seat, hand in enumerate(hands) for card in hand)
+    share = [0] * 4
+    for key, seat in cards:
+        share[key >> 4] += 1
+    offset = ((contract_class(contract) * len(SHARES) + SHARE_INDEX[tuple(share)]) * len(DEALS) +
+              DEAL_INDEX[tuple(seat for key, seat in cards)]) * 16
+    row = bytearray(table[offset:offset + 16])
+    values = [[points[card] for card in hand] for hand in hands]
+    total = sum(map(sum, values)) + 10
+    # the points of each choice of cards for the first trick, then the best of each seat,
+    # from the last to play on: the leader's team takes the most, the other team leaves the least
+    results = []
+    for choice, code in enumerate(row):
+        if code & LEGAL:
+            first = values[0][choice & 1] + values[1][choice >> 1 & 1] + values[2][choice >> 2 & 1] + \
+                    values[3][choice >> 3]
+            results.append((0 if code & 4 else first) + (0 if code & 1 else total - first))
+        else:
+            results.append(None)
+    played = [hands[seat].index(card) for seat, card in enumerate(trick)]
+    start = sum(card << seat for seat, card in enumerate(played))
+    for seat in (3, 2, 1, 0):
+        better = max if seat % 2 == 0 else min
+        if seat == len(played):
+            options = [(results[start | card << seat], card) for card in xrange(CARDS)
+                       if results[start | card << seat] is not None]
+            best = better(options)
+            return best[0], hands[seat][best[1]]
+        reduced = []
+        for choice in xrange(1 << seat):
+            options = [results[choice | card << seat] for card in xrange(CARDS) if results[choice | card << seat] is not None]
+            reduced.append(better(options) if options else None)
+        results = reduced
+
+def minimax(contract, hands, trick=(), taken=0, leader=0, last=False):
+    """ Return what probe() does by playing every legal card out with the rules: the points
+        of the team of seat 0 and the best card of the seat to play
+        hands -> 4 lists of the card ordinals left to the seats; trick -> cards played so far
+        taken -> points the team took already; leader -> seat which led the trick
+        last -> True in the last trick """
+    seat = (leader + len(trick)) % 4
+    best = None
+    for card in rules.legal_cards(contract, hands[seat], trick):
+        points = play(contract, hands, trick, card, taken, leader, last)
+        if best is None or (points > best[0] if seat % 2 == 0 else points < best[0]):
+            best = points, card
+    return best
+
+def play(contract, hands, trick, card, taken, leader, last):
+    """ Return the points of minimax() after the seat to play plays the card """
+    seat = (leader + len(trick)) % 4
+    hands = [hand if place != seat else [other for other in hand if other != card] for place, hand in enumerate(hands)]
+    trick = list(trick) + [card]
+    if len(trick) < 4:
+        return minimax(contract, hands, trick, taken, leader, last)[0]
+    taker = rules.trick_winner(contract, [[(leader + place) % 4, other] for place, other in enumerate(trick)])
+    if taker % 2 == 0:
+        taken += sum(rules.card_value(contract, other) for other in trick) + (10 if last else 0)
+    return taken if last else minimax(contract, hands, [], taken, taker, True)[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the endgame tablebase and check it against a minimax")
+    parser.add_argument("--check", type=int, default=20000, help="positions to check")
+    options = parser.parse_args()
+    start = time.time()
+    build()
+    print "built %s in %.1f s (%d bytes)" % (ENDGAME_FILE, time.time() - start, os.path.getsize(ENDGAME_FILE))
+    shuffle = random.Random(0)
+    positions = []
+    for number in xrange(options.check):
+        contract = shuffle.choice(rules.BID_ORDER[1:])
+        deck = shuffle.sample(xrange(32), 8)
+        hands = [deck[seat * 2:seat * 2 + 2] for seat in xrange(4)]
+        trick = []
+        for seat in xrange(shuffle.randint(0, 3)):      # play some cards of the first trick
+            trick.append(shuffle.choice(rules.legal_cards(contract, hands[seat], trick)))
+        positions.append((contract, hands, trick))
+    start = time.time()
+    probes = [probe(*position) for position in positions]
+    probe_time = (time.time() - start) / len(positions)
+    start = time.time()
+    best = [minimax(contract, [[other for other in hand if other not in trick] for hand in hands], trick)
+            for contract, hands, trick in positions]
+    search_time = (time.time() - start) / len(positions)
+    wrong = 0
+    for (contract, hands, trick), (points, card), (best_points, best_card) in zip(positions, probes, best):
+        # the card found may differ where two are as good; it must be worth as much
+        rest = [[other for other in hand if other not in trick] for hand in hands]
+        wrong += points != best_points or play(contract, rest, trick, card, 0, 0, False) != points
+    print "probe: %.1f us a position, minimax: %.1f us" % (probe_time * 1e6, search_time * 1e6)
+    print "checked %d positions: %d wrong" % (len(positions), wrong)
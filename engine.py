@@ -0,0 +1,455 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Headless Belote tables, for hosting games without the pygame interface.
+
+The rules and the AI live in the game script, written around its module globals (game,
+trump, turnOrder, the players...). load_game() imports the script once, with headless
+animations and nothing recorded or saved. Each Table keeps its own set of those globals
+and binds them into the module while it runs, so any number of tables share one copy of
+the code; only one table may run at a time, though (the server runs all tables on a
+single engine thread).
+
+A Table runs the computer seats by itself and stops whenever a person has to bid or
+play, and after every deal (proceed() starts the next one). Everything that happened is reported as a list of events, tuples whose first item
+names the event:
+    ('deal', first seat)
+    ('cards', seat, card ordinals)      -- private to the seat; after the 5 and the 8 cards
+    ('turn', seat, 'bid' or 'play', legal bids or card ordinals)
+    ('bid', seat, bid)
+    ('announce', seat, vid, suit, last card, rank)
+    ('play', seat, card ordinal)
+    ('trick', seat which took it)
+    ('end', team 1 score, team 2 score)  -- also after a deal everybody passed
+    ('over', winning team)
+Seats are 0-3 for Player 1-4 and cards are rules.py ordinals, as in record.py.
+"""
+
+import os, imp, random, contextlib
+import location, rules
+
+GAME_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "belot v 1.2.py")
+BIDS = ('pass', 'C', 'D', 'H', 'S', 'No trumps', 'All trumps', 'contra', 're-contra')
+# the game's globals which make up the state of a table
+TABLE_GLOBALS = ('game', 'deck', 'player1', 'player2', 'player3', 'player4', 'strategy1', 'strategy2',
+                 'turnOrder', 'rund', 'trump', 'contra', 'reContra', 'endBid', 'playhand', 'required')
+
+BELOT = None    # -> the game module, once loaded
+
+
+class MoveError(Exception):
+    """ A person tried a bid or card the rules don't allow; the message is the key of
+        the game message explaining why (see location.py) """
+
+
+def load_game():
+    """ Import the game script for headless use (once) and return the module """
+    global BELOT
+    if BELOT is None:
+        BELOT = import_game("belot")
+    return BELOT
+
+def import_game(name):
+    """ Import a copy of the game script of its own for headless use, as module name, and
+        return it; a copy has its own globals, so it may run on another thread than the game """
+    belot = imp.load_source(name, GAME_SCRIPT)
+    belot.TIMELINE.headless = True
+    belot.RECORD_FILE = None
+    belot.SAVE_FILE = None
+    belot.MES = location.English()
+    return belot
+
+def ordinal(card):
+    return rules.card_ordinal(card.suit, card.rank)
+
+def ordinal_to_card(number):
+    return BELOT.Card(*rules.ordinal_card(number))
+
+def announce_fields(anons):
+    """ Return an Anons as a tuple (Anons only compares with strings) """
+    return anons.vid, anons.suit, anons.last_card, anons.rank
+
+
+class Table():
+    def __init__(self, humans=(), seed=None, batched=False):
+        """ A table of four, where the seats not played by people are played by the AI.
+            humans -> seats (0-3) played by people
+            seed -> seeds the shuffle and the first player, for repeatable games
+            batched -> if True, the table also stops before each AI bid, so that the bids
+                       of many tables can be made together (see decisions.py) """
+        belot = load_game()
+        self.humans = set(humans)
+        self.random = random.Random(seed)
+        self.space = {}         # -> dict {name: value} of the table's game globals
+        self.waiting = None     # -> (seat, 'bid' or 'play') while waiting for a person
+        self.batched = batched
+        self.pending = None     # -> (seat, 'bid') while a batched table waits for an AI bid
+        self.position = 0       # -> index in turnOrder of the player to bid or play next
+        self.deals = 0          # number of deals finished
+        self.announced = set()  # -> seats which made their announces this deal
+        players = [belot.Hand("Player %d" % (seat + 1), "Team %d" % (seat % 2 + 1)) for seat in xrange(4)]
+        deck = belot.Deck()
+        self.random.shuffle(deck.deck)
+        game = belot.GameState()
+        game.first = self.random.choice(players)
+        self.space.update(game=game, deck=deck, strategy1=belot.Strategy("Team 1"),
+                          strategy2=belot.Strategy("Team 2"), turnOrder=list(players), rund=1,
+                          trump=None, contra=False, reContra=False, endBid=[False] * 4,
+                          playhand={}, required=None)
+        for seat, player in enumerate(players):
+            self.space["player%d" % (seat + 1)] = player
+        with self.bound() as belot:
+            belot.changeTurnOrder(game.first)
+
+    @contextlib.contextmanager
+    def bound(self):
+        """ Bind the table's globals into the game module while the block runs """
+        BELOT.__dict__.update(self.space)
+        try:
+            yield BELOT
+        finally:
+            for name in TABLE_GLOBALS:
+                self.space[name] = BELOT.__dict__[name]
+
+    def players(self):
+        return [self.space["player%d" % seat] for seat in xrange(1, 5)]
+
+    def seat(self, player):
+        return self.players().index(player)
+
+    def legal(self):
+        """ Return the bids or card ordinals the waiting person may choose from """
+        if self.waiting is None:
+            return []
+        with self.bound():
+            return self.legal_now(self.waiting[1], self.waiting[0])
+
+    def start(self):
+        """ Deal the first hand; return the events up to the first person's turn """
+        events = []
+        with self.bound() as belot:
+            self.start_deal(belot, events)
+            self.run(belot, events)
+        return events
+
+    def proceed(self):
+        """ Go on after a deal ended; return the events up to the next person's turn
+            or the end of the next deal """
+        events = []
+        if self.waiting is None and self.pending is None:
+            with self.bound() as belot:
+                self.start_deal(belot, events)
+                self.run(belot, events)
+        return events
+
+    def act(self, seat, action):
+        """ A person bids or plays; action is a bid string or a card ordinal.
+            Return the events up to the next person's turn; raise MoveError
+            if it's not the seat's turn or the rules don't allow the action. """
+        if self.waiting is None or self.waiting[0] != seat:
+            raise MoveError("notyourturn")
+        events = []
+        with self.bound() as belot:
+            player = self.players()[seat]
+            if self.waiting[1] == 'bid':
+                if action not in BIDS:
+                    raise MoveError("unknown")
+                error = belot.bidError(action)
+                if error:
+                    raise MoveError(error)
+                belot.registerBid(player, action)
+                events.append(('bid', seat, action))
+            else:
+                cards = [card for card in player.hand if ordinal(card) == action]
+                if not cards:
+                    raise MoveError("unknown")
+                card = cards[0]
+                error = belot.checkCard(player, card, belot.playhand, belot.required)
+                if error:
+                    raise MoveError(error)
+                self.play(belot, player, card, events)
+            self.waiting = None
+            self.position += 1
+            self.run(belot, events)
+        return events
+
+    def release(self, seat):
+        """ Hand a person's seat over to the AI, e.g. when they leave the table;
+            return the events up to the next person's turn """
+        self.humans.discard(seat)
+        events = []
+        if self.waiting is not None and self.waiting[0] == seat:
+            self.waiting = None
+            with self.bound() as belot:
+                self.run(belot, events)
+        return events
+
+    def occupy(self, seat):
+        """ A person takes a seat over from the AI, from its next turn on """
+        self.humans.add(seat)
+        return []
+
+    def resume(self, analysis=None):
+        """ Make the AI bid a batched table stopped for; return the events up to the next stop.
+            analysis -> the bidder's analysis for decide_bet(), if already known """
+        events = []
+        with self.bound() as belot:
+            seat, phase = self.pending
+            self.pending = None
+            self.ai_bid(belot, seat, self.players()[seat], events, analysis)
+            self.run(belot, events)
+        return events
+
+    def hand(self, seat):
+        """ Return the card ordinals in a seat's hand """
+        return [ordinal(card) for card in self.space["player%d" % (seat + 1)].hand]
+
+    def start_deal(self, belot, events):
+        """ Deal 3 and 2 cards to each player and start the bidding, as startBidding() """
+        belot.endBid = [False, False, False, False]
+        belot.contra = False
+        belot.reContra = False
+        self.announced = set()
+        events.append(('deal', self.seat(belot.game.first)))
+        for count in (3, 2):
+            for player in belot.turnOrder:
+                for card in xrange(count):
+                    player.add_card(belot.deck.deal_card())
+        for player in belot.turnOrder:
+            player.sort_hand()
+            events.append(('cards', self.seat(player), [ordinal(card) for card in player.hand]))
+        self.position = 0
+
+    def run(self, belot, events):
+        """ Play the computer seats until a person has to act or the deal ends """
+        while self.waiting is None and self.pending is None:
+            if belot.game.state == 1:
+                if self.run_bidding(belot, events):
+                    return
+            elif belot.game.state == 3:
+                self.run_trick(belot, events)
+            elif belot.game.state == 4:
+                self.finish(belot, events)
+                return
+
+    def run_bidding(self, belot, events):
+        """ Make the next bid; return True if the deal ended because everybody passed """
+        if False not in belot.endBid:      # everyone has finished bidding
+            belot.terminateBidding(belot.game.contract)
+            if belot.game.state == 1:      # everybody passed, the cards are dealt again
+                events.append(('end', belot.game.team1Score, belot.game.team2Score))
+                self.deals += 1
+                return True
+            else:                          # deal the rest of the cards, as prepare()
+                for player in belot.turnOrder:
+                    for card in xrange(3):
+                        player.add_card(belot.deck.deal_card())
+                belot.prepareHands(belot.game.contract, [self.players()[seat] for seat in self.humans])
+                for player in belot.turnOrder:
+                    events.append(('cards', self.seat(player), [ordinal(card) for card in player.hand]))
+                self.position = 0
+            return
+        player = belot.turnOrder[self.position % 4]
+        seat = self.seat(player)
+        if seat in self.humans:
+            if belot.endBid[self.position % 4]:
+                self.position += 1
+            else:
+                self.wait(seat, 'bid', events)
+            return
+        if self.batched:
+            self.pending = (seat, 'bid')
+            return
+        self.ai_bid(belot, seat, player, events)
+
+    def ai_bid(self, belot, seat, player, events, analysis=None):
+        team = belot.strategy1 if player.team == "Team 1" else belot.strategy2
+        if analysis is None:
+            analysis = belot.expectedAnalysis(player)
+        bid = team.decide_bet(player, belot.game.contract, analysis)
+        belot.registerBid(player, bid)
+        events.append(('bid', seat, bid))
+        self.position += 1
+
+    def run_trick(self, belot, events):
+        if self.position == 4:     # everybody played, as playRound()
+            winner = belot.finishTrick()
+            events.append(('trick', self.seat(winner)))
+            belot.playhand = {}
+            belot.required = None
+            self.position = 0
+            if belot.rund == 9:
+                belot.game.state = 4
+            return
+        player = belot.turnOrder[self.position]
+        seat = self.seat(player)
+        if belot.rund == 1 and seat not in self.announced:
+            # announces are made with the first card; people's automatically
+            self.announced.add(seat)
+            declared = list(belot.game.announces)
+            belot.announce(player)
+            self.report_announces(belot, declared, events)
+        if seat in self.humans:
+            self.wait(seat, 'play', events)
+            return
+        self.ai_play(belot, seat, player, events)
+
+    def ai_play(self, belot, seat, player, events):
+        declared = list(belot.game.announces)
+        pos, card = belot.chooseMove(player, belot.playhand, belot.required)
+        self.report_announces(belot, declared, events)
+        belot.playhand[player] = card
+        if belot.required is None:
+            belot.required = card.get_suit()
+        events.append(('play', seat, ordinal(card)))
+        self.position += 1
+
+    def play(self, belot, player, card, events):
+        """ Play a person's card, declaring a belote with it as the game does """
+        if belot.required is None:
+            belot.required = card.get_suit()
+        declared = list(belot.game.announces)
+        belot.playCard(player, card, belot.required)
+        self.report_announces(belot, declared, events)
+        belot.playhand[player] = card
+        events.append(('play', self.seat(player), ordinal(card)))
+
+    def finish(self, belot, events):
+        """ Score the deal and start the next one, as finish() and gameOver() """
+        result1, result2 = belot.countResults()
+        belot.scoreResults(result1, result2)
+        game = belot.game
+        events.append(('end', game.team1Score, game.team2Score))
+        self.deals += 1
+        winner = belot.checkGameOver(result1, result2)
+        if winner is None:
+            belot.changeTeamStrategy(belot.strategy1, game.team1Score, game.team2Score)
+            belot.changeTeamStrategy(belot.strategy2, game.team2Score, game.team1Score)
+        elif winner != "last round":
+            events.append(('over', winner))
+            if winner == 'Team 1':
+                game.team1Games += 1
+            else:
+                game.team2Games += 1
+            game.team1Score = 0
+            game.team2Score = 0
+            belot.strategy1.behavior = "normal"
+            belot.strategy2.behavior = "normal"
+        belot.cleanAll()
+
+    def wait(self, seat, phase, events):
+        self.waiting = (seat, phase)
+        events.append(('turn', seat, phase, self.legal_now(phase, seat)))
+
+    def legal_now(self, phase, seat):
+        """ Return the bids or card ordinals the seat may choose from; the table must be bound """
+        if phase == 'bid':
+            return [bid for bid in BIDS if not BELOT.bidError(bid)]
+        return [ordinal(card) for card in BELOT.legalCards(self.players()[seat], BELOT.playhand, BELOT.required)]
+
+    def report_announces(self, belot, declared, events):
+        """ Add the events of the announces declared since game.announces was declared """
+        for player, anons in belot.game.announces:
+            if not [entry for entry in declared if entry[1] is anons]:
+                events.append(('announce', self.seat(player), anons.vid, anons.suit, anons.last_card, anons.rank))
+
+
+class View(Table):
+    def __init__(self, seat):
+        """ One seat's view of a table, rebuilt from the events it receives, so that the
+            game's AI can play the seat from a client (see loadtest.py). The other seats'
+            hands stay empty: the AI decides from its own cards and the cards played. """
+        Table.__init__(self, [other for other in xrange(4) if other != seat])
+        self.me = seat
+
+    def apply(self, event):
+        """ Follow an event, as a tuple of the engine's events """
+        kind = event[0]
+        with self.bound() as belot:
+            game = belot.game
+            players = self.players()
+            if kind == 'deal':
+                self.start_view(belot, players[event[1]])
+            elif kind == 'cards' and event[1] == self.me:
+                me = players[self.me]
+                me.hand = [ordinal_to_card(number) for number in event[2]]
+                if len(me.hand) == 8:      # the bidding is over
+                    belot.terminateBidding(game.contract)
+                    belot.prepareHands(game.contract, [player for player in players if player is not me])
+            elif kind == 'bid':
+                belot.registerBid(players[event[1]], event[2])
+            elif kind == 'announce':
+                player = players[event[1]]
+                fields = tuple(event[2:])
+                if not [entry for entry in game.announces if entry[0] is player and announce_fields(entry[1]) == fields]:
+                    game.announces.append([player, belot.Anons(*fields)])
+                player.announces = [anons for anons in player.announces if announce_fields(anons) != fields]
+                player.belotes = [anons for anons in player.belotes if announce_fields(anons) != fields]
+            elif kind == 'play':
+                player = players[event[1]]
+                card = ordinal_to_card(event[2])
+                position = player.find_card(player.hand, card)
+                if position is not None:
+                    player.play_card(position)
+                belot.playhand[player] = card
+                if belot.required is None:
+                    belot.required = card.get_suit()
+            elif kind == 'trick':
+                belot.finishTrick()
+                belot.playhand = {}
+                belot.required = None
+            elif kind == 'end':
+                game.team1Score, game.team2Score = event[1], event[2]
+                belot.changeTeamStrategy(belot.strategy1, game.team1Score, game.team2Score)
+                belot.changeTeamStrategy(belot.strategy2, game.team2Score, game.team1Score)
+            elif kind == 'over':
+                game.team1Score = 0
+                game.team2Score = 0
+                belot.strategy1.behavior = "normal"
+                belot.strategy2.behavior = "normal"
+
+    def start_view(self, belot, first):
+        """ Forget the last deal, as cleanAll() """
+        for player in self.players():
+            player.hand = []
+            player.winnings = []
+            player.announces = []
+            player.belotes = []
+            player.saved_cards = []
+            player.suit_power = {}
+        game = belot.game
+        game.currentPower = {'C': belot.NO_TRUMP_POWER, 'S': belot.NO_TRUMP_POWER,
+                             'H': belot.NO_TRUMP_POWER, 'D': belot.NO_TRUMP_POWER}
+        game.contract = [None, "pass"]
+        game.announces = []
+        for strategy in (belot.strategy1, belot.strategy2):
+            strategy.bid_history = []
+            strategy.passed = {}
+        game.first = first
+        belot.changeTurnOrder(first)
+        belot.trump = None
+        belot.rund = 1
+        belot.endBid = [False, False, False, False]
+        belot.contra = False
+        belot.reContra = False
+        belot.playhand = {}
+        belot.required = None
+
+    def decide(self, phase):
+        """ Return the AI's choice for the seat's turn: a bid, or a card ordinal """
+        with self.bound() as belot:
+            me = self.players()[self.me]
+            if phase == 'bid':
+                team = belot.strategy1 if me.team == "Team 1" else belot.strategy2
+                bid = team.decide_bet(me, belot.game.contract, belot.expectedAnalysis(me))
+                return 'pass' if belot.bidError(bid) else bid
+            announces = list(belot.game.announces)
+            belotes = list(me.belotes)
+            pos, card = belot.chooseMove(me, belot.playhand, belot.required)
+            me.hand.insert(pos, card)     # the card leaves the hand when the server reports it
+            belot.game.announces = announces
+            me.belotes = belotes
+            if belot.checkCard(me, card, belot.playhand, belot.required):
+                # the AI misjudged the rules, fall back on the first legal card
+                card = belot.legalCards(me, belot.playhand, belot.required)[0]
+            return ordinal(card)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+The AI's hand features for many hands at once.
+
+Strategy.analyze_hand() and get_suit_power() look at one hand at a time, a suit at a
+time. A suit holding is only 8 bits, so holding_powers() works the game's rules out for
+all 256 holdings once, and suit_powers() gives the powers and analyses of every suit of
+a batch of hands by a table lookup with NumPy; analyze_batch() builds analyze_hand()'s
+dominant suit and power totals on top of it, for simulations, the expected bids (see
+bidvalue.py) and the batched bids (see decisions.py). Run it alone to time the batched features against the game's, and check
+them on every holding of a suit:
+    python features.py [--features N]
+"""
+
+import time, random, argparse
+import engine, rules
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STRAT_ORDER = None  # -> the game's suit analyses; suit_powers() gives their indexes
+HOLDINGS = None     # -> (no trump, all trump) numpy arrays (3, 256): holding_powers() of every holding
+
+
+def load_tables():
+    global STRAT_ORDER, HOLDINGS
+    if HOLDINGS is None:
+        belot = engine.load_game()
+        STRAT_ORDER = list(belot.STRAT_ORDER)
+        HOLDINGS = tuple(numpy.array(holding_powers(belot, trump)) for trump in (False, True))
+
+def suit_holdings(hands):
+    """ Return the holding of every suit of many hands: numpy array (N, 4) by suit in
+        rules.SUITS order, bit rank index set for the cards held (0-255)
+        hands -> numpy array (N, 4, 8) or (N, 32) of 0 and 1, by card ordinal, or (N,) of
+                 bitmasks with bit ordinal set for the cards held """
+    hands = numpy.asarray(hands)
+    if hands.ndim == 1:
+        return (hands.astype(numpy.int64)[:, None] >> numpy.arange(0, 32, 8)) & 255
+    return hands.reshape(-1, 4, 8).dot(1 << numpy.arange(8))
+
+def holding_powers(belot, trump):
+    """ Return get_suit_power() of all 256 holdings of a suit, computed together:
+        no trump powers, all trump powers and indexes in STRAT_ORDER of the analyses
+        (-1, with powers 0, for no cards)
+        trump -> True if the suit is scored by the all trump table in the contract """
+    cards = (numpy.arange(256)[:, None] >> numpy.arange(8)) & 1    # -> (holding, rank index)
+    tables = (belot.NO_TRUMP_POWER, belot.ALL_TRUMP_POWER)
+    counts = cards.sum(axis=1)
+    no_trump = cards.dot([tables[0][rank] for rank in rules.RANKS])
+    all_trump = cards.dot([tables[1][rank] for rank in rules.RANKS])
+    # a single card of a suit counts 1 and 1, but the J 0 and 3 and the A 3 and 0
+    single = counts == 1
+    jack = single & (cards[:, rules.RANKS.index('J')] == 1)
+    ace = single & (cards[:, rules.RANKS.index('A')] == 1)
+    no_trump = numpy.where(single, numpy.where(jack, 0, numpy.where(ace, 3, 1)), no_trump)
+    all_trump = numpy.where(single, numpy.where(jack, 3, numpy.where(ace, 0, 1)), all_trump)
+    # whether the strongest, second and third card are held, by the suit's table
+    ranks = sorted(xrange(8), key=lambda rank: -tables[trump][rules.RANKS[rank]])    # strongest first
+    first, second, third = [cards[:, rank] == 1 for rank in ranks[:3]]
+    code = STRAT_ORDER.index
+    analysis = numpy.where(first,
+                           numpy.where(second, code('commanding'),
+                                       numpy.where((third & (counts > 2)) | (counts > 3),
+                                                   code('controlling'), code('weak'))),
+                           numpy.where(second,
+                                       numpy.where(counts > 2, code('strong block'), code('blocking')),
+                                       numpy.where(third & (counts > 3), code('long'), code('weak'))))
+    analysis = numpy.where(counts > 1, analysis, code('weak'))
+    analysis = numpy.where(counts > 0, analysis, -1)
+    return no_trump, all_trump, analysis
+
+def suit_powers(hands, contract="pass"):
+    """ Return Strategy.get_suit_power() of every suit of many hands, computed together,
+        with the given game.contract[1] (which only changes the analyses).
+        hands -> as suit_holdings()
+        Return numpy arrays (N, 4) by suit in rules.SUITS order: no trump powers, all trump
+        powers, and indexes in STRAT_ORDER of the analyses; -1 (and powers 0) where the hand
+        has no cards of the suit """
+    load_tables()
+    holdings = suit_holdings(hands)
+    trumps = [contract != "pass" and (contract == suit or contract == "All trumps") for suit in rules.SUITS]
+    tables = numpy.array([HOLDINGS[trump] for trump in trumps])     # -> (suit, part, holding)
+    suits = numpy.arange(4)
+    return tuple(tables[suits, part, holdings] for part in xrange(3))
+
+def analysis_order():
+    """ Return the suit indexes in the order analyze_hand() goes over the suits,
+        which is the order of its dict """
+    sep_hand = {}
+    for suit in ("C", "D", "H", "S"):
+        sep_hand[suit] = None
+    return [rules.SUITS.index(suit) for suit in sep_hand]
+
+def analyze_batch(hands, contract="pass"):
+    """ Return Strategy.analyze_hand() of many hands, computed together, as numpy arrays:
+        dominant suit indexes (-1 for none), no trump powers, all trump powers, and
+        suit_powers() of the hands, which it's computed from
+        hands -> as suit_holdings() """
+    suits = suit_powers(hands, contract)
+    no_trump, all_trump, analysis = suits
+    # the dominant suit: the first with an all trump power over 17, or any stronger after it
+    rows = numpy.arange(len(analysis))
+    dominant = numpy.full(len(analysis), -1)
+    for suit in analysis_order():
+        present = analysis[:, suit] >= 0
+        current = all_trump[rows, numpy.maximum(dominant, 0)]
+        first = present & (dominant < 0) & (all_trump[:, suit] > 17)
+        stronger = present & (dominant >= 0) & (all_trump[:, suit] > current)
+        dominant = numpy.where(first | stronger, suit, dominant)
+    return dominant, no_trump.sum(axis=1), all_trump.sum(axis=1), suits
+
+def scalar_features(strategy, player):
+    """ Return the game's analyze_hand() of a Hand, and get_suit_power() of its suits
+        in rules.SUITS order, as analyze_batch() gives them """
+    dominant, no_trump, all_trump = strategy.analyze_hand(player)
+    powers = [strategy.get_suit_power(player.separate_suit(suit)) or [0, 0, None] for suit in rules.SUITS]
+    return ((rules.SUITS.index(dominant) if dominant else -1, no_trump, all_trump),
+            [(no_power, all_power, STRAT_ORDER.index(analysis) if analysis else -1)
+             for no_power, all_power, analysis in powers])
+
+def batch_features(batch, row):
+    """ Return analyze_batch() of one hand, as scalar_features() gives it """
+    dominant, no_trump, all_trump, suits = batch
+    return ((dominant[row], no_trump[row], all_trump[row]),
+            [tuple(suits[part][row, suit] for part in xrange(3)) for suit in xrange(4)])
+
+def verify_suit_powers():
+    """ Check suit_powers() against the game's get_suit_power() on every holding of every
+        suit, in every contract; return the number of differences """
+    belot = engine.load_game()
+    belot.game = belot.GameState()
+    strategy = belot.Strategy("Team 1")
+    holdings = numpy.arange(256)
+    differences = 0
+    for contract in rules.BID_ORDER:
+        belot.game.contract = [None, contract]
+        for suit in xrange(4):
+            masks = holdings << (suit * 8)
+            no_trump, all_trump, analysis = suit_powers(masks, contract)
+            for holding in holdings:
+                cards = [belot.Card(rules.SUITS[suit], rules.RANKS[rank]) for rank in xrange(8) if holding >> rank & 1]
+                power = strategy.get_suit_power(cards) or [0, 0, None]
+                batched = [no_trump[holding, suit], all_trump[holding, suit], analysis[holding, suit]]
+                if batched != [power[0], power[1], STRAT_ORDER.index(power[2]) if power[2] else -1]:
+                    differences += 1
+    return differences
+
+def compare_features(count, seed=0, contract="pass"):
+    """ Time analyze_hand() and get_suit_power() one hand at a time and analyze_batch() on
+        them all; return (hands/s one at a time, hands/s together, same results) """
+    belot = engine.load_game()
+    load_tables()
+    belot.game = belot.GameState()
+    belot.game.contract = [None, contract]
+    shuffle = random.Random(seed)
+    hands = [shuffle.sample(xrange(32), 8) for number in xrange(count)]
+    players = []
+    rows = numpy.zeros((count, 32), numpy.uint8)
+    for row, ordinals in enumerate(hands):
+        player = belot.Hand("Player 1", "Team 1")
+        player.hand = [engine.ordinal_to_card(number) for number in ordinals]
+        players.append(player)
+        rows[row, ordinals] = 1
+    start = time.time()
+    strategy = belot.Strategy("Team 1")
+    single = [scalar_features(strategy, player) for player in players]
+    single_time = time.time() - start
+    start = time.time()
+    together = analyze_batch(rows, contract)
+    together_time = time.time() - start
+    same = all(single[row] == batch_features(together, row) for row in xrange(count))
+    return count / single_time, count / together_time, same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the batched hand features and check them against the game")
+    parser.add_argument("--features", type=int, default=100000, help="hands to compare the features on")
+    options = parser.parse_args()
+    single_rate, together_rate, same = compare_features(options.features)
+    print "hand features: %.0f hands/s one at a time, %.0f hands/s together, %s" % (
+        single_rate, together_rate, "same" if same else "DIFFERENT")
+    print "suit holdings differing from get_suit_power():", verify_suit_powers()
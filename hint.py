@@ -0,0 +1,163 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Hints for the person's card, found by a search running in the background.
+
+As soon as it's Player 1's turn to play, the game hands a Hinter a savegame.Snapshot of the
+match and the cards played so far in the trick. The Hinter searches on its own copy of the
+game (see engine.import_game), so the interface never waits for it, and can be asked for
+its best card at any time:
+- at first the best card is the one the AI would play in the person's place;
+- then it plays the deal out from each card the person may play, many times over. The
+  cards of the other players are unknown to the person, so each time they are dealt anew
+  from the cards not seen yet, keeping how many each has; from there the AI plays all four
+  seats to the end of the deal. A card's score is the average of Team 1's points less
+  Team 2's (countResults()) over its play-outs, and the best card is the one scoring best
+  once every card was tried.
+The play-outs go round the cards until each was played out HINT_PLAYOUTS times, or the
+person plays. The cards tried are the ones checkCard() allows, the same rules the person's
+clicks are held to.
+"""
+
+import random, threading
+import engine, ponder
+from rules import card_ordinal, ordinal_card
+
+HINT_PLAYOUTS = 50      # play-outs of each card, at most
+
+
+class Hinter(threading.Thread):
+    def __init__(self, playouts=HINT_PLAYOUTS, seed=None):
+        """ Searches for the best card of Player 1 in the background """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.playouts = playouts
+        self.random = random.Random(seed)   # the game's own random numbers are left alone
+        self.lock = threading.Lock()
+        self.ready = threading.Event()    # set when there's a new turn to think about
+        self.job = None         # -> (generation, packed snapshot, trick) not started yet
+        self.generation = 0     # -> number of the latest job; older jobs stop
+        self.best = None        # -> card ordinal of the best card found so far
+        self.scores = {}        # -> dict {card ordinal: [total points, play-outs]}
+        self.belot = None       # -> the copy of the game module, loaded on the thread
+
+    def think(self, snapshot, trick):
+        """ Start searching for the best card of Player 1, whose turn it is
+            snapshot -> savegame.Snapshot of the match now
+            trick -> list of (seat, card ordinal) played so far in the trick, in order """
+        with self.lock:
+            self.generation += 1
+            self.job = (self.generation, snapshot.pack(), tuple(trick))
+            self.best = None
+            self.scores = {}
+        self.ready.set()
+
+    def stop(self):
+        """ The person played; stop searching """
+        with self.lock:
+            self.generation += 1
+            self.job = None
+            self.best = None
+
+    def hint(self):
+        """ Return the ordinal of the best card found so far, or None if there's none yet """
+        with self.lock:
+            return self.best
+
+    def run(self):
+        self.belot = engine.import_game("hinting")
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            with self.lock:
+                job, self.job = self.job, None
+            if job:
+                self.search(*job)
+
+    def search(self, generation, blob, trick):
+        belot = self.belot
+        ponder.restore(belot, blob)
+        self.replay(trick)
+        player = belot.player1
+        cards = [card_ordinal(card.suit, card.rank)
+                 for card in belot.legalCards(player, belot.playhand, belot.required)]
+        belot.prepareAI(player)
+        pos, card = belot.chooseMove(player, belot.playhand, belot.required)
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.best = card_ordinal(card.suit, card.rank)     # what the AI would play
+            self.scores = dict((ordinal, [0, 0]) for ordinal in cards)
+        if len(cards) < 2:
+            return
+        for playout in xrange(self.playouts):
+            for ordinal in cards:
+                points = self.play_out(blob, trick, ordinal)
+                with self.lock:
+                    if generation != self.generation:
+                        return
+                    score = self.scores[ordinal]
+                    score[0] += points
+                    score[1] += 1
+                    if playout > 0 or ordinal == cards[-1]:    # every card was tried
+                        self.best = max(cards, key=lambda card: float(self.scores[card][0]) / self.scores[card][1])
+
+    def replay(self, trick):
+        """ Put the cards played so far in the trick on the table of the copy """
+        belot = self.belot
+        players = [belot.player1, belot.player2, belot.player3, belot.player4]
+        for seat, ordinal in trick:
+            card = belot.Card(*ordinal_card(ordinal))
+            belot.playhand[players[seat]] = card
+            if belot.required is None:
+                belot.required = card.get_suit()
+
+    def deal_unseen(self):
+        """ Deal the cards Player 1 hasn't seen anew to the other players, as many as each holds """
+        belot = self.belot
+        others = [belot.player2, belot.player3, belot.player4]
+        unseen = [card for player in others for card in player.hand]
+        self.random.shuffle(unseen)
+        for player in others:
+            count = len(player.hand)
+            player.hand, unseen = unseen[:count], unseen[count:]
+            player.sort_hand()
+            # what the AI made of its real hand goes; make it up again from the new one
+            player.announces = []
+            player.belotes = []
+            player.suit_power = {}
+            player.saved_cards = []
+            if belot.game.contract[1] != "No trumps":
+                player.get_announces()
+                if belot.rund > 1:      # too late to declare sequences
+                    player.announces = []
+            belot.prepareAI(player)
+
+    def play_out(self, blob, trick, ordinal):
+        """ Play the deal out once from Player 1 playing the given card;
+            return Team 1's points less Team 2's """
+        belot = self.belot
+        ponder.restore(belot, blob)
+        self.replay(trick)
+        self.deal_unseen()
+        belot.prepareAI(belot.player1)
+        card = belot.Card(*ordinal_card(ordinal))
+        belot.playCard(belot.player1, card, belot.required or card.get_suit())
+        belot.playhand[belot.player1] = card
+        if belot.required is None:
+            belot.required = card.get_suit()
+        while belot.rund < 9:
+            for player in belot.turnOrder:
+                if player in belot.playhand:
+                    continue
+                if belot.rund == 1:
+                    belot.announce(player)
+                pos, played = belot.chooseMove(player, belot.playhand, belot.required)
+                belot.playhand[player] = played
+                if belot.required is None:
+                    belot.required = played.get_suit()
+            belot.finishTrick()
+            belot.playhand = {}
+            belot.required = None
+        result1, result2 = belot.countResults()
+        return result1 - result2
@@ -0,0 +1,215 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Load test of the Belote server, for sizing the hosting.
+
+Starts server.py (or shards.py with --shards) on a loopback port, and connects any number
+of bot clients to it from this process. The bots play with the game's own AI: each keeps
+an engine.View of its table and bids and plays what Strategy.decide_bet and the card
+strategy choose, after a think time drawn around --think. Meanwhile the CPU and memory
+of the server processes are sampled every --sample ms (from /proc, so only on Linux).
+
+The report gives the move latency percentiles -- from sending a move to receiving it back
+from the server, so it covers the network and the tables queued on the engine -- the
+tricks played per second, and the server's CPU and memory over time. It is printed and
+written to --report.
+Run with:
+    python loadtest.py [--clients N] [--humans N] [--deals N] [--think MS] [--jitter MS]
+                       [--ramp S] [--shards N] [--max-batch N] [--port PORT] [--report FILE]
+"""
+
+import os, sys, time, random, socket, asyncore, argparse, subprocess
+import engine, server, timeline
+from botclient import Bot, percentile
+
+PORT = 7788
+SAMPLE = 1000           # ms between two samples of the server
+REPORT_FILE = "loadtest.txt"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class StrategyBot(Bot):
+    def __init__(self, host, port, deals, humans, think, jitter, scheduler):
+        """ A client playing with the game's AI
+            think, jitter -> int; ms; the think time is think +- jitter """
+        Bot.__init__(self, host, port, deals, humans, think, scheduler)
+        self.jitter = jitter
+        self.view = None     # -> engine.View of the bot's table
+
+    def follow(self, message):
+        if self.view is None:
+            self.view = engine.View(self.seat)
+        if message["event"] != "turn":
+            self.view.apply(server.message_event(message))
+
+    def choose(self, message):
+        choice = self.view.decide(message["phase"])
+        if message["phase"] == "bid":
+            return {"cmd": "bid", "bid": choice}
+        return {"cmd": "play", "card": choice}
+
+    def think_time(self):
+        return max(0, self.think + random.uniform(-self.jitter, self.jitter))
+
+
+def server_processes(pid):
+    """ Return the pids of a process and its children (the shards) """
+    pids = [pid]
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open("/proc/%s/stat" % name) as stat:
+                    fields = stat.read().rsplit(")", 1)[1].split()
+            except IOError:
+                continue
+            if int(fields[1]) == pid:
+                pids.append(int(name))
+    return pids
+
+def process_usage(pids):
+    """ Return the total CPU seconds used and the resident memory in bytes of the processes """
+    cpu, memory = 0.0, 0
+    for pid in pids:
+        try:
+            with open("/proc/%d/stat" % pid) as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except IOError:
+            continue    # the process ended
+        cpu += (int(fields[11]) + int(fields[12])) / float(CLOCK_TICKS)   # utime, stime
+        memory += int(fields[21]) * PAGE_SIZE     # rss in pages
+    return cpu, memory
+
+
+class Sampler():
+    def __init__(self, pid, bots, humans, scheduler, interval=SAMPLE):
+        """ Samples the server's CPU and memory and the tricks played, every interval ms """
+        self.pid = pid
+        self.bots = bots
+        self.humans = humans
+        self.scheduler = scheduler
+        self.interval = interval
+        self.available = os.path.isdir("/proc")
+        self.start = time.time()
+        self.last = (self.start, 0.0, 0)      # -> (time, server CPU seconds, tricks)
+        self.samples = []   # -> list of (seconds, tricks/s, CPU %, memory MB)
+        scheduler.call_later(interval, self.sample)
+
+    def tricks(self):
+        return sum(bot.tricks for bot in self.bots) / float(self.humans)
+
+    def sample(self):
+        now = time.time()
+        tricks = self.tricks()
+        cpu, memory = process_usage(server_processes(self.pid)) if self.available else (0.0, 0)
+        elapsed = now - self.last[0]
+        self.samples.append((now - self.start, (tricks - self.last[2]) / elapsed,
+                             100.0 * (cpu - self.last[1]) / elapsed if self.available else None,
+                             memory / 1048576.0 if self.available else None))
+        self.last = (now, cpu, tricks)
+        self.scheduler.call_later(self.interval, self.sample)
+
+
+def start_server(port, shards, max_batch=0):
+    """ Start the server in a process of its own; return the process once it listens
+        max_batch -> int; passed on to the server, to make the AI bids in batches """
+    here = os.path.dirname(os.path.abspath(__file__))
+    if shards:
+        command = [sys.executable, os.path.join(here, "shards.py"), "--shards", str(shards)]
+    else:
+        command = [sys.executable, os.path.join(here, "server.py")]
+    command += ["--host", "127.0.0.1", "--port", str(port), "--max-batch", str(max_batch)]
+    process = subprocess.Popen(command)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return process
+        except socket.error:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("The server didn't start")
+
+def raise_file_limit():
+    """ Allow as many open sockets as the system lets us, for thousands of bots """
+    try:
+        import resource
+    except ImportError:     # Windows has no resource module
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, resource.error):
+        pass
+
+def report(options, bots, sampler, elapsed):
+    """ Return the text of the report """
+    waits = [wait for bot in bots for wait in bot.waits]
+    tricks = sampler.tricks()
+    lines = ["Belote load test, %s" % time.strftime("%Y-%m-%d %H:%M:%S"),
+             "%d bots, %d per table, %d deals each, think %d +- %d ms, %s, %s" % (
+                 len(bots), options.humans, options.deals, options.think, options.jitter,
+                 "%d shards" % options.shards if options.shards else "single process server",
+                 "AI bids in batches of up to %d" % options.max_batch if options.max_batch
+                 else "AI bids one at a time"),
+             "",
+             "%d deals, %d moves, %d tricks in %.1f s; %d errors, %d bots disconnected early" % (
+                 sum(bot.played for bot in bots) / options.humans, sum(bot.moves for bot in bots),
+                 tricks, elapsed, sum(bot.errors for bot in bots),
+                 len([bot for bot in bots if bot.played < bot.deals])),
+             "throughput: %.1f tricks/s" % (tricks / elapsed),
+             "move latency: median %.1f ms, 90%% %.1f ms, 99%% %.1f ms, max %.1f ms" % (
+                 1000 * percentile(waits, 0.5), 1000 * percentile(waits, 0.9),
+                 1000 * percentile(waits, 0.99), 1000 * max(waits or [0])),
+             "",
+             "    time   tricks/s   server CPU %   server MB"]
+    for seconds, rate, cpu, memory in sampler.samples:
+        if cpu is None:
+            lines.append("%8.1f %10.1f            n/a         n/a" % (seconds, rate))
+        else:
+            lines.append("%8.1f %10.1f %14.1f %11.1f" % (seconds, rate, cpu, memory))
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the Belote server with AI bots")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--humans", type=int, default=1, help="bots per table")
+    parser.add_argument("--deals", type=int, default=3, help="deals each bot plays")
+    parser.add_argument("--think", type=int, default=0, help="ms of think time before each move")
+    parser.add_argument("--jitter", type=int, default=0, help="ms the think time varies by")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds to spread the connections over")
+    parser.add_argument("--shards", type=int, default=0, help="run shards.py with this many shards")
+    parser.add_argument("--max-batch", type=int, default=0, help="make the server's AI bids in batches")
+    parser.add_argument("--sample", type=int, default=SAMPLE, help="ms between samples of the server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--report", default=REPORT_FILE)
+    options = parser.parse_args()
+    raise_file_limit()
+    engine.load_game()
+    process = start_server(options.port, options.shards, options.max_batch)
+    try:
+        scheduler = timeline.Scheduler()
+        bots = []
+        def connect():
+            bots.append(StrategyBot("127.0.0.1", options.port, options.deals, options.humans,
+                                    options.think, options.jitter, scheduler))
+        for number in xrange(options.clients):
+            scheduler.call_later(1000.0 * options.ramp * number / options.clients, connect)
+        sampler = Sampler(process.pid, bots, options.humans, scheduler, options.sample)
+        start = last = time.time()
+        while len(bots) < options.clients or asyncore.socket_map:
+            due = scheduler.next_due()
+            asyncore.loop(1.0 if due is None else due / 1000.0, use_poll=True, count=1)
+            now = time.time()
+            scheduler.advance((now - last) * 1000)
+            last = now
+        sampler.sample()
+        text = report(options, bots, sampler, time.time() - start)
+    finally:
+        process.terminate()
+    print text,
+    with open(options.report, "w") as report_file:
+        report_file.write(text)
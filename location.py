@@ -88,7 +88,8 @@ class English(Message):
                          8: "Re-Contra",
                          9: "Declare",
                          10: u"Carré",
-                         11: "Done"
+                         11: "Done",
+                         12: "Hint"
                 }
         self._interface = {"Score": "Score",    # other interface messages
                            "Anons": "Declarations",
@@ -103,7 +104,9 @@ class English(Message):
                            "End": "ROUND ENDS.",
                            "care": u"carré",
                            "belot": "belote",
-                           'first': 'first'                           
+                           'first': 'first',
+                           'Replay': "Replay, trick ",
+                           'ReplayKeys': "Left/Right: card by card, Up/Down: trick by trick, R: back to the game"
                 }
         self._end_messages = {'hang': "'s points hang!",     # messages for the end of a round
                               'evenone': "Result is even! ",
@@ -182,7 +185,8 @@ class Bulgarian(Message):
                          8: u"Ре-контра",
                          9: u"Анонси",
                          10: u"Каре",
-                         11: "OK"
+                         11: "OK",
+                         12: u"Съвет"
                          }
         self._interface = {"Score": u"Резултат",
                            "Anons": u"Анонси",
@@ -197,7 +201,9 @@ class Bulgarian(Message):
                            "End": u"КРАЙ НА РАЗДАВАНЕТО.",
                            "care": u"каре",
                            "belot": u"белот",
-                           'first': u'първи'                           
+                           'first': u'първи',
+                           'Replay': u"Повторение, ръка ",
+                           'ReplayKeys': u"Наляво/Надясно: карта по карта, Нагоре/Надолу: ръка по ръка, R: обратно към играта"
                 }
         self._bid_messages = {"comppass": u" пасува",
                               "compraise": u" вдига:",
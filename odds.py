@@ -0,0 +1,205 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Exact odds of the cards still to come during the bidding, from precomputed tables.
+
+A player bids on 5 cards and gets 3 more of the 27 unseen after the bidding (prepare()).
+For each of the C(32, 5) hands the tables hold how many of the C(27, 3) completions give
+the hand (kept once for the hands alike but for their suits, see canonical.py)
+- a sequence of at least 3, 4 and 5 cards of a suit (in the order of rules.RANKS);
+- a belote (Q and K of a suit);
+- a carre (4 cards of a rank other than 7 and 8),
+so the odds are exact. A sequence or belote lies within a suit, so they are counted
+from tables of the 256 holdings of a suit and the ways to add 0-3 cards to it; carres
+by inclusion-exclusion over the ranks. The tables also hold how the unseen cards of a
+suit split among the other three players, while bidding (27 cards unseen, 3 of them
+yours to come) and after it (24 unseen).
+
+The counts are computed with NumPy in a few seconds and saved to a small file, loaded
+once; it's built on first use, or with:
+    python odds.py [--check N]
+"""
+
+import os, time, random, argparse, itertools
+from math import factorial
+import rules, canonical
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ODDS_FILE = "odds.npz"
+HAND = 5            # cards a player bids with
+COMING = 3          # cards dealt after the bidding
+UNSEEN = 32 - HAND
+COMPLETIONS = factorial(UNSEEN) // (factorial(COMING) * factorial(UNSEEN - COMING))
+CARRE_RANKS = [rules.RANKS.index(rank) for rank in rules.CARE_VALUE]
+SEQUENCES = (3, 4, 5)   # sequence lengths counted
+BIDDING, PLAYING = 0, 1     # stages of the split tables
+
+TABLES = None       # -> dict of the tables, once loaded
+
+
+def choose(n, k):
+    return factorial(n) // (factorial(k) * factorial(n - k)) if 0 <= k <= n else 0
+
+def longest_run(holding):
+    """ Return the length of the longest sequence in a suit holding (bit rank index set) """
+    longest = run = 0
+    for rank in xrange(8):
+        run = run + 1 if holding >> rank & 1 else 0
+        longest = max(longest, run)
+    return longest
+
+def hand_holdings(hands):
+    """ Return the suit holdings of hands, as numpy array (N, 4) in rules.SUITS order
+        hands -> numpy array (N, cards) of card ordinals """
+    hands = numpy.asarray(hands)
+    suits = numpy.zeros((len(hands), 4), numpy.int64)
+    for card in hands.T:
+        suits[numpy.arange(len(hands)), card // 8] += 1 << (card % 8)
+    return suits
+
+def hand_classes():
+    """ Return the canonical holdings (canonical.holding_keys()) of all 5-card hands, each once, sorted """
+    return numpy.unique(canonical.holding_keys(hand_holdings(list(itertools.combinations(xrange(32), HAND)))))
+
+def without_suit_counts(holdings, feature):
+    """ Return the completions of many hands with no suit having the feature
+        holdings -> numpy array (N, 4) of the hands' suit holdings
+        feature -> function of a suit holding, True if it has the feature """
+    # -> ways (holding, cards added) to add cards to a suit and still lack the feature
+    lacking = numpy.zeros((256, COMING + 1), numpy.int64)
+    for holding in xrange(256):
+        unseen = [rank for rank in xrange(8) if not holding >> rank & 1]
+        for count in xrange(COMING + 1):
+            for added in itertools.combinations(unseen, count):
+                if not feature(holding | sum(1 << rank for rank in added)):
+                    lacking[holding, count] += 1
+    total = numpy.zeros(len(holdings), numpy.int64)
+    for counts in itertools.product(xrange(COMING + 1), repeat=4):
+        if sum(counts) == COMING:
+            ways = numpy.ones(len(holdings), numpy.int64)
+            for suit, count in enumerate(counts):
+                ways *= lacking[holdings[:, suit], count]
+            total += ways
+    return total
+
+def carre_counts(holdings):
+    """ Return the completions of many hands giving them a carre, by inclusion-exclusion
+        over the sets of carre ranks: the completions holding all the missing cards of a
+        set of ranks are C(unseen - missing, coming - missing)
+        holdings -> numpy array (N, 4) of the hands' suit holdings """
+    held = (holdings[:, :, None] >> numpy.array(CARRE_RANKS)) & 1
+    missing = 4 - held.sum(axis=1)      # -> (hand, carre rank)
+    ways = numpy.array([choose(UNSEEN - count, COMING - count) for count in xrange(4 * len(CARRE_RANKS) + 1)])
+    total = numpy.zeros(len(holdings), numpy.int64)
+    for size in xrange(1, len(CARRE_RANKS) + 1):
+        for ranks in itertools.combinations(xrange(len(CARRE_RANKS)), size):
+            total += (-1) ** (size + 1) * ways[missing[:, ranks].sum(axis=1)]
+    return total
+
+def split_table(unseen_total, others, coming):
+    """ Return the chances of the splits of a suit among the other three players, as numpy
+        array (unseen of the suit 0-8, left, partner, right) of the cards they end up with
+        unseen_total -> cards unseen by the player; others -> cards each other player ends up with
+        coming -> cards the player is still to get """
+    table = numpy.zeros((9, 9, 9, 9))
+    deals = factorial(unseen_total) // (factorial(others) ** 3 * factorial(coming))
+    for unseen in xrange(9):
+        for left, partner, right in itertools.product(xrange(unseen + 1), repeat=3):
+            mine = unseen - left - partner - right
+            if mine < 0 or mine > coming or max(left, partner, right) > others:
+                continue
+            suit = factorial(unseen) // (factorial(left) * factorial(partner) * factorial(right) * factorial(mine))
+            rest = factorial(unseen_total - unseen) // (
+                factorial(others - left) * factorial(others - partner) * factorial(others - right) *
+                factorial(coming - mine))
+            table[unseen, left, partner, right] = float(suit * rest) / deals
+    return table
+
+def build(filename=ODDS_FILE):
+    """ Compute the tables and save them to filename """
+    keys = hand_classes()
+    suits = (keys[:, None] >> numpy.arange(24, -1, -8)) & 255
+    counts = [COMPLETIONS - without_suit_counts(suits, lambda holding, length=length: longest_run(holding) >= length)
+              for length in SEQUENCES]
+    queen_king = (1 << rules.RANKS.index('Q')) | (1 << rules.RANKS.index('K'))
+    counts.append(COMPLETIONS - without_suit_counts(suits, lambda holding: holding & queen_king == queen_king))
+    counts.append(carre_counts(suits))
+    splits = numpy.array([split_table(UNSEEN, 8, COMING), split_table(UNSEEN - COMING, 8, 0)])
+    with open(filename, "wb") as stream:
+        numpy.savez(stream, keys=keys.astype(numpy.uint32), counts=numpy.array(counts, numpy.uint16).T,
+                    splits=splits)
+
+def tables(filename=ODDS_FILE):
+    """ Return the tables (a dict of numpy arrays), loading them once, building them first
+        if the file is missing (or from before the tables were canonical):
+        'keys' -> canonical.holding_keys() of the hands, sorted
+        'counts' -> (hand, feature) completions giving a sequence of 3, 4 and 5+ cards,
+                    a belote and a carre
+        'splits' -> (stage, unseen cards of the suit, left, partner, right) chances """
+    global TABLES
+    if TABLES is None:
+        if not os.path.exists(filename):
+            build(filename)
+        with numpy.load(filename) as data:
+            TABLES = dict((name, data[name]) for name in data.files)
+        if 'keys' not in TABLES:
+            build(filename)
+            TABLES = None
+            return tables(filename)
+    return TABLES
+
+def lookup(hands):
+    """ Return the rows of the tables of 5-card hands
+        hands -> numpy array (N, 5) of card ordinals """
+    return numpy.searchsorted(tables()['keys'], canonical.holding_keys(hand_holdings(hands)))
+
+def announce_odds(hands):
+    """ Return the chances (0-1) that 5-card hands get a sequence of at least 3, 4 and 5
+        cards, a belote and a carre with the 3 cards to come, as numpy array (N, 5)
+        hands -> numpy array (N, 5) of card ordinals, or a list of 5 card ordinals """
+    hands = numpy.asarray(hands)
+    counts = tables()['counts'][lookup(hands.reshape(-1, HAND))]
+    return (counts / float(COMPLETIONS)).reshape(hands.shape[:-1] + (counts.shape[1],))
+
+def split_odds(unseen, stage=BIDDING):
+    """ Return the chances of the splits of a suit of which the given number of cards are
+        unseen, as numpy array (left, partner, right) of the cards the others end up with;
+        while BIDDING, the rest of the cards come to the player """
+    return tables()['splits'][stage, unseen]
+
+def check_hand(hand):
+    """ Count the completions of a hand with each feature by going over them all """
+    unseen = [card for card in xrange(32) if card not in hand]
+    counts = [0] * (len(SEQUENCES) + 2)
+    for coming in itertools.combinations(unseen, COMING):
+        cards = list(hand) + list(coming)
+        holdings = [sum(1 << (card % 8) for card in cards if card // 8 == suit) for suit in xrange(4)]
+        runs = max(longest_run(holding) for holding in holdings)
+        for number, length in enumerate(SEQUENCES):
+            counts[number] += runs >= length
+        counts[-2] += any(rules.card_ordinal(suit, 'Q') in cards and rules.card_ordinal(suit, 'K') in cards
+                          for suit in rules.SUITS)
+        counts[-1] += any(len([card for card in cards if card % 8 == rank]) == 4 for rank in CARRE_RANKS)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the odds tables and check them by enumeration")
+    parser.add_argument("--check", type=int, default=200, help="hands to check completion by completion")
+    options = parser.parse_args()
+    start = time.time()
+    build()
+    counts = tables()['counts']
+    print "built %s in %.1f s (%d bytes, %d hands of %d told apart)" % (
+        ODDS_FILE, time.time() - start, os.path.getsize(ODDS_FILE), len(counts), choose(32, HAND))
+    shuffle = random.Random(0)
+    hands = [shuffle.sample(xrange(32), HAND) for number in xrange(options.check)]
+    wrong = sum(1 for hand, row in zip(hands, lookup(hands)) if list(counts[row]) != check_hand(hand))
+    print "checked %d hands against every completion: %d wrong" % (len(hands), wrong)
+    splits = tables()['splits']
+    print "split chances sum to 1:", numpy.allclose(splits.sum(axis=(2, 3, 4)), 1)
+    print "mean chances over all hands: sequence 3+ %.4f, 4+ %.4f, 5+ %.4f, belote %.4f, carre %.4f" % tuple(
+        announce_odds(list(itertools.combinations(xrange(32), HAND))).mean(axis=0))
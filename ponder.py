@@ -0,0 +1,170 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Thinking ahead of the AI's moves, while the person thinks and the cards fly.
+
+During a trick the AI seats sit idle while the person chooses a card and while the
+animations run, and then work out their moves on the spot. A Ponderer works them out
+ahead on a background thread instead. At the start of a trick the game hands it a
+savegame.Snapshot of the match and the cards played so far; the Ponderer plays the rest of
+the trick out on its own copy of the game (see engine.import_game), for every card the
+person may play, and keeps the move of each AI seat by the cards played before it. When
+the AI's turn comes, the game looks the move up and plays it at once (playMove() makes the
+same changes chooseMove() would have); only on a miss does it decide on the spot, and then
+the Ponderer starts over from there.
+
+The AI always makes the same move in the same state, so a move found ahead is the move it
+would have made; the state the Ponderer starts from is only out of date if the person
+declares an announce, and the game then hands it a new one.
+"""
+
+import threading
+import engine, savegame
+from rules import card_ordinal, ordinal_card
+
+
+def restore(belot, blob):
+    """ Set a copy of the game module to a packed savegame.Snapshot, on objects of its own;
+        return its players """
+    players = [belot.Hand("Player %d" % (seat + 1), "Team %d" % (seat % 2 + 1)) for seat in xrange(4)]
+    for seat, player in enumerate(players):
+        setattr(belot, "player%d" % (seat + 1), player)
+    belot.game = belot.GameState()
+    belot.deck = belot.Deck()
+    belot.strategy1 = belot.Strategy("Team 1")
+    belot.strategy2 = belot.Strategy("Team 2")
+    belot.restoreSnapshot(savegame.unpack(blob))
+    belot.playhand = {}
+    belot.required = None
+    return players
+
+
+class Move():
+    def __init__(self, card, belote, belotes, suit_power, partner_suits, interesting_suits):
+        """ A move of an AI seat, with the changes chooseMove() made along with it
+            card -> card ordinal
+            belote -> True if the card was played declaring a belote
+            belotes -> suits of the player's belotes left after the move
+            suit_power -> the player's suit_power after the move
+            partner_suits, interesting_suits -> the team Strategy's lists after the move """
+        self.card = card
+        self.belote = belote
+        self.belotes = belotes
+        self.suit_power = suit_power
+        self.partner_suits = partner_suits
+        self.interesting_suits = interesting_suits
+
+
+class Ponderer(threading.Thread):
+    def __init__(self, humans=(0,)):
+        """ Works out the AI's moves of a trick ahead, on a copy of the game of its own
+            humans -> seats (0-3) played by people """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.humans = humans
+        self.lock = threading.Lock()
+        self.ready = threading.Event()    # set when there's a new trick to think about
+        self.job = None         # -> (generation, packed snapshot, trick) not started yet
+        self.generation = 0     # -> number of the latest job; older jobs stop
+        self.moves = {}         # -> dict {(seat, card ordinal)s played so far: Move of the next seat}
+        self.hits = 0           # moves found ahead
+        self.misses = 0         # moves decided on the spot
+        self.belot = None       # -> the copy of the game module, loaded on the thread
+
+    def think(self, snapshot, trick):
+        """ Start working out the rest of the trick, forgetting what was found before
+            snapshot -> savegame.Snapshot of the match now
+            trick -> list of (seat, card ordinal) played so far in the trick, in order """
+        with self.lock:
+            self.generation += 1
+            self.job = (self.generation, snapshot.pack(), tuple(trick))
+            self.moves = {}
+        self.ready.set()
+
+    def lookup(self, trick):
+        """ Return the Move of the next seat after the cards played so far, or None
+            if it hasn't been worked out (yet) """
+        with self.lock:
+            move = self.moves.get(tuple(trick))
+        if move:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return move
+
+    def hit_rate(self):
+        """ Return the part of the AI's moves which were found ahead, 0 to 1 """
+        return float(self.hits) / max(self.hits + self.misses, 1)
+
+    def run(self):
+        self.belot = engine.import_game("pondering")
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            with self.lock:
+                job, self.job = self.job, None
+            if job:
+                self.explore(*job)
+
+    def current(self, generation):
+        with self.lock:
+            return generation == self.generation
+
+    def explore(self, generation, blob, trick):
+        """ Play out the trick from the snapshot, over every card a person may play """
+        belot = self.belot
+        branches = [trick]      # -> tricks played so far to go on from
+        while branches:
+            prefix = branches.pop(0)
+            if len(prefix) == 4 or not self.current(generation):
+                continue
+            if not self.replay(blob, trick, prefix):
+                return
+            player = belot.turnOrder[len(prefix)]
+            seat = belot.getSeat(player)
+            if seat in self.humans:
+                for card in belot.legalCards(player, belot.playhand, belot.required):
+                    branches.append(prefix + ((seat, card_ordinal(card.suit, card.rank)),))
+                continue
+            move = self.decide(player)
+            with self.lock:
+                if generation != self.generation:
+                    return
+                self.moves[prefix] = move
+            branches.append(prefix + ((seat, move.card),))
+
+    def replay(self, blob, trick, prefix):
+        """ Set the copy of the game to the snapshot, then play the cards of prefix after trick;
+            return False if the moves to play were forgotten meanwhile (a newer job came) """
+        belot = self.belot
+        players = restore(belot, blob)
+        for number, (seat, ordinal) in enumerate(prefix):
+            player = players[seat]
+            card = belot.Card(*ordinal_card(ordinal))
+            if number >= len(trick):    # not played in the game yet
+                if seat in self.humans:
+                    belot.playCard(player, card, belot.required or card.get_suit())
+                else:
+                    if belot.rund == 1:
+                        belot.announce(player)
+                    with self.lock:
+                        move = self.moves.get(prefix[:number])
+                    if move is None:
+                        return False
+                    belot.playMove(player, move)
+            belot.playhand[player] = card
+            if belot.required is None:
+                belot.required = card.get_suit()
+        return True
+
+    def decide(self, player):
+        """ Return the Move the AI makes for the player now, as makeMove() would """
+        belot = self.belot
+        team = belot.strategy1 if player.team == "Team 1" else belot.strategy2
+        if belot.rund == 1:
+            belot.announce(player)
+        declared = len(belot.game.announces)
+        pos, card = belot.chooseMove(player, belot.playhand, belot.required)
+        return Move(card_ordinal(card.suit, card.rank), len(belot.game.announces) > declared,
+                    [anons.suit for anons in player.belotes], dict(player.suit_power),
+                    list(team.partner_suits), list(team.interesting_suits))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Compact binary records of played deals.
+
+A record file is a stream of events, appended by the game as they happen. Each event is
+a tag byte and a length byte, followed by the payload:
+    DEAL      first seat
+    CARDS     seat, then one byte per card dealt (its ordinal)
+    BID       seat << 4 | bid code (index in BID_ORDER; 7 is contra, 8 re-contra)
+    ANNOUNCE  seat, kind (sequence length, or BELOTE/CARE), suit, rank index (0xFF if none)
+    PLAY      seat << 5 | card ordinal
+    END       team 1 score, team 2 score (unsigned shorts)
+Seats are 0-3 for Player 1-4. A card's ordinal is suit index * 8 + rank index in the
+SUITS and RANKS orders of rules.py. Unknown tags are skipped thanks to the length byte,
+so the format can grow.
+
+The Writer keeps the events of the deal in play in memory and appends the whole deal at
+its END, so the file only ever holds complete deals. The events kept so far travel with
+a saved game (see savegame.py), and a resumed match goes on with the same deal.
+
+read_deals() goes through a file lazily, one deal at a time, so it can go over millions
+of recorded deals without loading the file into memory.
+"""
+
+import struct
+from rules import SUITS, RANKS, card_ordinal, ordinal_card
+
+BIDS = ('pass', 'C', 'D', 'H', 'S', 'No trumps', 'All trumps', 'contra', 're-contra')
+# event tags
+DEAL = 1
+CARDS = 2
+BID = 3
+ANNOUNCE = 4
+PLAY = 5
+END = 6
+# announce kinds, besides the sequence lengths 3-8
+BELOTE = 1
+CARE = 2
+NO_RANK = 0xFF
+
+SCORES = struct.Struct("<HH")
+
+
+class Writer():
+    def __init__(self, filename):
+        """ Appends the events of played deals to the record file filename """
+        self.stream = open(filename, "ab")
+        self.pending = b""      # -> events of the deal in play, written out at its end
+
+    def write(self, tag, payload):
+        self.pending += struct.pack("<BB", tag, len(payload)) + payload
+
+    def deal(self, first):
+        """ A new deal starts, first -> seat of the player who plays first """
+        self.pending = b""
+        self.write(DEAL, struct.pack("<B", first))
+
+    def resume(self, pending):
+        """ Go on with a deal whose events so far were saved from pending """
+        self.pending = pending
+
+    def cards(self, seat, cards):
+        """ Cards were dealt to the given seat; cards -> list of (suit, rank) """
+        self.write(CARDS, struct.pack("<B", seat) +
+                   b"".join(struct.pack("<B", card_ordinal(suit, rank)) for suit, rank in cards))
+
+    def bid(self, seat, bid):
+        """ bid -> String from BID_ORDER, or 'contra' / 're-contra' """
+        self.write(BID, struct.pack("<B", seat << 4 | BIDS.index(bid)))
+
+    def announce(self, seat, vid, suit, last_card=None, rank=None):
+        """ An announce was declared; the arguments mirror the Anons attributes """
+        self.write(ANNOUNCE, struct.pack("<BBBB", seat, *announce_code(vid, suit, last_card, rank)))
+
+    def play(self, seat, suit, rank):
+        self.write(PLAY, struct.pack("<B", seat << 5 | card_ordinal(suit, rank)))
+
+    def end(self, score1, score2):
+        """ The deal was scored; write the whole deal with the teams' total scores to disk """
+        self.write(END, SCORES.pack(score1, score2))
+        self.stream.write(self.pending)
+        self.stream.flush()
+        self.pending = b""
+
+    def close(self):
+        """ Close the file; an unfinished deal is left out of it """
+        self.stream.close()
+
+
+class Deal():
+    def __init__(self, first):
+        """ Holds the events of a single recorded deal """
+        self.first = first      # -> int; seat of the player who played first
+        self.cards = []         # -> list of [seat, list of card ordinals], in dealing order
+        self.bids = []          # -> list of [seat, bid string]
+        self.announces = []     # -> list of [seat, vid, suit, last card or None, care rank or None,
+                                #             number of cards played before it was declared]
+        self.plays = []         # -> list of [seat, card ordinal], in playing order
+        self.scores = None      # -> (team 1 score, team 2 score) after the deal
+
+    def add(self, tag, payload):
+        """ Decode an event and add it to the deal """
+        if tag == CARDS:
+            self.cards.append([ord(payload[0:1]), [ord(payload[i:i + 1]) for i in xrange(1, len(payload))]])
+        elif tag == BID:
+            code = ord(payload)
+            self.bids.append([code >> 4, BIDS[code & 0x0F]])
+        elif tag == ANNOUNCE:
+            seat, kind, suit, rank_index = struct.unpack("<BBBB", payload)
+            self.announces.append([seat] + announce_fields(kind, suit, rank_index) + [len(self.plays)])
+        elif tag == PLAY:
+            code = ord(payload)
+            self.plays.append([code >> 5, code & 0x1F])
+        elif tag == END:
+            self.scores = SCORES.unpack(payload)
+
+    def contract(self):
+        """ Return the [seat, contract] won in the bidding, or None for an all-pass deal """
+        result = None
+        for seat, bid in self.bids:
+            if 0 < BIDS.index(bid) < 7:
+                result = [seat, bid]
+        return result
+
+    def doubling(self):
+        """ Return 1 for a normal contract, 2 for contra and 4 for re-contra """
+        factor = 1
+        for seat, bid in self.bids:
+            if bid == 'contra':
+                factor = 2
+            elif bid == 're-contra':
+                factor = 4
+            elif bid != 'pass':
+                factor = 1     # a raise cancels contra and re-contra
+        return factor
+
+
+def announce_code(vid, suit, last_card=None, rank=None):
+    """ Return the (kind, suit index, rank index) bytes an announce is stored as """
+    if vid == 'belote':
+        kind = BELOTE
+    elif vid == 'care':
+        kind = CARE
+    else:
+        kind = vid
+    if last_card:
+        rank_index = RANKS.index(last_card)
+    elif rank:
+        rank_index = RANKS.index(rank)
+    else:
+        rank_index = NO_RANK
+    return kind, SUITS.index(suit), rank_index
+
+def announce_fields(kind, suit, rank_index):
+    """ Return the [vid, suit, last card, care rank] of an announce stored by announce_code() """
+    rank = None if rank_index == NO_RANK else RANKS[rank_index]
+    if kind == BELOTE:
+        return ['belote', SUITS[suit], None, None]
+    elif kind == CARE:
+        return ['care', SUITS[suit], None, rank]
+    return [kind, SUITS[suit], rank, None]
+
+def scan_events(stream, chunk=1 << 16):
+    """ Yield the (file position, tag, payload) of the events in an open record file,
+        from its current position on, reading it in chunks.
+        A truncated event at the end of the file is ignored. """
+    base = stream.tell()    # file position of data[0]
+    data = b""
+    pos = 0
+    while True:
+        block = stream.read(chunk)
+        if not block:
+            return
+        base += pos
+        data = data[pos:] + block
+        pos = 0
+        while pos + 2 <= len(data):
+            tag, length = struct.unpack_from("<BB", data, pos)
+            if pos + 2 + length > len(data):
+                break    # the rest of the event is in the next chunk
+            yield base + pos, tag, data[pos + 2:pos + 2 + length]
+            pos += 2 + length
+
+def read_events(filename, offset=0):
+    """ Yield the (tag, payload) events of a record file, starting at file position offset """
+    with open(filename, "rb") as stream:
+        stream.seek(offset)
+        for position, tag, payload in scan_events(stream):
+            yield tag, payload
+
+def read_deals(filename, offset=0):
+    """ Lazily yield the complete deals recorded in a file, one Deal at a time,
+        starting at file position offset """
+    deal = None
+    for tag, payload in read_events(filename, offset):
+        if tag == DEAL:
+            deal = Deal(ord(payload[0:1]))    # an unfinished deal before this one is dropped
+        elif deal is not None:
+            deal.add(tag, payload)
+            if tag == END:
+                yield deal
+                deal = None
@@ -0,0 +1,160 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Replays of recorded deals (see record.py), with seeking to any trick of any deal.
+
+Replay indexes a record file by the file position of every complete deal; the index is
+kept next to the record file (with an .idx extension) and only extended with the deals
+appended since, so jumping to a deal never reads the deals before it.
+
+DealReplay keeps a full snapshot of the deal (the four hands, the cards each team won,
+the leader and the points so far) every few tricks. Seeking to a trick starts from the
+nearest snapshot before it and applies the played cards from there, so a seek costs
+the same at the first trick as at the last.
+"""
+
+import os, struct
+import record, rules
+
+INDEX_HEADER = struct.Struct("<4sQ")    # magic, file position indexed up to
+INDEX_MAGIC = b"BLTQ"   # the offsets follow as little-endian 8-byte numbers
+OFFSET = struct.Struct("<Q")
+
+
+def team_of(seat):
+    """ Return the team index (0 for Team 1, 1 for Team 2) of a seat """
+    return seat % 2
+
+def mask_cards(mask):
+    """ Return the list of card ordinals in a bitmask, lowest first """
+    return [ordinal for ordinal in xrange(32) if mask >> ordinal & 1]
+
+
+class Position():
+    def __init__(self, deal, contract, trick, hands, won, leader, points, table):
+        """ The state of a deal after some cards were played """
+        self.trick = trick          # -> int; number of completed tricks (0-8)
+        self.hands = hands          # -> list of 4 lists of card ordinals, one per seat
+        self.won = won              # -> list of 2 lists of card ordinals won by each team
+        self.leader = leader        # -> int; seat which leads (or led) the current trick
+        self.points = points        # -> list of 2 ints; card points each team won so far
+        self.table = table          # -> list of [seat, ordinal]; cards of the current trick
+        self.contract = contract    # -> [seat, contract string] or None
+        self.doubling = deal.doubling()
+        self.scores = deal.scores   # -> the teams' total scores after the deal
+        played = trick * 4 + len(table)
+        self.announces = [anons for anons in deal.announces if anons[5] < played]
+
+
+class DealReplay():
+    def __init__(self, deal, every=1):
+        """ Prepares a recorded deal for seeking.
+            deal -> record.Deal
+            every -> int; take a full snapshot every this many tricks """
+        self.deal = deal
+        self.every = every
+        self.contract = deal.contract()
+        self.tricks = len(deal.plays) // 4
+        hands = [0, 0, 0, 0]
+        for seat, cards in deal.cards:
+            for ordinal in cards:
+                hands[seat] |= 1 << ordinal
+        won = [0, 0]
+        points = [0, 0]
+        leader = deal.first
+        self.snapshots = []     # -> list of (hands, won, leader, points) tuples
+        for trick in xrange(self.tricks + 1):
+            if trick % every == 0:
+                self.snapshots.append((tuple(hands), tuple(won), leader, tuple(points)))
+            if trick < self.tricks:
+                leader = self.play_trick(trick, hands, won, points)
+
+    def play_trick(self, trick, hands, won, points):
+        """ Apply the four cards of the given trick to the hands, won cards and points;
+            return the seat which takes the trick (and leads the next one) """
+        cards = self.deal.plays[trick * 4:trick * 4 + 4]
+        contract = self.contract[1]
+        winner = rules.trick_winner(contract, cards)
+        for seat, ordinal in cards:
+            hands[seat] &= ~(1 << ordinal)
+            won[team_of(winner)] |= 1 << ordinal
+            points[team_of(winner)] += rules.card_value(contract, ordinal)
+        return winner
+
+    def seek(self, trick, cards=0):
+        """ Return the Position after the given number of completed tricks,
+            and the given number of cards (0-3) of the next trick """
+        trick = max(0, min(trick, self.tricks))
+        if trick == self.tricks:
+            cards = 0
+        hands, won, leader, points = self.snapshots[trick // self.every]
+        hands, won, points = list(hands), list(won), list(points)
+        for done in xrange(trick // self.every * self.every, trick):
+            leader = self.play_trick(done, hands, won, points)
+        table = self.deal.plays[trick * 4:trick * 4 + cards]
+        for seat, ordinal in table:
+            hands[seat] &= ~(1 << ordinal)
+        return Position(self.deal, self.contract, trick, [mask_cards(hand) for hand in hands],
+                        [mask_cards(cards) for cards in won], leader, points, table)
+
+
+class Replay():
+    def __init__(self, filename, every=1):
+        """ Gives access to the deals recorded in filename by their number """
+        self.filename = filename
+        self.index_file = filename + ".idx"
+        self.every = every
+        self.offsets = []           # -> file positions of the complete deals
+        self.scanned = 0            # -> file position up to which the file was indexed
+        self.cached = None          # -> (number, DealReplay) of the last deal asked for
+        self.load_index()
+        self.refresh()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def load_index(self):
+        try:
+            with open(self.index_file, "rb") as index:
+                magic, scanned = INDEX_HEADER.unpack(index.read(INDEX_HEADER.size))
+                data = index.read()
+                offsets = list(struct.unpack("<%dQ" % (len(data) // OFFSET.size), data))
+            size = os.path.getsize(self.filename)
+        except (EnvironmentError, struct.error, ValueError):
+            return      # no index, or no record to go with it
+        if magic == INDEX_MAGIC and scanned <= size and len(data) % OFFSET.size == 0:
+            self.offsets, self.scanned = offsets, scanned
+
+    def refresh(self):
+        """ Index the deals appended to the record file since the last time """
+        if not os.path.exists(self.filename):
+            return
+        start = None
+        with open(self.filename, "rb") as stream:
+            stream.seek(self.scanned)
+            for position, tag, payload in record.scan_events(stream):
+                if tag == record.DEAL:
+                    start = position
+                elif tag == record.END and start is not None:
+                    self.offsets.append(start)
+                    self.scanned = position + 2 + len(payload)
+                    start = None
+        try:
+            with open(self.index_file, "wb") as index:
+                index.write(INDEX_HEADER.pack(INDEX_MAGIC, self.scanned))
+                index.write(struct.pack("<%dQ" % len(self.offsets), *self.offsets))
+        except IOError:
+            pass    # can't keep the index, the next Replay indexes the file again
+
+    def deal(self, number):
+        """ Return the DealReplay of the deal with the given number (negative counts from the end) """
+        if number < 0:
+            number += len(self.offsets)
+        if self.cached is None or self.cached[0] != number:
+            deal = next(record.read_deals(self.filename, self.offsets[number]))
+            self.cached = (number, DealReplay(deal, self.every))
+        return self.cached[1]
+
+    def seek(self, number, trick, cards=0):
+        """ Return the Position in the given deal after the given tricks and cards """
+        return self.deal(number).seek(trick, cards)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+The rules of Belote as plain functions on card ordinals, without pygame or the game's
+global state, for tools that work on recorded or simulated deals.
+
+A card is an ordinal 0-31: suit index * 8 + rank index, in the SUITS and RANKS orders
+below. A contract is a string from BID_ORDER. The tables mirror the ones in the game.
+trick_winners() settles many tricks at once, if NumPy is installed; so do deals_points()
+and score_deals() score many deals.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SUITS = ('C', 'S', 'H', 'D')
+RANKS = ('7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+BID_ORDER = ('pass', 'C', 'D', 'H', 'S', 'No trumps', 'All trumps')
+ALL_TRUMP_POWER = {'7': 1, '8': 2, 'Q': 3, 'K': 4,
+                   '10': 5, 'A': 6, '9': 7, 'J': 8}
+NO_TRUMP_POWER = {'7': 1, '8': 2, 'Q': 5, 'K': 6,
+                  '10': 7, 'A': 8, '9': 3, 'J': 4}
+CARD_VALUE_NO_TRUMP = {'7': 0, '8': 0, '9': 0, 'J': 2,
+                       'Q': 3, 'K': 4, '10': 10, 'A': 11}
+CARD_VALUE_ALL_TRUMP = {'7': 0, '8': 0, 'Q': 3, 'K': 4,
+                        '10': 10, 'A': 11, '9': 14, 'J': 20}
+CARE_ORDER = ('Q', 'K', '10', 'A', '9', 'J')
+ANNOUNCE_VALUE = {3: 20, 4: 50, 5: 100, 6: 100, 7: 100, 8: 100, 'belote': 20}
+CARE_VALUE = {'Q': 100, 'K': 100, '10': 100, 'A': 100, '9': 150, 'J': 200}
+CAPOT_BONUS = {'C': 26, 'D': 26, 'H': 26, 'S': 26, 'No trumps': 35, 'All trumps': 35}
+CONTRA_FACTOR = (1, 2, 4)   # by doubling: none, contra, re-contra
+CAPOT_FACTOR = (1, 2, 2)    # a capot bonus is only doubled, re-contra or not
+
+def card_ordinal(suit, rank):
+    """ Return the ordinal (0-31) of the card with the given suit and rank """
+    return SUITS.index(suit) * 8 + RANKS.index(rank)
+
+# -> dict {(suit, rank): card ordinal}, for finding ordinals in a hurry
+ORDINALS = dict(((suit, rank), card_ordinal(suit, rank)) for suit in SUITS for rank in RANKS)
+
+def ordinal_card(ordinal):
+    """ Return the (suit, rank) of the given card ordinal """
+    return SUITS[ordinal // 8], RANKS[ordinal % 8]
+
+def get_trump(contract):
+    """ Return the trump suit of a suit contract, or None for No trumps and All trumps """
+    if contract in SUITS:
+        return contract
+    return None
+
+def is_trump_suit(contract, suit):
+    """ Check if the given suit plays by the All trumps power table in the contract """
+    return contract == 'All trumps' or suit == contract
+
+def card_power(contract, ordinal):
+    """ Return the power of the card within its suit in the given contract """
+    suit, rank = ordinal_card(ordinal)
+    if is_trump_suit(contract, suit):
+        return ALL_TRUMP_POWER[rank]
+    return NO_TRUMP_POWER[rank]
+
+def card_value(contract, ordinal):
+    """ Return the points the card is worth in the given contract """
+    suit, rank = ordinal_card(ordinal)
+    if is_trump_suit(contract, suit):
+        return CARD_VALUE_ALL_TRUMP[rank]
+    return CARD_VALUE_NO_TRUMP[rank]
+
+def trick_power(contract, led_suit, ordinal):
+    """ The power of a card within a trick, as getHighest() sees it: cards of the led suit
+        keep their power, trumps of a suit contract get 10 more, other cards have none """
+    suit = ordinal // 8
+    if SUITS[suit] == get_trump(contract) and suit != led_suit:
+        return card_power(contract, ordinal) + 10
+    elif suit != led_suit:
+        return 0
+    return card_power(contract, ordinal)
+
+# -> dict {contract: list by led suit of lists by ordinal of trick_power()}; a trick goes to
+#    its card with the highest power, which is never shared by two cards other than 0
+TRICK_POWERS = dict((contract, [[trick_power(contract, led_suit, ordinal) for ordinal in xrange(32)]
+                                for led_suit in xrange(len(SUITS))])
+                    for contract in BID_ORDER[1:])
+TRICK_TABLE = None      # -> TRICK_POWERS as a numpy array (BID_ORDER index, led suit, ordinal), once needed
+
+def trick_winner(contract, cards):
+    """ Return the seat which takes the trick.
+        cards -> list of [seat, ordinal] in playing order """
+    powers = TRICK_POWERS[contract][cards[0][1] // 8]
+    return max(cards, key=lambda card: powers[card[1]])[0]
+
+def card_allowed(contract, hand, trick, card):
+    """ Check if a card of the hand may be played to the trick, as checkCard() rules: follow
+        suit, go higher in All trumps and the trump suit, and trump (higher if need be)
+        when the suit can't be followed and the adversary takes the trick
+        hand -> card ordinals of the player; trick -> card ordinals played so far, in order """
+    if not trick:
+        return True
+    led = trick[0] // 8
+    powers = TRICK_POWERS[contract][led]
+    place = max(xrange(len(trick)), key=lambda place: powers[trick[place]])
+    winning = trick[place]
+    partner = len(trick) - place == 2
+    suit = card // 8
+    if suit != led and any(other // 8 == led for other in hand):
+        return False
+    if suit == led:
+        if is_trump_suit(contract, SUITS[led]):     # go higher if you can
+            higher = any(other // 8 == led and card_power(contract, other) > card_power(contract, winning)
+                         for other in hand)
+            return not higher or card_power(contract, card) > card_power(contract, winning)
+        return True
+    trump = get_trump(contract)
+    if trump is None or partner:
+        return True
+    trumps = [other for other in hand if SUITS[other // 8] == trump]
+    if SUITS[winning // 8] != trump:    # trump if you can
+        return not trumps or SUITS[suit] == trump
+    higher = any(card_power(contract, other) > card_power(contract, winning) for other in trumps)
+    if SUITS[suit] != trump:            # overtrump if you can
+        return not higher
+    return not higher or card_power(contract, card) > card_power(contract, winning)
+
+def legal_cards(contract, hand, trick):
+    """ Return the cards of the hand which may be played to the trick (see card_allowed()) """
+    return [card for card in hand if card_allowed(contract, hand, trick, card)]
+
+def trick_winners(contracts, tricks):
+    """ Return which card takes each of many tricks, as a numpy array (N,) of places 0-3
+        in playing order
+        contracts -> a contract, or numpy array (N,) of BID_ORDER indexes
+        tricks -> numpy array (N, 4) of the ordinals of the tricks' cards in playing order """
+    global TRICK_TABLE
+    if TRICK_TABLE is None:
+        TRICK_TABLE = numpy.array([TRICK_POWERS.get(contract, [[0] * 32] * len(SUITS)) for contract in BID_ORDER])
+    tricks = numpy.asarray(tricks)
+    if isinstance(contracts, basestring):
+        contracts = BID_ORDER.index(contracts)
+    contracts = numpy.broadcast_to(contracts, len(tricks))
+    powers = TRICK_TABLE[contracts[:, None], tricks[:, :1] // 8, tricks]
+    return powers.argmax(axis=1)
+
+def announce_value(vid, rank=None):
+    """ Return the points of an announce (a Anons' vid and rank) """
+    if vid == 'care':
+        return CARE_VALUE[rank]
+    return ANNOUNCE_VALUE[vid]
+
+def counted_announces(contract, announces):
+    """ Return the points [team 1, team 2] of the announces which count at the end of a deal:
+        the belotes, the carres of the team with the highest carre and the sequences of
+        the team with the highest sequence (of those left competing, as the game declares)
+        announces -> list of (team 0 or 1, vid, suit, last card, rank), in the order declared """
+    best_care = None
+    best_sequence = None
+    for announce in announces:
+        team, vid, suit, last_card, rank = announce
+        if vid == 'belote':
+            continue
+        elif vid == 'care':
+            if best_care is None or CARE_ORDER.index(rank) > CARE_ORDER.index(best_care[4]):
+                best_care = announce
+        elif best_sequence is None:
+            best_sequence = announce
+        else:
+            if RANKS.index(best_sequence[3]) < RANKS.index(last_card):
+                best_sequence = announce
+            if RANKS.index(best_sequence[3]) == RANKS.index(last_card):    # equal sequences
+                if suit == get_trump(contract):     # the one of the trump suit wins
+                    best_sequence = announce
+                elif BID_ORDER.index(best_sequence[2]) < BID_ORDER.index(suit):
+                    best_sequence = announce
+    points = [0, 0]
+    for team, vid, suit, last_card, rank in announces:
+        if vid == 'care' and team != best_care[0]:
+            continue
+        elif vid != 'care' and vid != 'belote' and team != best_sequence[0]:
+            continue
+        points[team] += announce_value(vid, rank)
+    return points
+
+def deal_points(contract, points, last, announced):
+    """ Return the points [team 1, team 2] of a deal: the card points, 10 for the last
+        trick, all doubled in No trumps, then the announces which count
+        points -> [team 1, team 2] points of the cards the teams took
+        last -> team (0 or 1) which took the last trick, or None
+        announced -> [team 1, team 2] points of the announces (counted_announces()) """
+    points = list(points)
+    if last is not None:
+        points[last] += 10
+    factor = 2 if contract == 'No trumps' else 1
+    return [points[team] * factor + announced[team] for team in (0, 1)]
+
+def tens(points):
+    """ Round (non-negative) points to tens, halves up, as int(round(points / 10.0)) """
+    return (points + 5) // 10
+
+def score_deal(contract, bidder, doubling, result1, result2, remaining=0):
+    """ Return what a deal adds to the match: (team 1 score, team 2 score, score left hanging
+        for the next deal to be won)
+        contract -> the contract played; bidder -> the team (0 or 1) which bid it
+        doubling -> 0, 1 for a contra or 2 for a re-contra
+        result1, result2 -> the teams' points of the deal (deal_points())
+        remaining -> the score left hanging by earlier deals """
+    results = (result1, result2)
+    scores = [0, 0]
+    if result1 == result2:      # the deal 'hangs': the bidders' half waits for the next winner
+        scores[1 - bidder] = tens(results[bidder])
+        return scores[0], scores[1], remaining + tens(results[1 - bidder])
+    win = 0 if result1 > result2 else 1
+    high, low = results[win], results[1 - win]
+    if low == 0:                # capot: only the bonus counts
+        scores[win] = CAPOT_BONUS[contract] * CAPOT_FACTOR[doubling]
+    elif doubling or win != bidder:     # the winners take all
+        scores[win] = (tens(high) + tens(low)) * CONTRA_FACTOR[doubling]
+    else:
+        scores[win], scores[1 - win] = tens(high), tens(low)
+    scores[win] += remaining
+    return scores[0], scores[1], 0
+
+def deals_points(contracts, points1, points2, last, announced1, announced2):
+    """ Return deal_points() of many deals, as numpy arrays (N,) of the teams' points
+        contracts -> a contract, or numpy array (N,) of BID_ORDER indexes
+        points1, points2, announced1, announced2 -> numpy arrays (N,) of the teams' card
+                                                    and announce points
+        last -> numpy array (N,) of the teams (0 or 1) which took the last trick """
+    if isinstance(contracts, basestring):
+        contracts = BID_ORDER.index(contracts)
+    factor = numpy.where(numpy.asarray(contracts) == BID_ORDER.index('No trumps'), 2, 1)
+    return ((points1 + numpy.where(last == 0, 10, 0)) * factor + announced1,
+            (points2 + numpy.where(last == 1, 10, 0)) * factor + announced2)
+
+def score_deals(contracts, bidders, doublings, results1, results2, remaining=0):
+    """ Return score_deal() of many deals, as numpy arrays (N,): team 1 scores, team 2
+        scores and scores left hanging
+        contracts -> a contract, or numpy array (N,) of BID_ORDER indexes
+        bidders, doublings, results1, results2 -> numpy arrays (N,), as for score_deal()
+        remaining -> the score left hanging before each deal, a number or numpy array (N,) """
+    if isinstance(contracts, basestring):
+        contracts = BID_ORDER.index(contracts)
+    bonus = numpy.array([0] + [CAPOT_BONUS[contract] for contract in BID_ORDER[1:]])[contracts]
+    doublings = numpy.asarray(doublings)
+    results1, results2 = numpy.asarray(results1), numpy.asarray(results2)
+    high, low = numpy.maximum(results1, results2), numpy.minimum(results1, results2)
+    win = numpy.where(results2 > results1, 1, 0)
+    capot = low == 0
+    take_all = (doublings > 0) | (win != bidders)
+    winner = numpy.where(capot, bonus * numpy.array(CAPOT_FACTOR)[doublings],
+                         numpy.where(take_all, (tens(high) + tens(low)) * numpy.array(CONTRA_FACTOR)[doublings],
+                                     tens(high))) + remaining
+    loser = numpy.where(capot | take_all, 0, tens(low))
+    even = results1 == results2
+    team1 = numpy.where(even, numpy.where(bidders == 1, tens(results2), 0), numpy.where(win == 0, winner, loser))
+    team2 = numpy.where(even, numpy.where(bidders == 0, tens(results1), 0), numpy.where(win == 1, winner, loser))
+    hanging = numpy.where(even, remaining + tens(results1), 0)
+    return team1, team2, hanging
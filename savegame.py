@@ -0,0 +1,221 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Saving and resuming a match in progress.
+
+The game takes a Snapshot of the match at every state boundary: before the bidding,
+before the preparation, before each trick and before the scoring. Nothing is half-done
+at these points, so the match can go on from a snapshot exactly as it would have.
+
+A snapshot is packed into a small versioned binary blob: cards are stored as their
+ordinals (see rules.py), announces as in record.py, and bids, suits, behaviors and suit
+analyses as their index in a fixed table. The record.py events of the deal in play are
+kept as they are, so a resumed match records the same deal on. A whole match fits in a
+few hundred bytes and packs in a fraction of a millisecond. The save file is replaced
+atomically, so a process killed while saving leaves the previous snapshot behind.
+
+A save file of another version, or a damaged one, is ignored and the game starts anew.
+"""
+
+import os, struct
+import record
+from rules import SUITS, RANKS, card_ordinal, ordinal_card
+
+SAVE_MAGIC = b"BLTS"
+SAVE_VERSION = 2
+# header: magic, version
+HEADER = struct.Struct("<4sH")
+SHORT = struct.Struct("<H")
+NONE = 0xFF
+LANGUAGES = ('English', 'Bulgarian')     # location.py classes
+TEAMS = ('Team 1', 'Team 2')
+BEHAVIORS = ('normal', 'aggressive', 'defensive', 'desperate')
+SUIT_ANALYSES = ('weak', 'blocking', 'strong block', 'long', 'controlling', 'commanding')
+
+
+class Snapshot():
+    def __init__(self):
+        """ Everything needed to resume a match, in the game's own terms; seats are 0-3
+            for Player 1-4, cards are (suit, rank) and announces (vid, suit, last card, rank) """
+        self.language = 'English'   # -> name of the location.py class of the interface
+        self.state = 1              # -> int; game.state to resume into
+        self.rund = 1
+        self.first = 0              # -> seat of game.first
+        self.leader = 0             # -> seat which is first in turnOrder
+        self.contract = None        # -> [seat, bid] or None if there's no contract yet
+        self.contra = False
+        self.reContra = False
+        self.last = None            # -> team which took the last trick, or None
+        self.scores = [0, 0]        # -> team 1 and team 2 score
+        self.games = [0, 0]         # -> team 1 and team 2 games won
+        self.remaining = 0
+        self.lastRound = False
+        self.deck = []              # -> list of cards, in deck order
+        self.hands = [[], [], [], []]           # -> per seat: list of cards
+        self.winnings = [[], [], [], []]
+        self.saved_cards = [[], [], [], []]
+        self.announces = [[], [], [], []]       # -> per seat: list of announces not declared yet
+        self.belotes = [[], [], [], []]
+        self.suit_power = [{}, {}, {}, {}]      # -> per seat: dict {suit: analysis}
+        self.declared = []          # -> list of [seat, announce], as in game.announces
+        self.behavior = ['normal', 'normal']    # -> per team, as in Strategy
+        self.interesting_suits = [[], []]
+        self.partner_suits = [[], []]
+        self.passed = [{}, {}]      # -> per team: dict {suit: list of ranks}
+        self.bid_history = [[], []]             # -> per team: list of [seat, bid]
+        self.record = b""           # -> record.py events of the deal in play, not written yet
+
+    def pack(self):
+        """ Return the snapshot as a binary blob """
+        blob = bytearray(HEADER.pack(SAVE_MAGIC, SAVE_VERSION))
+        blob.extend([LANGUAGES.index(self.language), self.state, self.rund, self.first, self.leader])
+        if self.contract:
+            blob.extend([self.contract[0], record.BIDS.index(self.contract[1])])
+        else:
+            blob.extend([NONE, NONE])
+        blob.extend([self.contra, self.reContra, self.lastRound,
+                     TEAMS.index(self.last) if self.last else NONE])
+        for number in self.scores + self.games + [self.remaining]:
+            blob.extend(SHORT.pack(number))
+        put_cards(blob, self.deck)
+        for seat in xrange(4):
+            put_cards(blob, self.hands[seat])
+            put_cards(blob, self.winnings[seat])
+            put_cards(blob, self.saved_cards[seat])
+            put_announces(blob, self.announces[seat])
+            put_announces(blob, self.belotes[seat])
+            blob.extend([SUIT_ANALYSES.index(self.suit_power[seat][suit]) if suit in self.suit_power[seat]
+                         else NONE for suit in SUITS])
+        blob.append(len(self.declared))
+        for seat, anons in self.declared:
+            blob.append(seat)
+            blob.extend(record.announce_code(*anons))
+        for team in xrange(2):
+            blob.append(BEHAVIORS.index(self.behavior[team]))
+            put_list(blob, [SUITS.index(suit) for suit in self.interesting_suits[team]])
+            put_list(blob, [SUITS.index(suit) for suit in self.partner_suits[team]])
+            for suit in SUITS:
+                if suit in self.passed[team]:
+                    put_list(blob, [RANKS.index(rank) for rank in self.passed[team][suit]])
+                else:
+                    blob.append(NONE)
+            put_list(blob, [seat << 4 | record.BIDS.index(bid) for seat, bid in self.bid_history[team]])
+        blob.extend(SHORT.pack(len(self.record)))
+        blob.extend(self.record)
+        return bytes(blob)
+
+
+class Reader():
+    def __init__(self, data):
+        """ Reads the fields of a blob in order; running past its end raises ValueError """
+        self.data = bytearray(data)
+        self.pos = 0
+
+    def bytes(self, count):
+        if self.pos + count > len(self.data):
+            raise ValueError("Save data is truncated")
+        self.pos += count
+        return self.data[self.pos - count:self.pos]
+
+    def byte(self):
+        return self.bytes(1)[0]
+
+    def short(self):
+        return SHORT.unpack(str(self.bytes(SHORT.size)))[0]
+
+    def list(self):
+        """ Read a length-prefixed list of bytes; return None for a missing list """
+        count = self.byte()
+        if count == NONE:
+            return None
+        return list(self.bytes(count))
+
+    def cards(self):
+        return [ordinal_card(ordinal) for ordinal in self.list()]
+
+    def announces(self):
+        return [tuple(record.announce_fields(*self.bytes(3))) for i in xrange(self.byte())]
+
+
+def put_list(blob, items):
+    blob.append(len(items))
+    blob.extend(items)
+
+def put_cards(blob, cards):
+    put_list(blob, [card_ordinal(suit, rank) for suit, rank in cards])
+
+def put_announces(blob, announces):
+    blob.append(len(announces))
+    for anons in announces:
+        blob.extend(record.announce_code(*anons))
+
+def unpack(data):
+    """ Return the Snapshot packed in a blob; raise ValueError if it isn't a valid one """
+    if len(data) < HEADER.size:
+        raise ValueError("Not a saved game")
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        raise ValueError("Not a saved game of this version")
+    data = Reader(data)
+    data.pos = HEADER.size
+    snapshot = Snapshot()
+    language, snapshot.state, snapshot.rund, snapshot.first, snapshot.leader = data.bytes(5)
+    snapshot.language = LANGUAGES[language]
+    seat, bid = data.bytes(2)
+    if seat != NONE:
+        snapshot.contract = [seat, record.BIDS[bid]]
+    contra, reContra, lastRound, last = data.bytes(4)
+    snapshot.contra, snapshot.reContra, snapshot.lastRound = bool(contra), bool(reContra), bool(lastRound)
+    if last != NONE:
+        snapshot.last = TEAMS[last]
+    snapshot.scores = [data.short(), data.short()]
+    snapshot.games = [data.short(), data.short()]
+    snapshot.remaining = data.short()
+    snapshot.deck = data.cards()
+    for seat in xrange(4):
+        snapshot.hands[seat] = data.cards()
+        snapshot.winnings[seat] = data.cards()
+        snapshot.saved_cards[seat] = data.cards()
+        snapshot.announces[seat] = data.announces()
+        snapshot.belotes[seat] = data.announces()
+        for suit, analysis in zip(SUITS, data.bytes(4)):
+            if analysis != NONE:
+                snapshot.suit_power[seat][suit] = SUIT_ANALYSES[analysis]
+    for i in xrange(data.byte()):
+        seat = data.byte()
+        snapshot.declared.append([seat, tuple(record.announce_fields(*data.bytes(3)))])
+    for team in xrange(2):
+        snapshot.behavior[team] = BEHAVIORS[data.byte()]
+        snapshot.interesting_suits[team] = [SUITS[suit] for suit in data.list()]
+        snapshot.partner_suits[team] = [SUITS[suit] for suit in data.list()]
+        for suit in SUITS:
+            ranks = data.list()
+            if ranks is not None:
+                snapshot.passed[team][suit] = [RANKS[rank] for rank in ranks]
+        snapshot.bid_history[team] = [[code >> 4, record.BIDS[code & 0x0F]] for code in data.list()]
+    snapshot.record = bytes(data.bytes(data.short()))
+    return snapshot
+
+def save(filename, snapshot):
+    """ Write the packed snapshot over the save file filename, atomically """
+    temp = filename + ".tmp"
+    with open(temp, "wb") as save_file:
+        save_file.write(snapshot.pack())
+    try:
+        os.rename(temp, filename)
+    except OSError:     # Windows can't rename over an existing file
+        os.remove(filename)
+        os.rename(temp, filename)
+
+def load(filename):
+    """ Return the Snapshot saved in filename, or None if there is no valid one """
+    try:
+        with open(filename, "rb") as save_file:
+            return unpack(save_file.read())
+    except (IOError, ValueError, IndexError, struct.error):
+        return None
+
+def remove(filename):
+    """ Forget the saved game, e.g. once the match is over """
+    if os.path.exists(filename):
+        os.remove(filename)
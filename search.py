@@ -0,0 +1,293 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+A compact state of the play for searching ahead, changed in place move by move.
+
+Looking ahead with the game's own objects means copying Hand lists, Strategy.passed dicts
+and the GameState at every step, kilobytes and microseconds a node. A SearchState only
+keeps what the play needs: the hands of the four seats as bit masks of card ordinals
+(see rules.py), the cards of the trick in progress, the seat which led it, the teams'
+card points so far, the tricks done and the contract as its BID_ORDER index. Seats are
+0-3 for Player 1-4, and seats 0 and 2 are Team 1.
+
+make_move() plays a card and unmake_move() takes the last one back, both in place: the
+trick and the undo stacks are lists made once, so a search goes down and back up the
+tree without copying anything. legal_moves() gives the cards rules.card_allowed() allows,
+as a bit mask, from tables of masks made once per contract. solve() is a plain alpha-beta
+search on it, the last two tricks looked up in the endgame tablebase (see endgame.py).
+    python search.py [--tricks N] [--positions N]
+counts the nodes a second of a full walk of the tree, against deep-copying the game's
+objects, and checks legal_moves() and solve() against the rules and endgame.minimax().
+"""
+
+import time, random, argparse, copy
+import engine, rules, endgame
+
+SUIT_MASKS = [255 << (suit * 8) for suit in xrange(4)]
+LOWEST = dict((1 << card, card) for card in xrange(32))     # -> {bit of a card: its ordinal}
+
+TABLES = {}     # -> {contract index: ContractTables}
+
+
+class ContractTables():
+    def __init__(self, contract):
+        """ The masks and numbers of a contract the play looks up, by card ordinal """
+        self.contract = contract
+        self.trump = rules.SUITS.index(contract) if contract in rules.SUITS else None
+        # -> per led suit: the trick power of each card (rules.TRICK_POWERS)
+        self.powers = rules.TRICK_POWERS[contract]
+        self.values = [rules.card_value(contract, card) for card in xrange(32)]
+        # -> the cards of the same suit stronger than the card
+        self.higher = [sum(1 << other for other in xrange(card // 8 * 8, card // 8 * 8 + 8)
+                           if rules.card_power(contract, other) > rules.card_power(contract, card))
+                       for card in xrange(32)]
+        # -> per suit: True if a card led in it must be beaten if possible
+        self.go_higher = [rules.is_trump_suit(contract, suit) for suit in rules.SUITS]
+
+def contract_tables(code):
+    """ Return the ContractTables of a contract, by its BID_ORDER index (made once) """
+    if code not in TABLES:
+        TABLES[code] = ContractTables(rules.BID_ORDER[code])
+    return TABLES[code]
+
+
+class SearchState(object):
+    __slots__ = ('hands', 'contract', 'tables', 'trick', 'played', 'leader', 'points', 'tricks',
+                 'depth', 'cards', 'leaders', 'gains')
+
+    def __init__(self, hands, contract, leader=0, points=(0, 0), tricks=0):
+        """ The state of the play at the start of a trick
+            hands -> 4 bit masks of the card ordinals of the seats
+            contract -> the contract, a string from rules.BID_ORDER
+            leader -> seat to lead the trick; points -> card points of Team 1 and Team 2
+            tricks -> tricks done (the last trick gives 10 more) """
+        self.hands = list(hands)
+        self.contract = rules.BID_ORDER.index(contract)
+        self.tables = contract_tables(self.contract)
+        self.trick = [0] * 4        # -> cards of the trick in progress, in playing order
+        self.played = 0             # -> how many of them are played
+        self.leader = leader
+        self.points = list(points)
+        self.tricks = tricks
+        self.depth = 0              # -> moves made, the height of the undo stacks
+        self.cards = [0] * 32       # -> undo stacks: the cards played,
+        self.leaders = [0] * 32     # the leader of a trick a move finished,
+        self.gains = [0] * 32       # and the points it gave the team taking it
+
+    def seat(self):
+        """ Return the seat to play """
+        return (self.leader + self.played) % 4
+
+    def legal_moves(self):
+        """ Return the cards the seat to play may play, as a bit mask """
+        hand = self.hands[(self.leader + self.played) % 4]
+        if not self.played:
+            return hand
+        tables = self.tables
+        trick = self.trick
+        led = trick[0] >> 3
+        powers = tables.powers[led]
+        place = 0
+        for other in xrange(1, self.played):
+            if powers[trick[other]] > powers[trick[place]]:
+                place = other
+        winning = trick[place]
+        follow = hand & SUIT_MASKS[led]
+        if follow:
+            if tables.go_higher[led]:
+                return follow & tables.higher[winning] or follow
+            return follow
+        trump = tables.trump
+        if trump is None or self.played - place == 2:   # no trumps, or the partner takes the trick
+            return hand
+        trumps = hand & SUIT_MASKS[trump]
+        if not trumps:
+            return hand
+        if winning >> 3 != trump:
+            return trumps
+        return trumps & tables.higher[winning] or hand
+
+    def make_move(self, card):
+        """ Play the card (an ordinal) for the seat to play """
+        played = self.played
+        self.hands[(self.leader + played) % 4] ^= 1 << card
+        self.trick[played] = card
+        self.cards[self.depth] = card
+        if played < 3:
+            self.played = played + 1
+        else:           # the trick is done: its taker leads the next one
+            trick = self.trick
+            powers = self.tables.powers[trick[0] >> 3]
+            place = 0
+            for other in (1, 2, 3):
+                if powers[trick[other]] > powers[trick[place]]:
+                    place = other
+            values = self.tables.values
+            gain = values[trick[0]] + values[trick[1]] + values[trick[2]] + values[trick[3]]
+            self.tricks += 1
+            if self.tricks == 8:
+                gain += 10
+            taker = (self.leader + place) % 4
+            self.points[taker & 1] += gain
+            self.leaders[self.depth] = self.leader
+            self.gains[self.depth] = gain
+            self.leader = taker
+            self.played = 0
+        self.depth += 1
+
+    def unmake_move(self):
+        """ Take back the last card played """
+        self.depth -= 1
+        depth = self.depth
+        card = self.cards[depth]
+        if not self.played:     # it finished a trick: put the trick back
+            self.points[self.leader & 1] -= self.gains[depth]
+            self.leader = self.leaders[depth]
+            self.tricks -= 1
+            cards = self.cards
+            trick = self.trick
+            trick[0], trick[1], trick[2] = cards[depth - 3], cards[depth - 2], cards[depth - 1]
+            self.played = 3
+        else:
+            self.played -= 1
+        self.hands[(self.leader + self.played) % 4] |= 1 << card
+
+    def hand_cards(self, seat):
+        """ Return the card ordinals of a seat's hand """
+        return [card for card in xrange(32) if self.hands[seat] >> card & 1]
+
+
+def from_snapshot(snapshot, trick=()):
+    """ Return the SearchState of the play in a savegame.Snapshot
+        trick -> list of (seat, card ordinal) played so far in the trick, in order, as the
+                 game's currentTrick() gives them (they're out of the snapshot's hands) """
+    hands = [sum(1 << rules.card_ordinal(*card) for card in hand) for hand in snapshot.hands]
+    for seat, card in trick:
+        hands[seat] |= 1 << card
+    contract = snapshot.contract[1]
+    values = [sum(rules.card_value(contract, rules.card_ordinal(*card)) for card in winnings)
+              for winnings in snapshot.winnings]
+    tricks = sum(len(winnings) for winnings in snapshot.winnings) // 4
+    state = SearchState(hands, contract, snapshot.leader, (values[0] + values[2], values[1] + values[3]), tricks)
+    for seat, card in trick:
+        state.make_move(card)
+    return state
+
+def solve(state, alpha=-1, beta=1000, tablebase=True):
+    """ Return Team 1's card points at the end of the deal with both teams playing their
+        best from the state (the last trick's 10 included), by alpha-beta search
+        tablebase -> True to look the last two tricks up in the endgame tablebase """
+    if state.tricks == 8:
+        return state.points[0]
+    if tablebase and state.tricks == 6:
+        leader = state.leader
+        hands = [state.hand_cards((leader + place) % 4) + ([state.trick[place]] if place < state.played else [])
+                 for place in xrange(4)]
+        points = endgame.probe(rules.BID_ORDER[state.contract], hands, state.trick[:state.played])[0]
+        total = sum(state.tables.values[card] for hand in hands for card in hand) + 10
+        return state.points[0] + (points if leader % 2 == 0 else total - points)
+    maximize = (state.leader + state.played) % 2 == 0
+    moves = state.legal_moves()
+    while moves:
+        bit = moves & -moves
+        moves ^= bit
+        state.make_move(LOWEST[bit])
+        points = solve(state, alpha, beta, tablebase)
+        state.unmake_move()
+        if maximize:
+            if points > alpha:
+                alpha = points
+        elif points < beta:
+            beta = points
+        if alpha >= beta:
+            break
+    return alpha if maximize else beta
+
+def walk(state):
+    """ Visit every position of the play from the state to the end; return their number """
+    nodes = 1
+    moves = state.legal_moves()
+    while moves:
+        bit = moves & -moves
+        moves ^= bit
+        state.make_move(LOWEST[bit])
+        nodes += walk(state)
+        state.unmake_move()
+    return nodes
+
+def walk_copying(objects, contract, seat, trick):
+    """ Visit the positions walk() does by deep-copying the game's objects at each move,
+        as a lookahead on them would; return their number
+        objects -> (list of the 4 Hands, list of the 2 Strategies, the GameState)
+        trick -> list of the Cards played to the trick so far """
+    nodes = 1
+    hand = objects[0][seat].hand
+    ordinals = [engine.ordinal(card) for card in hand]
+    played = [engine.ordinal(card) for card in trick]
+    for place, card in enumerate(hand):
+        if rules.card_allowed(contract, ordinals, played, ordinals[place]):
+            copied = copy.deepcopy(objects)
+            del copied[0][seat].hand[place]
+            if len(trick) < 3:
+                nodes += walk_copying(copied, contract, (seat + 1) % 4, trick + [card])
+            else:
+                cards = [[(seat + 1 + other) % 4, number] for other, number in enumerate(played + [ordinals[place]])]
+                nodes += walk_copying(copied, contract, rules.trick_winner(contract, cards), [])
+    return nodes
+
+def random_state(shuffle, tricks):
+    """ Return a SearchState of a random deal with the given number of tricks left to play """
+    deck = shuffle.sample(xrange(32), tricks * 4)
+    hands = [sum(1 << card for card in deck[seat * tricks:(seat + 1) * tricks]) for seat in xrange(4)]
+    return SearchState(hands, shuffle.choice(rules.BID_ORDER[1:]), shuffle.randrange(4), (0, 0), 8 - tricks)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the search state and check it against the rules")
+    parser.add_argument("--tricks", type=int, default=4, help="tricks left in the deals walked")
+    parser.add_argument("--positions", type=int, default=300, help="positions to check")
+    options = parser.parse_args()
+    belot = engine.load_game()
+    shuffle = random.Random(0)
+    states = [random_state(shuffle, options.tricks) for number in xrange(10)]
+    start = time.time()
+    nodes = sum(walk(state) for state in states)
+    elapsed = time.time() - start
+    print "make/unmake: %d nodes in %.2f s, %.0f nodes/s" % (nodes, elapsed, nodes / elapsed)
+    state = states[0]
+    contract = rules.BID_ORDER[state.contract]
+    players = [belot.Hand("Player %d" % (seat + 1), "Team %d" % (seat % 2 + 1)) for seat in xrange(4)]
+    for seat, player in enumerate(players):
+        player.hand = [engine.ordinal_to_card(card) for card in state.hand_cards(seat)]
+    game = belot.GameState()
+    game.contract = [players[0], contract]
+    objects = (players, [belot.Strategy("Team 1"), belot.Strategy("Team 2")], game)
+    start = time.time()
+    copied = walk_copying(objects, contract, state.leader, [])
+    elapsed = time.time() - start
+    print "deep copies: %d nodes in %.2f s, %.0f nodes/s" % (copied, elapsed, copied / elapsed)
+    # legal_moves() against rules.legal_cards(), along random deals played out
+    wrong = 0
+    for number in xrange(options.positions):
+        state = random_state(shuffle, 8)
+        while state.tricks < 8:
+            legal = rules.legal_cards(rules.BID_ORDER[state.contract], state.hand_cards(state.seat()),
+                                      state.trick[:state.played])
+            wrong += sum(1 << card for card in legal) != state.legal_moves()
+            state.make_move(shuffle.choice(legal))
+        wrong += state.depth != 32 or sum(state.points) != sum(state.tables.values) + 10
+    print "checked legal_moves() in %d deals: %d wrong" % (options.positions, wrong)
+    # solve() against endgame.minimax() on two tricks, and with the tablebase against without it
+    wrong = 0
+    for number in xrange(options.positions):
+        state = random_state(shuffle, 2)
+        hands = [state.hand_cards(seat) for seat in xrange(4)]
+        best = endgame.minimax(rules.BID_ORDER[state.contract], hands, leader=state.leader)[0]
+        wrong += solve(state, tablebase=False) != best
+        state = random_state(shuffle, 3)
+        for move in xrange(shuffle.randrange(4)):
+            state.make_move(LOWEST[state.legal_moves() & -state.legal_moves()])
+        before = list(state.hands), state.depth
+        wrong += solve(state) != solve(state, tablebase=False)
+        wrong += (list(state.hands), state.depth) != before
+    print "checked solve() on %d positions: %d wrong" % (2 * options.positions, wrong)
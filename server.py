@@ -0,0 +1,499 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+A Belote server hosting many tables at once; see engine.py for the tables themselves.
+The seats nobody takes are played by the game's AI.
+
+Clients talk to the server over TCP, one JSON value per line. A client sends
+    {"cmd": "join", "table": name, "humans": n}    both optional: without a name the client
+                                                    joins any open table for n people (1 by default)
+    {"cmd": "join", "table": name, "seat": seat}   take a seat back after losing the connection
+    {"cmd": "watch", "table": name}                 follow a table as a spectator
+    {"cmd": "bid", "bid": "C"}                      a bid from BID_ORDER, "contra" or "re-contra"
+    {"cmd": "play", "card": 27}                     a card ordinal, as in rules.py
+    {"cmd": "stats"}
+On joining or watching a table the client gets a full view of it:
+    {"event": "sync", "table": name, "seat": seat or null, "seq": n, "score1": .., "score2": ..,
+     "games1": .., "games2": .., "deal": [the deltas of the deal so far]}
+and from then on only deltas: each event of the table (see engine.py) as a JSON array of
+its sequence number and the event, e.g. [57,"play",2,27] -- about 20 bytes per card played.
+Sequence numbers grow by one per event of the table, so they skip the events meant for
+other seats: only the player gets its cards and the legal choices of its turn. A delta is
+encoded once for everybody who gets the same version of it. A refused command gets
+{"event": "error", "message": key}, with the key of the game message explaining why.
+
+The network side is a single asyncore loop. All table work -- the rules and the AI of the
+computer seats -- runs on one engine thread shared by every table, as the game script's
+globals can be bound to one table at a time (see engine.py), and in one process the AI
+of two threads wouldn't run any faster than in one. So a slow AI move holds up the moves
+of every other table queued behind it; only the connections keep going, as the loop keeps
+reading and writing meanwhile. To spread the tables over several engines, run shards.py.
+With --max-batch the engine makes the AI bids of all tables in batches (see decisions.py):
+a table's moves so far are sent at once, and its AI bid waits up to --max-wait ms for
+others to be made with.
+Run the server with:
+    python server.py [--host HOST] [--port PORT] [--max-batch N] [--max-wait MS]
+"""
+
+import json, time, socket, asyncore, asynchat, threading, traceback, argparse
+import Queue, collections
+import engine, timeline, decisions
+
+HOST = "127.0.0.1"
+PORT = 7777
+HUMAN_SEATS = (0, 2, 1, 3)   # seats given to people, in the order they join a table
+DEAL_PAUSE = 0               # ms between two deals
+RECONNECT_GRACE = 60000      # ms a table waits for its people to come back once they all left
+EVENT_FIELDS = {'deal': ('first',), 'cards': ('seat', 'cards'), 'turn': ('seat', 'phase', 'legal'),
+                'bid': ('seat', 'bid'), 'announce': ('seat', 'vid', 'suit', 'last_card', 'rank'),
+                'play': ('seat', 'card'), 'trick': ('winner',), 'end': ('score1', 'score2'),
+                'over': ('team',)}
+
+
+def socket_pair():
+    """ Return two connected sockets (socket.socketpair() is missing on Windows) """
+    if hasattr(socket, "socketpair"):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    writer = socket.create_connection(listener.getsockname())
+    reader = listener.accept()[0]
+    listener.close()
+    return reader, writer
+
+def serve(scheduler):
+    """ Run the asyncore loop and the scheduler's timers, forever """
+    last = time.time()
+    while True:
+        due = scheduler.next_due()
+        asyncore.loop(1.0 if due is None else due / 1000.0, use_poll=True, count=1)   # select() stops at 1024 sockets
+        now = time.time()
+        scheduler.advance((now - last) * 1000)
+        last = now
+
+def delta_views(event):
+    """ Return the versions of an engine event as a dict {seat: event}: the seat it's private
+        to gets the whole event, and everybody else (None) the public part, if any """
+    if event[0] == 'cards':
+        return {event[1]: event}
+    if event[0] == 'turn':
+        return {event[1]: event, None: event[:3]}
+    return {None: event}
+
+def encode_delta(seq, event):
+    return json.dumps([seq] + list(event), separators=(',', ':')) + "\n"
+
+def delta_message(delta):
+    """ Return a delta a client received as a dict {"seq": n, "event": name, field: value...} """
+    message = dict(zip(EVENT_FIELDS[delta[1]], delta[2:]))
+    message.update(seq=delta[0], event=delta[1])
+    return message
+
+def message_event(message):
+    """ Return the engine event a client received as message, as a tuple """
+    return (message['event'],) + tuple(message.get(field) for field in EVENT_FIELDS[message['event']])
+
+
+class Waker(asyncore.dispatcher):
+    def __init__(self, callback):
+        """ Lets other threads wake the asyncore loop up to call callback """
+        reader, self.writer = socket_pair()
+        self.writer.setblocking(False)
+        asyncore.dispatcher.__init__(self, reader)
+        self.callback = callback
+
+    def wake(self):
+        """ Thread safe """
+        try:
+            self.writer.send(b"x")
+        except socket.error:
+            pass    # the pipe is full, so the loop is going to wake up anyway
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.recv(4096)
+        self.callback()
+
+
+class Engine(threading.Thread):
+    def __init__(self, waker, service=None):
+        """ Runs table jobs one at a time, in the order they were submitted,
+            and the batches of AI bids of the decisions.DecisionService, if any, when they are due """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.jobs = Queue.Queue()
+        self.done = collections.deque()   # -> (table, connection, result) of finished jobs
+        self.waker = waker
+        self.service = service
+        self.count = 0            # number of jobs done
+        self.busy = 0.0           # seconds spent on them
+        self.slowest = 0.0
+
+    def submit(self, table, connection, job):
+        self.jobs.put((table, connection, job))
+
+    def run(self):
+        while True:
+            due = self.service.due() if self.service else None
+            if due == 0:
+                self.flush()
+                continue
+            try:
+                table, connection, job = self.jobs.get(True, due)
+            except Queue.Empty:     # time for the next batch
+                continue
+            start = time.time()
+            try:
+                result = job()
+            except engine.MoveError as error:
+                result = error
+            except Exception as error:    # a bug in the rules or the AI breaks only this table
+                traceback.print_exc()
+                result = error
+            elapsed = time.time() - start
+            self.count += 1
+            self.busy += elapsed
+            self.slowest = max(self.slowest, elapsed)
+            self.done.append((table, connection, result))
+            self.waker.wake()
+
+    def flush(self):
+        """ Make a batch of AI bids and hand the tables which got to a stop back """
+        start = time.time()
+        done = self.service.flush()
+        elapsed = time.time() - start
+        self.count += len(done)
+        self.busy += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        for table, engine_table, events in done:
+            table.deciding = False
+            if not isinstance(events, Exception):
+                events = events, engine_table.waiting, engine_table.pending
+            self.done.append((table, None, events))
+        self.waker.wake()
+
+
+class HostedTable():
+    def __init__(self, host, name, humans, seed=None):
+        """ A table of the server, with the connections of the people sitting at it """
+        self.host = host
+        self.name = name
+        self.humans = humans      # -> number of people the table is for
+        self.seed = seed
+        self.seats = {}           # -> dict {seat: Connection}
+        self.spectators = []      # -> Connections watching the table
+        self.seq = 0              # -> sequence number of the last event
+        self.log = []             # -> (seq, event) of the current deal, for syncing new subscribers
+        self.scores = [0, 0]
+        self.games = [0, 0]
+        self.table = None         # -> engine.Table, once everybody sat down; only used on the engine thread
+        self.deciding = False     # -> True while the table is in the DecisionService; engine thread too
+        self.started = False
+        self.paused = False       # -> True between deals while everybody is away
+        self.closed = False
+
+    def full(self):
+        return self.started or len(self.seats) == self.humans
+
+    def free(self, seat):
+        """ Check if a person may take the given seat """
+        return seat in HUMAN_SEATS[:self.humans] and seat not in self.seats
+
+    def sit(self, connection, seat=None):
+        """ Give the connection the given seat, or the next free one """
+        if seat is None:
+            seat = [seat for seat in HUMAN_SEATS if seat not in self.seats][0]
+        self.seats[seat] = connection
+        connection.table, connection.seat = self, seat
+        self.sync(connection)
+
+    def watch(self, connection):
+        self.spectators.append(connection)
+        connection.table, connection.seat = self, None
+        self.sync(connection)
+
+    def sync(self, connection):
+        """ Send the connection the whole table as its seat sees it """
+        deal = []
+        for seq, event in self.log:
+            views = delta_views(event)
+            version = views.get(connection.seat, views.get(None))
+            if version:
+                deal.append([seq] + list(version))
+        connection.send_message({"event": "sync", "table": self.name, "seat": connection.seat, "seq": self.seq,
+                                 "score1": self.scores[0], "score2": self.scores[1],
+                                 "games1": self.games[0], "games2": self.games[1], "deal": deal})
+
+    def submit(self, connection, function, *args):
+        """ Run a method of the engine.Table on the engine thread """
+        def job():
+            if function == 'start':
+                self.table = engine.Table(HUMAN_SEATS[:self.humans], self.seed,
+                                          batched=self.host.service is not None)
+            events = getattr(self.table, function)(*args)
+            if self.table.pending and not self.deciding:
+                self.deciding = True
+                self.host.service.add(self, self.table, [])
+            return events, self.table.waiting, self.table.pending
+        self.host.engine.submit(self, connection, job)
+
+    def deliver(self, connection, result):
+        """ The engine finished a job of this table, tell the players """
+        if self.closed:
+            return
+        if isinstance(result, engine.MoveError):
+            if connection.connected:
+                connection.send_message({"event": "error", "message": str(result)})
+            return
+        if isinstance(result, Exception):
+            self.broadcast([('error', "tablefailed")])
+            self.host.close_table(self)
+            return
+        events, waiting, pending = result
+        self.broadcast(events)
+        if pending:     # the AI goes on in a batch of the engine
+            return
+        if waiting is None and not self.seats:    # nobody to play for, wait for somebody to come back
+            self.paused = True
+        elif waiting is None:     # the deal ended, go on with the next one
+            self.host.scheduler.call_later(DEAL_PAUSE, lambda: self.submit(None, 'proceed'))
+
+    def broadcast(self, events):
+        """ Send every subscriber its version of the events, encoding each version once """
+        for event in events:
+            if event[0] == 'error':
+                self.host.send(json.dumps({"event": "error", "message": event[1]}) + "\n",
+                               self.seats.values() + self.spectators)
+                continue
+            self.seq += 1
+            self.follow(event)
+            views = delta_views(event)
+            for view, version in views.items():
+                if view is None:
+                    connections = [connection for seat, connection in self.seats.items()
+                                   if seat not in views] + self.spectators
+                else:
+                    connections = [self.seats[view]] if view in self.seats else []
+                if connections:
+                    self.host.send(encode_delta(self.seq, version), connections)
+
+    def follow(self, event):
+        """ Keep what a sync needs: the events of the deal and the scores """
+        if event[0] == 'deal':
+            self.log = []
+        elif event[0] == 'play':
+            self.host.cards += 1
+        if event[0] != 'turn':     # a person's turn can't be pending at a sync
+            self.log.append((self.seq, event))
+        if event[0] == 'end':
+            self.scores = list(event[1:])
+        elif event[0] == 'over':
+            self.games[event[1] == 'Team 2'] += 1
+            self.scores = [0, 0]
+
+    def leave(self, connection):
+        """ A person left; the AI plays their seat from now on """
+        if connection in self.spectators:
+            self.spectators.remove(connection)
+            return
+        del self.seats[connection.seat]
+        if not self.started:
+            if not self.seats:
+                self.host.close_table(self)
+            return
+        self.submit(None, 'release', connection.seat)
+        if not self.seats:
+            self.host.scheduler.call_later(RECONNECT_GRACE, self.abandon)
+
+    def abandon(self):
+        if not self.seats:
+            self.host.close_table(self)
+
+    def resume(self, seat):
+        """ A person took a seat back """
+        self.submit(None, 'occupy', seat)
+        if self.paused:
+            self.paused = False
+            self.submit(None, 'proceed')
+
+
+class Connection(asynchat.async_chat):
+    def __init__(self, sock, host):
+        """ A client connection, speaking in lines of JSON """
+        asynchat.async_chat.__init__(self, sock)
+        self.set_terminator(b"\n")
+        self.host = host
+        self.incoming = []
+        self.table = None     # -> HostedTable the client sits at
+        self.seat = None
+
+    def collect_incoming_data(self, data):
+        self.incoming.append(data)
+
+    def found_terminator(self):
+        line = b"".join(self.incoming)
+        self.incoming = []
+        try:
+            message = json.loads(line)
+            command = message["cmd"]
+        except (ValueError, KeyError, TypeError):
+            self.send_message({"event": "error", "message": "badmessage"})
+            return
+        self.host.handle_command(self, command, message)
+
+    def send_message(self, message):
+        self.push(json.dumps(message, separators=(',', ':')) + "\n")
+
+    def send_line(self, line):
+        self.push(line)
+
+    def handle_close(self):
+        self.host.leave(self)
+        self.close()
+
+
+class Host():
+    def __init__(self, service=None):
+        """ Hosts tables for connections; a connection is anything with send_message()
+            and send_line(), table and seat attributes, and a connected flag
+            service -> decisions.DecisionService making the AI bids in batches, or None """
+        self.tables = {}     # -> dict {name: HostedTable}
+        self.numbered = 0    # tables created without a name so far
+        self.on_close = None     # -> function called with the name of each closed table
+        self.sent = 0        # bytes of table events sent
+        self.cards = 0       # cards played at all tables
+        self.scheduler = timeline.Scheduler()
+        self.service = service
+        self.waker = Waker(self.deliver)
+        self.engine = Engine(self.waker, service)
+        self.engine.start()
+
+    def handle_command(self, connection, command, message):
+        if command == "join":
+            self.join(connection, message.get("table"), message.get("humans", 1), message.get("seat"))
+        elif command == "watch":
+            if connection.table:
+                connection.send_message({"event": "error", "message": "seated"})
+            elif message.get("table") not in self.tables:
+                connection.send_message({"event": "error", "message": "notable"})
+            else:
+                self.tables[message["table"]].watch(connection)
+        elif command == "stats":
+            connection.send_message(dict(self.stats(), event="stats"))
+        elif connection.table is None or not connection.table.started:
+            connection.send_message({"event": "error", "message": "notseated"})
+        elif command == "bid":
+            connection.table.submit(connection, 'act', connection.seat, message.get("bid"))
+        elif command == "play":
+            connection.table.submit(connection, 'act', connection.seat, message.get("card"))
+        else:
+            connection.send_message({"event": "error", "message": "badmessage"})
+
+    def join(self, connection, name, humans, seat=None):
+        if connection.table:
+            connection.send_message({"event": "error", "message": "seated"})
+            return
+        if not isinstance(humans, int) or not 1 <= humans <= 4:
+            connection.send_message({"event": "error", "message": "badmessage"})
+            return
+        if name is None:     # any open table for as many people will do
+            seat = None
+            open_tables = [table for table in self.tables.values()
+                           if table.humans == humans and not table.full() and table.name.startswith("#")]
+            if open_tables:
+                table = open_tables[0]
+            else:
+                self.numbered += 1
+                table = self.tables["#%d" % self.numbered] = HostedTable(self, "#%d" % self.numbered, humans)
+        elif name in self.tables:
+            table = self.tables[name]
+            if seat is not None:     # taking a seat back
+                if not table.free(seat):
+                    connection.send_message({"event": "error", "message": "seattaken"})
+                    return
+            elif table.full():
+                connection.send_message({"event": "error", "message": "tablefull"})
+                return
+        else:
+            table = self.tables[name] = HostedTable(self, name, humans)
+            seat = None
+        table.sit(connection, seat)
+        if table.started:
+            table.resume(connection.seat)
+        elif table.full():
+            table.started = True
+            table.submit(None, 'start')
+
+    def leave(self, connection):
+        if connection.table:
+            connection.table.leave(connection)
+            connection.table = None
+
+    def send(self, line, connections):
+        """ Send one encoded line to many connections """
+        self.sent += len(line) * len(connections)
+        for connection in connections:
+            connection.send_line(line)
+
+    def close_table(self, table):
+        table.closed = True
+        self.tables.pop(table.name, None)
+        if self.on_close:
+            self.on_close(table.name)
+
+    def deliver(self):
+        """ Pass the results of the engine's finished jobs on to their tables """
+        while self.engine.done:
+            table, connection, result = self.engine.done.popleft()
+            table.deliver(connection, result)
+
+    def stats(self):
+        stats = {"tables": len(self.tables),
+                 "players": sum(len(table.seats) for table in self.tables.values()),
+                 "decisions": self.engine.count,
+                 "latency_ms": 1000.0 * self.engine.busy / max(self.engine.count, 1),
+                 "slowest_ms": 1000.0 * self.engine.slowest,
+                 "queued": self.engine.jobs.qsize(),
+                 "bytes_per_card": float(self.sent) / max(self.cards, 1)}
+        if self.service:
+            stats.update(batches=self.service.batches,
+                         batch_size=float(self.service.decisions) / max(self.service.batches, 1))
+        return stats
+
+
+class TableServer(asyncore.dispatcher):
+    def __init__(self, host=HOST, port=PORT, service=None):
+        """ Listens for clients and hosts their tables """
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+        self.host = Host(service)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair:
+            Connection(pair[0], self.host)
+
+    def serve_forever(self):
+        serve(self.host.scheduler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Host Belote tables")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=0,
+                        help="make up to this many AI bids together (0: one at a time)")
+    parser.add_argument("--max-wait", type=int, default=decisions.MAX_WAIT,
+                        help="ms an AI bid may wait for a batch")
+    options = parser.parse_args()
+    engine.load_game()
+    service = decisions.DecisionService(options.max_batch, options.max_wait) if options.max_batch else None
+    server = TableServer(options.host, options.port, service)
+    print "Belote server on %s:%d" % (options.host, options.port)
+    server.serve_forever()
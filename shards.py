@@ -0,0 +1,314 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Belote tables hosted by a pool of worker processes (shards) behind one front router.
+
+A single server process runs all the AI on one engine thread, so it can't use more than
+one core. Here each shard is a process with its own server.Host, and the router only
+passes lines between the clients and the shards; clients speak the same protocol as with
+server.py. Each shard connects back to the router over a loopback socket, and messages
+between them carry the number of the client connection they belong to:
+    router -> shard   the client's command plus "conn", or {"conn": n, "cmd": "leave"}
+    shard -> router   a message for the client plus "conn", {"to": [conn...], "data": line}
+                      for a table delta, {"closed": table name}, or {"stats": the shard's
+                      server stats}, sent every SHARD_STATS ms
+A delta crosses from the shard once, however many clients get it; the router fans it out.
+A new table goes to the shard hosting the fewest tables (the one deciding fastest on a
+tie), and all the players of a table are routed to the shard hosting it. The "stats"
+command answers with the counts and decision latency of every shard.
+--max-batch and --max-wait make each shard's AI bids in batches, as with server.py.
+Run with:
+    python shards.py [--shards N] [--host HOST] [--port PORT] [--max-batch N] [--max-wait MS]
+"""
+
+import sys, json, time, socket, asyncore, asynchat, argparse, multiprocessing
+import engine, server, decisions
+
+SHARD_STATS = 1000      # ms between two stats reports of a shard
+SHARD_TIMEOUT = 30      # seconds to wait for the shards to start
+
+
+class Line(asynchat.async_chat):
+    def __init__(self, sock):
+        """ A channel carrying one JSON object per line """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)    # lines are small, send them at once
+        asynchat.async_chat.__init__(self, sock)
+        self.set_terminator(b"\n")
+        self.incoming = []
+
+    def collect_incoming_data(self, data):
+        self.incoming.append(data)
+
+    def found_terminator(self):
+        line = b"".join(self.incoming)
+        self.incoming = []
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            self.send_message({"event": "error", "message": "badmessage"})
+            return
+        self.handle_message(message)
+
+    def send_message(self, message):
+        self.push(json.dumps(message, separators=(',', ':')) + "\n")
+
+
+# The shard side
+
+class ShardHost(server.Host):
+    def __init__(self, service=None):
+        """ The tables of a shard; their deltas are sent to the router for fanning out """
+        server.Host.__init__(self, service)
+        self.link = None      # -> ShardLink to the router
+
+    def send(self, line, connections):
+        self.sent += len(line) * len(connections)
+        self.link.send_message({"to": [connection.number for connection in connections], "data": line})
+
+
+class RemoteConnection():
+    def __init__(self, link, number):
+        """ A client of the router, as seen by the shard's server.Host """
+        self.link = link
+        self.number = number
+        self.table = None
+        self.seat = None
+        self.connected = True
+
+    def send_message(self, message):
+        self.link.send_message(dict(message, conn=self.number))
+
+
+class ShardLink(Line):
+    def __init__(self, sock, host):
+        """ The shard's end of its link to the router """
+        Line.__init__(self, sock)
+        self.host = host
+        self.connections = {}     # -> dict {number: RemoteConnection}
+
+    def handle_message(self, message):
+        number = message.pop("conn", None)
+        command = message.get("cmd")
+        if command == "leave":
+            connection = self.connections.pop(number, None)
+            if connection:
+                connection.connected = False
+                self.host.leave(connection)
+            return
+        if number not in self.connections:
+            self.connections[number] = RemoteConnection(self, number)
+        self.host.handle_command(self.connections[number], command, message)
+
+    def handle_close(self):
+        sys.exit()     # the router is gone
+
+    def report(self):
+        self.send_message({"stats": self.host.stats()})
+        self.host.scheduler.call_later(SHARD_STATS, self.report)
+
+
+def run_shard(number, port, max_batch=0, max_wait=decisions.MAX_WAIT):
+    """ The main function of a shard process: host tables for the router listening on port
+        max_batch -> int; make up to this many AI bids together, 0 for one at a time """
+    asyncore.socket_map.clear()     # a forked shard inherits the router's channels
+    engine.load_game()
+    host = ShardHost(decisions.DecisionService(max_batch, max_wait) if max_batch else None)
+    link = host.link = ShardLink(socket.create_connection(("127.0.0.1", port)), host)
+    link.send_message({"shard": number})
+    host.on_close = lambda name: link.send_message({"closed": name})
+    link.report()
+    server.serve(host.scheduler)
+
+
+# The router side
+
+class Shard(Line):
+    def __init__(self, sock, router):
+        """ The router's end of the link to a shard """
+        Line.__init__(self, sock)
+        self.router = router
+        self.number = None
+        self.tables = set()     # -> names of the tables the shard hosts
+        self.stats = {}         # -> the shard's last stats report
+
+    def load(self):
+        return len(self.tables), self.stats.get("latency_ms", 0)
+
+    def handle_message(self, message):
+        if "to" in message:
+            line = message["data"].encode("utf-8")
+            for number in message["to"]:
+                client = self.router.clients.get(number)
+                if client:
+                    client.push(line)
+        elif "conn" in message:
+            client = self.router.clients.get(message.pop("conn"))
+            if client:
+                if message.get("event") == "sync":
+                    client.table = message["table"]
+                client.send_message(message)
+        elif "stats" in message:
+            self.stats = message["stats"]
+        elif "closed" in message:
+            self.router.table_closed(self, message["closed"])
+        elif "shard" in message:
+            self.number = message["shard"]
+            self.router.shards.append(self)
+
+    def handle_close(self):
+        """ The shard process died; its tables are lost """
+        self.close()
+        if self in self.router.shards:
+            self.router.shards.remove(self)
+        for name in list(self.tables):
+            self.router.table_closed(self, name)
+        for client in self.router.clients.values():
+            if client.shard is self:
+                client.send_message({"event": "error", "message": "tablefailed"})
+                client.close_when_done()
+
+
+class Client(Line):
+    def __init__(self, sock, router, number):
+        """ A client connection to the router """
+        Line.__init__(self, sock)
+        self.router = router
+        self.number = number
+        self.shard = None       # -> Shard the client's commands go to
+        self.table = None       # -> name of the table the client sits at
+
+    def handle_message(self, message):
+        self.router.route(self, message)
+
+    def handle_close(self):
+        if self.shard and self.shard.connected:
+            self.shard.send_message({"conn": self.number, "cmd": "leave"})
+        self.router.client_left(self)
+        self.router.clients.pop(self.number, None)
+        self.close()
+
+
+class Listener(asyncore.dispatcher):
+    def __init__(self, host, port, accept):
+        """ Listens on host:port and calls accept with each new socket """
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+        self.accept_socket = accept
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair:
+            self.accept_socket(pair[0])
+
+
+class Router():
+    def __init__(self, host=server.HOST, port=server.PORT, shards=None, max_batch=0, max_wait=decisions.MAX_WAIT):
+        """ Starts the shard processes (one per core by default) and routes clients to them """
+        self.shards = []        # -> list of started Shard links
+        self.clients = {}       # -> dict {number: Client}
+        self.numbered = 0       # client connections so far
+        self.named = 0          # tables named by the router so far
+        self.directory = {}     # -> dict {table name: Shard}
+        self.open = {}          # -> dict {humans: [table name, numbers of the clients sent to it]} of the table being filled
+        internal = Listener("127.0.0.1", 0, lambda sock: Shard(sock, self))
+        count = shards or multiprocessing.cpu_count()
+        self.processes = [multiprocessing.Process(target=run_shard, args=(number, internal.getsockname()[1], max_batch, max_wait))
+                          for number in xrange(count)]
+        for process in self.processes:
+            process.daemon = True
+            process.start()
+        deadline = time.time() + SHARD_TIMEOUT
+        while len(self.shards) < count:
+            if time.time() > deadline:
+                raise RuntimeError("The shards didn't start")
+            asyncore.loop(0.1, count=1)
+        internal.close()
+        Listener(host, port, self.accept)
+
+    def accept(self, sock):
+        self.numbered += 1
+        self.clients[self.numbered] = Client(sock, self, self.numbered)
+
+    def route(self, client, message):
+        command = message.get("cmd")
+        if command == "stats":
+            client.send_message(dict(self.stats(), event="stats"))
+            return
+        if command == "watch" and client.table is None:
+            if message.get("table") not in self.directory:
+                client.send_message({"event": "error", "message": "notable"})
+                return
+            client.shard = self.directory[message["table"]]
+        elif command == "join" and client.table is None:
+            name = message.get("table")
+            humans = message.get("humans", 1)
+            if name is None and isinstance(humans, int) and 1 <= humans <= 4:
+                name = message["table"] = self.open_table(humans, client)
+            if name in self.directory:
+                client.shard = self.directory[name]
+            else:
+                client.shard = min(self.shards, key=Shard.load)
+                if name is not None:
+                    self.directory[name] = client.shard
+                    client.shard.tables.add(name)
+        elif client.table is None:
+            client.send_message({"event": "error", "message": "notseated"})
+            return
+        client.shard.send_message(dict(message, conn=client.number))
+
+    def open_table(self, humans, client):
+        """ Return the name of a table with a free seat for the client, as server.Host.join();
+            the table starts once as many clients as it has seats for are sent to it """
+        if humans not in self.open:
+            self.named += 1
+            self.open[humans] = ["#%d" % self.named, set()]
+        entry = self.open[humans]
+        entry[1].add(client.number)
+        if len(entry[1]) == humans:
+            del self.open[humans]
+        return entry[0]
+
+    def client_left(self, client):
+        """ Give back the seat of a client which left a table that hasn't started; the shard
+            gets the leave after the joins, in the same order, so it frees the same seat """
+        for humans, entry in self.open.items():
+            if client.number in entry[1]:
+                entry[1].discard(client.number)
+                if not entry[1]:     # the shard closes the empty table
+                    del self.open[humans]
+
+    def table_closed(self, shard, name):
+        shard.tables.discard(name)
+        if self.directory.get(name) is shard:
+            del self.directory[name]
+        for humans, entry in self.open.items():
+            if entry[0] == name:
+                del self.open[humans]
+
+    def stats(self):
+        shards = [dict(shard.stats, shard=shard.number, tables=len(shard.tables))
+                  for shard in sorted(self.shards, key=lambda shard: shard.number)]
+        return {"tables": len(self.directory), "players": len(self.clients), "shards": shards}
+
+    def serve_forever(self):
+        asyncore.loop(1.0, use_poll=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Host Belote tables in several processes")
+    parser.add_argument("--shards", type=int, default=None, help="number of processes (one per core by default)")
+    parser.add_argument("--host", default=server.HOST)
+    parser.add_argument("--port", type=int, default=server.PORT)
+    parser.add_argument("--max-batch", type=int, default=0,
+                        help="make up to this many AI bids together in a shard (0: one at a time)")
+    parser.add_argument("--max-wait", type=int, default=decisions.MAX_WAIT,
+                        help="ms an AI bid may wait for a batch")
+    options = parser.parse_args()
+    router = Router(options.host, options.port, options.shards, options.max_batch, options.max_wait)
+    print "Belote router on %s:%d, %d shards" % (options.host, options.port, len(router.shards))
+    router.serve_forever()
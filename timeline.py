@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Frame-rate independent animation timing for Belote.
+
+A Tween moves a list of values (a position, a size...) from a start to a stop value
+over a given duration in milliseconds, shaped by an easing function. A Timeline holds
+the running tweens and advances all of them by the milliseconds elapsed since the last
+frame, so an animation takes the same time whether the game draws 30 or 300 frames a second.
+
+A headless Timeline finishes every tween the moment it is added; simulations use it to
+skip animation time entirely.
+
+A Scheduler defers steps of the game flow (the next computer move, the end of a result
+message) by a delay, without blocking; the turbo factor scales all delays, down to zero
+for fast-forward play.
+"""
+
+def linear(t):
+    return t
+
+def ease_out_quad(t):
+    """ Start fast, slow down when approaching the destination """
+    return t * (2 - t)
+
+
+class Tween():
+    def __init__(self, start, stop, duration, easing=linear):
+        """ Represents the change of a list of values in time.
+            start, stop -> lists of numbers of equal length
+            duration -> number of milliseconds the change takes
+            easing -> function mapping elapsed fraction [0, 1] to progress [0, 1] """
+        self.start = list(start)
+        self.stop = list(stop)
+        self.duration = max(float(duration), 1.0)
+        self.easing = easing
+        self.elapsed = 0.0
+        self.done = False
+
+    def advance(self, dt):
+        """ Move the tween dt milliseconds forward; return True while it's still running """
+        if not self.done:
+            self.elapsed += dt
+            if self.elapsed >= self.duration:
+                self.finish()
+        return not self.done
+
+    def finish(self):
+        """ Jump straight to the end of the tween """
+        self.elapsed = self.duration
+        self.done = True
+
+    def value(self):
+        """ Return the current values as a list of floats """
+        progress = self.easing(min(self.elapsed / self.duration, 1.0))
+        return [a + (b - a) * progress for a, b in zip(self.start, self.stop)]
+
+
+class Timeline():
+    def __init__(self, headless=False):
+        """ Holds all running tweens and advances them together.
+            headless -> bool; if True, every tween is finished as soon as it is added """
+        self.tweens = []
+        self.headless = headless
+
+    def add(self, tween):
+        """ Start running the given tween; return it for convenience """
+        if self.headless:
+            tween.finish()
+        else:
+            self.tweens.append(tween)
+        return tween
+
+    def advance(self, dt):
+        """ Advance all tweens by dt milliseconds, forget the finished ones.
+            Return True if anything changed. """
+        if not self.tweens:
+            return False
+        for tween in self.tweens[:]:
+            if not tween.advance(dt):
+                self.tweens.remove(tween)
+        return True
+
+    def finish(self):
+        """ Advance all tweens to their end ("advance to end" mode) """
+        for tween in self.tweens:
+            tween.finish()
+        self.tweens = []
+
+    def active(self):
+        """ Check if any tween is still running """
+        return len(self.tweens) > 0
+
+
+class Scheduler():
+    def __init__(self, turbo=1.0):
+        """ Holds timers which call a function once their delay has passed.
+            turbo -> float; all delays are multiplied by it (0 makes every timer due at once) """
+        self.turbo = turbo
+        self.timers = []    # -> list of [remaining ms, function]
+
+    def call_later(self, delay, function):
+        """ Call function after delay milliseconds, scaled by the turbo factor """
+        self.timers.append([delay * self.turbo, function])
+
+    def set_turbo(self, turbo):
+        """ Change the turbo factor, rescaling the timers which are already running """
+        for timer in self.timers:
+            if self.turbo > 0:
+                timer[0] = timer[0] * turbo / self.turbo
+        self.turbo = turbo
+
+    def advance(self, dt):
+        """ Count dt milliseconds down on all timers and call the ones that are due """
+        for timer in self.timers[:]:
+            timer[0] -= dt
+            if timer[0] <= 0:
+                self.timers.remove(timer)
+                timer[1]()
+
+    def next_due(self):
+        """ Return the milliseconds until the next timer is due, or None if there are no timers """
+        if not self.timers:
+            return None
+        return max(min(timer[0] for timer in self.timers), 0)